@@ -7,6 +7,15 @@ Command-line usage:
 	-r sampling_rate -- override which sample rate model to use, one of 8000, 11025, and 16000
 	-s start_time    -- start of portion of wavfile to align (in seconds, default 0)
 	-e end_time      -- end of portion of wavfile to align (in seconds, default to end)
+	--frontend=name  -- feature extraction: hcopy (default) or numpy (in-process, see mfcc.py)
+	--decoder=name   -- forced alignment: hvite (default) or python (in-process, see viterbi_align.py)
+	--binary-model   -- let HVite load the HTK binary model made by make_binary_model.py, if up to date
+	--g2p-cache=file -- keep Hangul pronunciations in this SQLite file for later runs (see bin/g2p_cache.py)
+	--learned-lexicon=file -- remember G2P words in this lexicon store, capped, for later runs (see lexicon_store.py)
+
+  python align.py [options] --manifest=manifest_file
+  aligns every "wave_file transcript_file output_file" line of manifest_file (tab-separated)
+  with a single HCopy and HVite run; -s and -e are not available in this mode.
 
 You can also import this file as a module and use the functions directly.
 """
@@ -14,11 +23,33 @@ You can also import this file as a module and use the functions directly.
 import os
 import sys
 import getopt
+import collections
+import hashlib
 import wave
 import re
+import shutil
 import subprocess
+import tempfile
 import unicodedata
 
+import lexicon
+import lexicon_store
+import normalize_transcript
+import text_encoding
+
+
+BIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin')
+
+# feature extraction: HCopy, or the NumPy implementation in mfcc.py
+FRONTENDS = ('hcopy', 'numpy')
+
+# forced alignment: HVite, or the NumPy Viterbi decoder in viterbi_align.py
+DECODERS = ('hvite', 'python')
+
+# sample rates with acoustic models; set from resolve_model() and used by prep_wav()
+sr_models = None
+_GLOBAL_SR_MODELS = object()
+
 
 VOWEL_PHONES = {
 	'a', 'ae', 'ya', 'yae', 'eo', 'e', 'yeo', 'ye',
@@ -36,8 +67,20 @@ def _is_vowel(phone):
 	return low[0] in {'a', 'e', 'i', 'o', 'u', 'w', 'y'}
 
 
-def prep_wav(orig_wav, out_wav, sr_override, wave_start, wave_end):
-	global sr_models
+def run_command(command, log=print):
+	"""Run a shell command and pass what it writes to stdout and stderr to log; returns its exit status."""
+	res = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+	output = res.stdout.decode('utf-8', errors='replace').rstrip('\n')
+	if output:
+		log(output)
+	return res.returncode
+
+
+def prep_wav(orig_wav, out_wav, sr_override, wave_start, wave_end, models=_GLOBAL_SR_MODELS, log=print):
+	# models: sample rates with acoustic models (None: any rate); defaults to the module global
+	# log: where messages and the output of sox go (see Aligner.align)
+	if models is _GLOBAL_SR_MODELS:
+		models = sr_models
 
 	# If we had previously generated out_wav and wanted to reuse it, we could early-return.
 	# Currently disabled by design (kept for reference).
@@ -45,7 +88,7 @@ def prep_wav(orig_wav, out_wav, sr_override, wave_start, wave_end):
 		f = wave.open(out_wav, 'r')
 		SR = f.getframerate()
 		f.close()
-		print("Already re-sampled the wav file to " + str(SR))
+		log("Already re-sampled the wav file to " + str(SR))
 		return SR
 
 	f = wave.open(orig_wav, 'r')
@@ -59,62 +102,32 @@ def prep_wav(orig_wav, out_wav, sr_override, wave_start, wave_end):
 			soxopts += " " + str(float(wave_end) - float(wave_start))
 
 	# Resample if needed (model SR mismatch or override), or if we need to trim.
-	if (sr_models is not None and SR not in sr_models) or (sr_override is not None and SR != sr_override) or soxopts != "":
+	if (models is not None and SR not in models) or (sr_override is not None and SR != sr_override) or soxopts != "":
 		# Default to 16000 Hz for better quality (was 11025)
 		new_sr = 16000
 		if sr_override is not None:
 			new_sr = sr_override
 
-		print("Resampling wav file from " + str(SR) + " to " + str(new_sr) + soxopts + "...")
+		log("Resampling wav file from " + str(SR) + " to " + str(new_sr) + soxopts + "...")
 		SR = new_sr
 		# Correct sox syntax: sox input output [effects]
-		os.system("sox \"" + orig_wav + "\" \"" + out_wav + "\" rate -v " + str(SR) + soxopts)
+		run_command("sox \"" + orig_wav + "\" \"" + out_wav + "\" rate -v " + str(SR) + soxopts, log)
 	else:
 		# Already at the desired sample rate and no trimming required.
-		os.system("cp -f " + orig_wav + " " + out_wav)
+		run_command("cp -f " + orig_wav + " " + out_wav, log)
 
 	return SR
 
 
 def _read_text_any_encoding(path):
-	"""Read text file trying common encodings and return a unicode string.
-	Tries: utf-8, utf-16, utf-16le, utf-16be, cp949, euc-kr. Strips leading BOM if present."""
-	encodings = [
-		'utf-8', 'utf-16', 'utf-16le', 'utf-16be', 'cp949', 'euc-kr'
-	]
-	data = None
-	with open(path, 'rb') as fb:
-		data = fb.read()
-	for enc in encodings:
-		try:
-			s = data.decode(enc)
-			# strip BOM if any survived
-			if s and s[0] == '\ufeff':
-				s = s[1:]
-			return s
-		except Exception:
-			continue
-	# Fallback: best-effort utf-8 with replacement
-	try:
-		s = data.decode('utf-8', errors='replace')
-		if s and s[0] == '\ufeff':
-			s = s[1:]
-		return s
-	except Exception:
-		return ''
+	"""Read a text file in UTF-8, UTF-16 or CP949/EUC-KR and return a unicode string (see text_encoding.py).
+	The text is kept per path and modification time, so reading a transcript again costs nothing."""
+	return text_encoding.read_text(path)
 
 
-def _build_display_map(original_path, romanized_path):
+def _display_map(orig_lines, roman_lines):
+	"""Map romanized tokens back to the original tokens of lines with the same number of tokens."""
 	display = {}
-	if not (os.path.exists(original_path) and os.path.exists(romanized_path)):
-		return display
-
-	try:
-		orig_lines = _read_text_any_encoding(original_path).splitlines()
-		roman_lines = _read_text_any_encoding(romanized_path).splitlines()
-	except Exception:
-		return display
-
 	for o_line, r_line in zip(orig_lines, roman_lines):
 		o_tokens = [tok for tok in re.split(r'\s+', o_line.strip()) if tok]
 		r_tokens = [tok.upper() for tok in re.split(r'\s+', r_line.strip()) if tok]
@@ -129,57 +142,110 @@ def _build_display_map(original_path, romanized_path):
 	return display
 
 
-def prep_mlf(trsfile, mlffile, word_dictionary, surround, between):
+# word index of the dictionary file read last, by path, modification time and size
+_dictionary_words = {}
+
+
+def _read_dictionary_words(word_dictionary):
 	"""
-	Prepare an input MLF from a transcript, using only words present in the provided dictionary.
-	Optionally surround the sentence with tokens and insert a token between words.
+	Return a dict keyed by every word that has an entry in word_dictionary. The file is
+	read once per modification; words added to the returned dict stay out of the copy kept.
 	"""
-	# Read in the dictionary to ensure all of the words we put in the MLF file are in the dictionary.
-	with open(word_dictionary, 'r') as f:
-		dictionary = {}
-		for line in f.readlines():
-			if line != "\n" and line != "":
-				dictionary[line.split()[0]] = True
-
-	# Read transcript with robust encoding handling
-	content = _read_text_any_encoding(trsfile)
-	lines = content.splitlines()
+	st = os.stat(word_dictionary)
+	key = (os.path.abspath(word_dictionary), st.st_mtime_ns, st.st_size)
+	if key not in _dictionary_words:
+		with open(word_dictionary, 'r') as f:
+			dictionary = {}
+			for line in f:
+				if line != "\n" and line != "":
+					dictionary[line.split()[0]] = True
+		_dictionary_words.clear()
+		_dictionary_words[key] = dictionary
+	return collections.ChainMap({}, _dictionary_words[key])
+
+
+def write_trimmed_dictionary(word_dictionary, lines, words, keep=('sil', 'sp')):
+	"""
+	Write only the entries of the dictionary lines whose word is in words or keep,
+	in their original order, so HVite loads just what the MLF uses.
+	Returns the set of phones in the written entries.
+	"""
+	wanted = set(words).union(keep)
+	phones = set()
+	with open(word_dictionary, 'w', encoding='utf-8') as fw:
+		for line in lines:
+			parts = line.split()
+			if parts and parts[0] in wanted:
+				fw.write(line.rstrip('\n') + '\n')
+				phones.update(parts[1:])
+	return phones
 
-	words = []
 
-	if surround is not None:
-		words += surround.split(',')
+def write_phone_list(phone_file, phones, all_phones, keep=('sil', 'sp')):
+	"""Write the entries of all_phones (the model's phone list) that are in phones or keep."""
+	wanted = set(phones).union(keep)
+	with open(phone_file, 'w') as fw:
+		for phone in all_phones:
+			if phone in wanted:
+				fw.write(phone + '\n')
 
-	# this pattern matches hyphenated words, such as TWENTY-TWO; however, it doesn't work
-	# with longer things like SOMETHING-OR-OTHER
-	hyphenPat = re.compile(r'([A-Z]+)-([A-Z]+)')
 
-	i = 0
-	while i < len(lines):
-		txt = lines[i].replace('\n', '')
-		txt = txt.replace('{breath}', '{BR}').replace('&lt;noise&gt;', '{NS}')
-		txt = txt.replace('{laugh}', '{LG}').replace('{laughter}', '{LG}')
-		txt = txt.replace('{cough}', '{CG}').replace('{lipsmack}', '{LS}')
+# counters of a text_words report, each counted per token and per distinct word
+REPORT_COUNTS = ('words', 'oov', 'pronounced', 'skipped')
 
-		for pun in [',', '.', ':', ';', '!', '?', '"', '%', '(', ')', '--', '---']:
-			txt = txt.replace(pun, '')
 
-		txt = txt.upper()
+def text_words(content, dictionary, surround, between, pronounce=None, report=None, log=print, base=None):
+	"""
+	Return the list of MLF words for the text of a transcript, using only words present in dictionary.
+	Optionally surround the sentence with tokens and insert a token between words.
+
+	Each distinct word is looked at once, where it first occurs. It is out of vocabulary
+	(OOV) if base, the dictionary before any G2P (default: dictionary at that point), has
+	no entry for it. An OOV word is pronounced if it is in dictionary, from an earlier G2P
+	step or because pronounce(word) returned True, i.e. added it to dictionary (see
+	g2p_pronouncer); otherwise it is skipped wherever it occurs and reported to log once.
+	If report is a dict, report['tokens'] and report['types'] get the number of word
+	occurrences and of distinct words for each of REPORT_COUNTS, and report['skipped_words']
+	the skipped words.
+	"""
+	lines = content.splitlines()
+	if report is None:
+		report = {}
+	tokens = dict.fromkeys(REPORT_COUNTS, 0)
+	types = dict.fromkeys(REPORT_COUNTS, 0)
+	report.update(tokens=tokens, types=types, skipped_words=[])
+	if base is None:
+		base = dictionary
 
-		# break up any hyphenated words into two separate words
-		txt = re.sub(hyphenPat, r'\1 \2', txt)
+	words = []
+	# word -> the counters it adds to, decided at its first occurrence
+	status = {}
 
-		txt = txt.split()
+	if surround is not None:
+		words += surround.split(',')
 
-		for wrd in txt:
-			if wrd in dictionary:
-				words.append(wrd)
-				if between is not None:
-					words.append(between)
+	# tags, punctuation, upper case and hyphens, see normalize_transcript.py
+	for wrd in normalize_transcript.normalizer.iter_words(lines):
+		if wrd not in status:
+			if wrd in base:
+				status[wrd] = ('words',)
 			else:
-				print("SKIPPING WORD", wrd)
-
-		i += 1
+				if wrd not in dictionary and pronounce is not None:
+					pronounce(wrd)
+				if wrd in dictionary:
+					status[wrd] = ('words', 'oov', 'pronounced')
+				else:
+					status[wrd] = ('words', 'oov', 'skipped')
+					report['skipped_words'].append(wrd)
+					log("SKIPPING WORD " + wrd)
+			for name in status[wrd]:
+				types[name] += 1
+		for name in status[wrd]:
+			tokens[name] += 1
+		if 'skipped' not in status[wrd]:
+			words.append(wrd)
+			if between is not None:
+				words.append(between)
 
 	# Remove the last 'between' token from the end if it exists
 	# (though with between_token=None, this won't execute)
@@ -189,16 +255,53 @@ def prep_mlf(trsfile, mlffile, word_dictionary, surround, between):
 	if surround is not None:
 		words += surround.split(',')
 
-	writeInputMLF(mlffile, words)
+	return words
 
 
-def writeInputMLF(mlffile, words):
+def g2p_pronouncer(g2p, dictionary, new_lines, cache=None, hangul_words=None, log=print):
+	"""
+	Return a pronounce(word) for text_words: a word spelled in Hangul syllable names
+	(GICA, e.g. from a romanized transcript) gets its entries from the G2P module g2p
+	(bin/hangul_g2p.py), which are added to dictionary and new_lines. Any ASCII word
+	that splits into syllable names is pronounced, English OK or NO too; with
+	hangul_words, the words known to come from Hangul text, the entries of other
+	words are logged as guesses.
+	"""
+	def pronounce(word):
+		entries = [' '.join(l.split()) for l in g2p.word_entries([word], cache)]
+		if not entries:
+			return False
+		if hangul_words is not None and word not in hangul_words:
+			log("GUESSING WORD " + word + " IS ROMANIZED HANGUL: " + '; '.join(entries))
+		new_lines.extend(entries)
+		dictionary[word] = True
+		return True
+	return pronounce
+
+
+def oov_summary(name, report):
+	"""One line with the OOV rate of a transcript from its text_words report."""
+	tokens, types = report['tokens'], report['types']
+	rate = 100.0 * tokens['oov'] / tokens['words'] if tokens['words'] else 0.0
+	return ("OOV " + name + ": %d of %d word(s) (%.1f%%), %d of %d distinct; %d (%d distinct) pronounced by G2P, "
+			"%d (%d distinct) skipped"
+			% (tokens['oov'], tokens['words'], rate, types['oov'], types['words'], tokens['pronounced'],
+			   types['pronounced'], tokens['skipped'], types['skipped']))
+
+
+def writeInputMLF(mlffile, words, label='tmp'):
+	writeBatchInputMLF(mlffile, [(label, words)])
+
+
+def writeBatchInputMLF(mlffile, utterances):
+	"""Write one MLF holding several utterances, given as (label, words) pairs."""
 	with open(mlffile, 'w') as fw:
 		fw.write('#!MLF!#\n')
-		fw.write('"*/tmp.lab"\n')
-		for wrd in words:
-			fw.write(wrd + '\n')
-		fw.write('.\n')
+		for label, words in utterances:
+			fw.write('"*/' + label + '.lab"\n')
+			for wrd in words:
+				fw.write(wrd + '\n')
+			fw.write('.\n')
 
 
 def readAlignedMLF(mlffile, SR, wave_start):
@@ -214,9 +317,38 @@ def readAlignedMLF(mlffile, SR, wave_start):
 	if len(lines) < 3:
 		raise ValueError("Alignment did not complete succesfully.")
 
-	j = 2
+	return _parse_aligned_lines(lines[2:], SR, wave_start)
+
+
+def readBatchAlignedMLF(mlffile):
+	"""
+	Split a multi-utterance MLF alignment output file into its utterances.
+	Returns a dict mapping each utterance label (the file name without directory and
+	extension) to its list of alignment lines; pass those to _parse_aligned_lines.
+	"""
+	with open(mlffile, 'r') as f:
+		lines = [l.rstrip() for l in f.readlines()]
+
+	utterances = {}
+	label = None
+	for line in lines:
+		if label is None:
+			if line.startswith('"'):
+				label = os.path.splitext(os.path.basename(line.strip('"')))[0]
+				utterances[label] = []
+			continue
+		if line == '.':
+			label = None
+			continue
+		utterances[label].append(line)
+	return utterances
+
+
+def _parse_aligned_lines(lines, SR, wave_start):
+	"""Convert the alignment lines of one utterance into the word list described in readAlignedMLF."""
+	j = 0
 	ret = []
-	while lines[j] != '.':
+	while j < len(lines) and lines[j] != '.':
 		if len(lines[j].split()) == 5:  # start of a word; have a word label?
 			# Make a new word list in ret and put the word label at the beginning
 			wrd = lines[j].split()[4]
@@ -237,6 +369,9 @@ def readAlignedMLF(mlffile, SR, wave_start):
 
 		j += 1
 
+	if not ret:
+		raise ValueError("Alignment did not complete succesfully.")
+
 	# Separate sp from words: if a word ends with sp, move it to a separate entry
 	separated_ret = []
 	for wrd in ret:
@@ -458,26 +593,465 @@ def writeTextGrid(outfile, word_alignments, display_map=None):
 			fw.write('"' + utt[0] + '"' + '\n')
 
 
-def prep_working_directory():
-	os.system("rm -r -f ./tmp")
-	os.system("mkdir ./tmp")
+def prep_working_directory(tmp_root='./tmp'):
+	"""
+	Create a private scratch directory for one alignment job under tmp_root and return its path.
+	Every job gets its own directory, so several alignments can run side by side.
+	"""
+	if not os.path.isdir(tmp_root):
+		os.makedirs(tmp_root, exist_ok=True)
+	return os.path.abspath(tempfile.mkdtemp(prefix='job_', dir=tmp_root))
 
 
-def prep_scp(wavfile):
-	with open('./tmp/codetr.scp', 'w') as fw:
-		fw.write(wavfile + ' ./tmp/tmp.mfc\n')
-	with open('./tmp/test.scp', 'w') as fw:
-		fw.write('./tmp/tmp.mfc\n')
+def cleanup_working_directory(workdir):
+	shutil.rmtree(workdir, ignore_errors=True)
 
 
-def create_plp(hcopy_config):
-	os.system('HCopy -T 1 -C ' + hcopy_config + ' -S ./tmp/codetr.scp')
+def prep_scp(wavfile, workdir):
+	prep_batch_scp([(wavfile, os.path.join(workdir, 'tmp.mfc'))], workdir)
 
 
-def viterbi(input_mlf, word_dictionary, output_mlf, phoneset, hmmdir):
+def prep_batch_scp(pairs, workdir):
+	"""Write codetr.scp and test.scp in workdir for a list of (wave file, feature file) pairs."""
+	with open(os.path.join(workdir, 'codetr.scp'), 'w') as fw:
+		for wavfile, mfcfile in pairs:
+			fw.write(wavfile + ' ' + mfcfile + '\n')
+	with open(os.path.join(workdir, 'test.scp'), 'w') as fw:
+		for wavfile, mfcfile in pairs:
+			fw.write(mfcfile + '\n')
+
+
+def create_plp(hcopy_config, workdir, log=print):
+	run_command('HCopy -T 1 -C ' + hcopy_config + ' -S ' + os.path.join(workdir, 'codetr.scp'), log)
+
+
+def viterbi(input_mlf, word_dictionary, output_mlf, phoneset, hmmdir, workdir, binary=False, log=print):
 	# MLF includes sil at boundaries, so no -b option needed
 	# sp is in dictionary at end of each word
-	os.system('HVite -T 1 -a -m -I ' + input_mlf + ' -H ' + hmmdir + '/macros -H ' + hmmdir + '/hmmdefs  -S ./tmp/test.scp -i ' + output_mlf + ' -p 0.0 -s 5.0 ' + word_dictionary + ' ' + phoneset + ' > ./tmp/aligned.results')
+	modeldir = binary_model_dir(hmmdir) if binary and binary_model_is_current(hmmdir, log) else hmmdir
+	run_command('HVite -T 1 -a -m -I ' + input_mlf + ' -H ' + modeldir + '/macros -H ' + modeldir + '/hmmdefs  -S ' + os.path.join(workdir, 'test.scp') + ' -i ' + output_mlf + ' -p 0.0 -s 5.0 ' + word_dictionary + ' ' + phoneset + ' > ' + os.path.join(workdir, 'aligned.results'), log)
+
+
+def model_checksum(hmmdir):
+	"""SHA-1 over the text macros and hmmdefs in hmmdir."""
+	sha = hashlib.sha1()
+	for name in ('macros', 'hmmdefs'):
+		with open(os.path.join(hmmdir, name), 'rb') as f:
+			sha.update(f.read())
+	return sha.hexdigest()
+
+
+def binary_model_dir(hmmdir):
+	"""Where make_binary_model() puts the HTK binary copy of the model in hmmdir."""
+	return os.path.join(hmmdir, 'binary')
+
+
+def binary_model_is_current(hmmdir, log=print):
+	"""
+	True if hmmdir has a binary model made from the current text model. A stale binary
+	model (the text files changed since it was made) is reported and not used.
+	"""
+	bindir = binary_model_dir(hmmdir)
+	try:
+		with open(os.path.join(bindir, 'checksum'), 'r') as f:
+			checksum = f.read().strip()
+	except OSError:
+		return False
+	if checksum != model_checksum(hmmdir):
+		log("Binary model in " + bindir + " is out of date; using the text model (rerun make_binary_model.py)")
+		return False
+	return os.path.exists(os.path.join(bindir, 'macros')) and os.path.exists(os.path.join(bindir, 'hmmdefs'))
+
+
+def _binary_model_stat(hmmdir):
+	"""(modification time, size) of the text and binary model files of hmmdir, None for missing ones."""
+	bindir = binary_model_dir(hmmdir)
+	stats = []
+	for path in (os.path.join(hmmdir, 'macros'), os.path.join(hmmdir, 'hmmdefs'), os.path.join(bindir, 'checksum'),
+				 os.path.join(bindir, 'macros'), os.path.join(bindir, 'hmmdefs')):
+		try:
+			st = os.stat(path)
+			stats.append((st.st_mtime_ns, st.st_size))
+		except OSError:
+			stats.append(None)
+	return tuple(stats)
+
+
+def make_binary_model(hmmdir, phoneset, log=print):
+	"""
+	Save the model in hmmdir in HTK binary format (HHEd -B) under binary_model_dir(hmmdir),
+	together with the checksum of the text files it was made from. HHEd's output goes to
+	log; RuntimeError is raised if it fails.
+	"""
+	bindir = binary_model_dir(hmmdir)
+	os.makedirs(bindir, exist_ok=True)
+	checksum = model_checksum(hmmdir)
+	workdir = tempfile.mkdtemp(prefix='binary_', dir=bindir)
+	try:
+		# HHEd needs an edit script; an empty one saves the model unchanged
+		hed = os.path.join(workdir, 'empty.hed')
+		open(hed, 'w').close()
+		status = run_command('HHEd -B -H ' + hmmdir + '/macros -H ' + hmmdir + '/hmmdefs -M ' + workdir + ' ' + hed +
+							 ' ' + phoneset, log)
+		if status != 0:
+			raise RuntimeError("HHEd failed with exit status " + str(status) + " for " + hmmdir)
+		for name in ('macros', 'hmmdefs'):
+			if not os.path.exists(os.path.join(workdir, name)):
+				raise RuntimeError("HHEd did not write " + name + " for " + hmmdir)
+		for name in ('macros', 'hmmdefs'):
+			os.replace(os.path.join(workdir, name), os.path.join(bindir, name))
+		with open(os.path.join(bindir, 'checksum'), 'w') as fw:
+			fw.write(checksum + '\n')
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True)
+	return bindir
+
+
+def resolve_model(mypath=None):
+	"""
+	Return (model directory, hmm subdirectory, sample rates with acoustic models).
+	Without an explicit model directory the one next to this script is used, and the hmm
+	subdirectory is picked from the sample rate ("FROM-SR").
+	"""
+	if mypath is None:
+		# sample rates for which there are acoustic models set up, otherwise
+		# the signal must be resampled to one of these rates.
+		return os.path.dirname(os.path.abspath(__file__)) + "/model", "FROM-SR", [8000, 11025, 16000]
+	return mypath, "", None
+
+
+def _phone_list(mypath):
+	mpfile = mypath + '/monophones'
+	if not os.path.exists(mpfile):
+		mpfile = mypath + '/hmmnames'
+	return mpfile
+
+
+def _contains_hangul(text):
+	for ch in text:
+		code = ord(ch)
+		if 0xAC00 <= code <= 0xD7A3:
+			return True
+	return False
+
+
+def read_manifest(manifest):
+	"""
+	Read a batch manifest with one "wave_file transcript_file output_file" triple per line.
+	Fields are separated by tabs, or by whitespace when a line has no tabs.
+	Blank lines and lines starting with # are ignored.
+	"""
+	entries = []
+	with open(manifest, 'r', encoding='utf-8') as f:
+		for line in f:
+			line = line.strip()
+			if not line or line.startswith('#'):
+				continue
+			parts = line.split('\t') if '\t' in line else line.split()
+			if len(parts) != 3:
+				raise ValueError("Manifest lines need a wave file, a transcript file and an output file: " + line)
+			entries.append(tuple(p.strip() for p in parts))
+	return entries
+
+
+def _import_g2p():
+	"""Import the bin/ Hangul G2P."""
+	if BIN_DIR not in sys.path:
+		sys.path.insert(0, BIN_DIR)
+	import hangul_g2p
+	return hangul_g2p
+
+
+class Aligner(object):
+	"""
+	Forced aligner for use from long-lived processes.
+
+	The model paths, the model dictionary (plus dict.local) and the G2P modules are loaded
+	once; align() and align_many() then only do the per-file work, each job in its own
+	working directory under tmp_root and with its own lexicon overlay for the G2P entries.
+	HVite gets a dictionary and phone list trimmed to the words of the job.
+
+	Messages of a job, and the output of sox, HCopy and HVite, go to the log callable
+	given to align() or align_many() (print by default), never to a shared sys.stdout,
+	so jobs running in several threads keep separate logs.
+	"""
+
+	def __init__(self, mypath=None, sr_override=None, surround='sil', between=None,
+				 tmp_root='./tmp', local_dict='dict.local', frontend='hcopy', decoder='hvite', binary_model=False,
+				 g2p_cache=None, learned_lexicon=None):
+		self.mypath, self.hmmsubdir, self.sr_models = resolve_model(mypath)
+		if sr_override is not None and self.sr_models is not None and sr_override not in self.sr_models:
+			raise ValueError("invalid sample rate: not an acoustic model available")
+		if frontend not in FRONTENDS:
+			raise ValueError("unknown front end: " + str(frontend) + " (use one of " + ', '.join(FRONTENDS) + ")")
+		self.frontend = frontend
+		self._mfcc = {}
+		if decoder not in DECODERS:
+			raise ValueError("unknown decoder: " + str(decoder) + " (use one of " + ', '.join(DECODERS) + ")")
+		self.decoder = decoder
+		self._decoders = {}
+		self.binary_model = binary_model
+		# hmmdir -> (_binary_model_stat, whether its binary model is current)
+		self._binary_current = {}
+		self.sr_override = sr_override
+		self.surround = surround
+		self.between = between
+		self.tmp_root = tmp_root
+		self.phone_list = _phone_list(self.mypath)
+		with open(self.phone_list, 'r') as f:
+			self.phones = [l.strip() for l in f if l.strip()]
+
+		# read-only base lexicon; the entries of a job go into its own overlay (see lexicon.py)
+		self.lexicon = lexicon.Lexicon.from_files(
+			self.mypath + '/dict', local_dict if local_dict is not None and os.path.exists(local_dict) else None)
+		self._g2p = None
+		self.g2p_cache_path = g2p_cache
+		self.g2p_cache = None
+		# words the G2P pronounced in earlier jobs, least recently used evicted beyond a cap
+		self.learned = lexicon_store.LexiconStore(learned_lexicon) if learned_lexicon is not None else None
+
+	def hmmdir(self, SR):
+		return self.mypath + ("/" + str(SR) if self.hmmsubdir == "FROM-SR" else self.hmmsubdir)
+
+	def extract_features(self, hmmdir, pairs, workdir, log=print):
+		"""
+		Write the features of (wave file, feature file) pairs plus the scp files HVite reads,
+		using HCopy or the in-process NumPy front end (mfcc.py) driven by hmmdir/config.
+		"""
+		prep_batch_scp(pairs, workdir)
+		if self.frontend == 'numpy':
+			config = hmmdir + '/config'
+			if config not in self._mfcc:
+				import mfcc
+				self._mfcc[config] = mfcc.MFCC.from_config_file(config)
+			self._mfcc[config].convert_many(pairs)
+		else:
+			create_plp(hmmdir + '/config', workdir, log)
+
+	def model_dir(self, hmmdir, log=print):
+		"""
+		Where HVite loads the model of hmmdir from: its binary model with binary_model if
+		that is current, else hmmdir. The checksum is only taken again when the files change.
+		"""
+		if not self.binary_model:
+			return hmmdir
+		stat = _binary_model_stat(hmmdir)
+		if self._binary_current.get(hmmdir, (None,))[0] != stat:
+			self._binary_current[hmmdir] = (stat, binary_model_is_current(hmmdir, log))
+		return binary_model_dir(hmmdir) if self._binary_current[hmmdir][1] else hmmdir
+
+	def viterbi(self, input_mlf, word_dictionary, phone_list, output_mlf, hmmdir, workdir, log=print):
+		"""Run the forced alignment with HVite or with the in-process decoder (model loaded once)."""
+		if self.decoder == 'python':
+			import viterbi_align
+			if hmmdir not in self._decoders:
+				self._decoders[hmmdir] = viterbi_align.ViterbiAligner.from_hmmdir(hmmdir)
+			viterbi_align.viterbi(input_mlf, word_dictionary, output_mlf, hmmdir, workdir, self._decoders[hmmdir], log)
+		else:
+			viterbi(input_mlf, word_dictionary, output_mlf, phone_list, self.model_dir(hmmdir, log), workdir, log=log)
+
+	def g2p(self):
+		if self._g2p is None:
+			self._g2p = _import_g2p()
+			if self.g2p_cache_path is not None:
+				import g2p_cache
+				self.g2p_cache = g2p_cache.G2PCache(self.g2p_cache_path)
+		return self._g2p
+
+	def _prepare_transcript(self, trsfile):
+		"""
+		Return (transcript text for the MLF, display map, new dictionary lines, words romanized
+		from Hangul) for one transcript. Hangul transcripts are romanized and get pronunciations
+		from the G2P, in memory.
+		"""
+		text = _read_text_any_encoding(trsfile)
+		if not _contains_hangul(text):
+			return text, {}, [], frozenset()
+
+		romanized, entries = self.g2p().g2p(text, self.g2p_cache)
+		new_lines = [' '.join(l.split()) for l in entries if l.strip()]
+		hangul_words = frozenset(normalize_transcript.normalizer.iter_words(romanized))
+		return ''.join(l + '\n' for l in romanized), _display_map(text.splitlines(), romanized), new_lines, hangul_words
+
+	def _transcript_words(self, trsfile, text, overlay, hangul_words, log=print):
+		"""
+		Return the MLF words for the text of trsfile and print its OOV rate against the base
+		lexicon. Missing words spelled in Hangul syllable names are pronounced by the G2P and
+		added to overlay, the LexiconOverlay of the job; those not among hangul_words are
+		logged as guesses.
+		"""
+		oov_lines = []
+		report = {}
+		pronounce = self._pronouncer(overlay, oov_lines, hangul_words, log)
+		words = text_words(text, overlay.words, self.surround, self.between, pronounce, report, log, self.lexicon)
+		overlay.add(oov_lines)
+		log(oov_summary(trsfile, report))
+		return words
+
+	def _pronouncer(self, overlay, oov_lines, hangul_words=None, log=print):
+		"""pronounce(word) for text_words: from the learned lexicon if the word is there, else by the G2P."""
+		pronounce_g2p = g2p_pronouncer(self.g2p(), overlay.words, oov_lines, self.g2p_cache, hangul_words, log)
+		if self.learned is None:
+			return pronounce_g2p
+
+		def pronounce(word):
+			entries = self.learned.recall([word])
+			if not entries:
+				return pronounce_g2p(word)
+			oov_lines.extend(entries)
+			overlay.words[word] = True
+			return True
+		return pronounce
+
+	def _learn(self, overlay, words):
+		"""
+		Keep the entries the job added for words (of utterances that were aligned) missing
+		from the base lexicon in the learned lexicon.
+		"""
+		if self.learned is not None:
+			words = set(words)
+			self.learned.learn([line for line in overlay.lines
+								if line.split(None, 1)[0] in words and line.split(None, 1)[0] not in self.lexicon])
+
+	def _write_job_dictionary(self, workdir, overlay, words):
+		"""Write the dictionary and phone list HVite gets, trimmed to words; returns their paths."""
+		word_dictionary = os.path.join(workdir, 'dict')
+		phone_list = os.path.join(workdir, 'monophones')
+		phones = write_trimmed_dictionary(word_dictionary, overlay.entries(words), words)
+		write_phone_list(phone_list, phones, self.phones)
+		return word_dictionary, phone_list
+
+	def align(self, wavfile, trsfile, outfile=None, wave_start="0.0", wave_end=None, log=print):
+		"""
+		Align one wave file with its transcript and return the word alignments
+		(see readAlignedMLF). A TextGrid is written as well when outfile is given.
+		Messages go to log, a callable taking one string.
+		"""
+		workdir = prep_working_directory(self.tmp_root)
+		try:
+			input_mlf = os.path.join(workdir, 'tmp.mlf')
+			output_mlf = os.path.join(workdir, 'aligned.mlf')
+
+			# If transcript is in Hangul, convert it to romanized tokens and augment dictionary
+			text, display_map, new_lines, hangul_words = self._prepare_transcript(trsfile)
+			if new_lines:
+				log("Detected Hangul transcript; converting and augmenting dictionary...")
+			overlay = lexicon.LexiconOverlay(self.lexicon, new_lines)
+
+			# prepare wavefile: do a resampling if necessary
+			tmpwav = os.path.join(workdir, 'sound.wav')
+			SR = prep_wav(wavfile, tmpwav, self.sr_override, wave_start, wave_end, self.sr_models, log)
+
+			# prepare mlfile (use converted transcript if applicable)
+			words = self._transcript_words(trsfile, text, overlay, hangul_words, log)
+			writeInputMLF(input_mlf, words)
+			word_dictionary, phone_list = self._write_job_dictionary(workdir, overlay, words)
+
+			# generate the features (and the scp files listing them) for this configuration
+			self.extract_features(self.hmmdir(SR), [(tmpwav, os.path.join(workdir, 'tmp.mfc'))], workdir, log)
+
+			# run Viterbi decoding
+			log("Running HVite..." if self.decoder == 'hvite' else "Running Viterbi decoder...")
+			self.viterbi(input_mlf, word_dictionary, phone_list, output_mlf, self.hmmdir(SR), workdir, log)
+
+			alignments = readAlignedMLF(output_mlf, SR, float(wave_start))
+			self._learn(overlay, words)
+		finally:
+			cleanup_working_directory(workdir)
+
+		# output the alignment as a Praat TextGrid
+		if outfile is not None:
+			display_map.setdefault('SIL', 'sil')
+			display_map.setdefault('SP', 'sp')
+			writeTextGrid(outfile, alignments, display_map)
+		return alignments
+
+	def align_many(self, entries, log=print):
+		"""
+		Align many (wave_file, transcript_file, output_file) triples and write one TextGrid each.
+		All utterances share one dictionary (trimmed to their words), and HCopy and HVite run
+		once per sample rate (normally once in total) over multi-utterance scp and MLF files.
+		Returns a list of (wave_file, output_file, ok, message) in the order of entries.
+		Messages go to log, as for align().
+		"""
+		status = [(False, "Not aligned")] * len(entries)
+
+		workdir = prep_working_directory(self.tmp_root)
+		try:
+			# romanize Hangul transcripts one by one; the dictionary is shared by all of them
+			utts = []
+			new_lines = set()
+			for i, (wavfile, trsfile, outfile) in enumerate(entries):
+				label = 'utt%06d' % i
+				try:
+					text, display_map, lines, hangul_words = self._prepare_transcript(trsfile)
+				except Exception as e:
+					status[i] = (False, "Cannot prepare transcript: " + str(e))
+					continue
+				new_lines.update(lines)
+				utts.append((i, label, text, display_map, hangul_words))
+
+			overlay = lexicon.LexiconOverlay(self.lexicon, sorted(new_lines))
+
+			# prepare wave files and transcripts, grouped by the sample rate of the model they need
+			groups = {}
+			for i, label, text, display_map, hangul_words in utts:
+				wavfile, trsfile = entries[i][:2]
+				try:
+					SR = prep_wav(wavfile, os.path.join(workdir, label + '.wav'), self.sr_override, "0.0", None,
+								  self.sr_models, log)
+					words = self._transcript_words(trsfile, text, overlay, hangul_words, log)
+				except Exception as e:
+					status[i] = (False, "Preparation failed: " + str(e))
+					continue
+				groups.setdefault(SR, []).append((i, label, words, display_map))
+
+			word_dictionary, phone_list = self._write_job_dictionary(
+				workdir, overlay,
+				[w for group in groups.values() for i, label, words, display_map in group for w in words])
+
+			for SR, group in sorted(groups.items()):
+				hmmdir = self.hmmdir(SR)
+				groupdir = os.path.join(workdir, 'sr' + str(SR))
+				os.makedirs(groupdir)
+				input_mlf = os.path.join(groupdir, 'tmp.mlf')
+				output_mlf = os.path.join(groupdir, 'aligned.mlf')
+
+				writeBatchInputMLF(input_mlf, [(label, words) for i, label, words, display_map in group])
+				self.extract_features(hmmdir, [(os.path.join(workdir, label + '.wav'), os.path.join(groupdir, label + '.mfc'))
+											   for i, label, words, display_map in group], groupdir, log)
+				log("Running " + ("HVite" if self.decoder == 'hvite' else "Viterbi decoder") + " on " +
+					  str(len(group)) + " utterance(s) at " + str(SR) + " Hz...")
+				self.viterbi(input_mlf, word_dictionary, phone_list, output_mlf, hmmdir, groupdir, log)
+
+				aligned = readBatchAlignedMLF(output_mlf) if os.path.exists(output_mlf) else {}
+				aligned_words = set()
+				for i, label, words, display_map in group:
+					if label not in aligned:
+						status[i] = (False, "Alignment did not complete succesfully.")
+						continue
+					try:
+						alignments = _parse_aligned_lines(aligned[label], SR, 0.0)
+						display_map.setdefault('SIL', 'sil')
+						display_map.setdefault('SP', 'sp')
+						writeTextGrid(entries[i][2], alignments, display_map)
+						status[i] = (True, "OK")
+						aligned_words.update(words)
+					except Exception as e:
+						status[i] = (False, str(e))
+				self._learn(overlay, aligned_words)
+		finally:
+			cleanup_working_directory(workdir)
+
+		return [(entry[0], entry[2], ok, msg) for entry, (ok, msg) in zip(entries, status)]
+
+
+def align_batch(entries, mypath=None, sr_override=None, surround='sil', between=None, tmp_root='./tmp',
+				frontend='hcopy', decoder='hvite', binary_model=False, g2p_cache=None, learned_lexicon=None):
+	"""Align (wave_file, transcript_file, output_file) triples in one batch; see Aligner.align_many."""
+	return Aligner(mypath, sr_override, surround, between, tmp_root, frontend=frontend,
+				   decoder=decoder, binary_model=binary_model, g2p_cache=g2p_cache,
+				   learned_lexicon=learned_lexicon).align_many(entries)
 
 
 def getopt2(name, opts, default=None):
@@ -489,13 +1063,21 @@ def getopt2(name, opts, default=None):
 
 if __name__ == '__main__':
 	try:
-		opts, args = getopt.getopt(sys.argv[1:], "r:s:e:", ["model="])
-
-		# get the three mandatory arguments
-		if len(args) != 3:
+		opts, args = getopt.getopt(sys.argv[1:], "r:s:e:", ["model=", "manifest=", "frontend=", "decoder=", "binary-model",
+																   "g2p-cache=", "learned-lexicon="])
+
+		manifest = getopt2("--manifest", opts, None)
+
+		# get the three mandatory arguments, unless a batch manifest lists them
+		if manifest is not None:
+			if len(args) != 0:
+				raise ValueError("Specify either a manifest or a wavefile, a transcript file, and an output file!")
+			if getopt2("-s", opts) is not None or getopt2("-e", opts) is not None:
+				raise ValueError("-s and -e cannot be used with a manifest")
+		elif len(args) != 3:
 			raise ValueError("Specify wavefile, a transcript file, and an output file!")
-
-		wavfile, trsfile, outfile = args
+		else:
+			wavfile, trsfile, outfile = args
 
 		sr_override = getopt2("-r", opts, None)
 		wave_start = getopt2("-s", opts, "0.0")
@@ -504,7 +1086,6 @@ if __name__ == '__main__':
 		# Do NOT insert sp in MLF to avoid tee-model conflicts
 		surround_token = getopt2("-p", opts, 'sil')
 		between_token = getopt2("-b", opts, None)
-		display_map = None
 
 		if sr_override is not None:
 			try:
@@ -518,99 +1099,34 @@ if __name__ == '__main__':
 			between_token = None
 
 		mypath = getopt2("--model", opts, None)
+		frontend = getopt2("--frontend", opts, 'hcopy')
+		decoder = getopt2("--decoder", opts, 'hvite')
+		binary_model = getopt2("--binary-model", opts) is not None
+		g2p_cache = getopt2("--g2p-cache", opts, None)
+		learned_lexicon = getopt2("--learned-lexicon", opts, None)
 	except Exception:
 		print(__doc__)
 		(_type, value, _traceback) = sys.exc_info()
 		print(value)
 		sys.exit(0)
 
-	# If no model directory was said explicitly, get directory containing this script.
-	hmmsubdir = ""
-	sr_models = None
-	if mypath is None:
-		mypath = os.path.dirname(os.path.abspath(sys.argv[0])) + "/model"
-		hmmsubdir = "FROM-SR"
-		# sample rates for which there are acoustic models set up, otherwise
-		# the signal must be resampled to one of these rates.
-		sr_models = [8000, 11025, 16000]
-
-	if sr_override is not None and sr_models is not None and sr_override not in sr_models:
-		raise ValueError("invalid sample rate: not an acoustic model available")
-
-	word_dictionary = "./tmp/dict"
-	input_mlf = './tmp/tmp.mlf'
-	output_mlf = './tmp/aligned.mlf'
-
-	# create working directory
-	prep_working_directory()
-
-	# Helper: detect if transcript contains Hangul (try multiple encodings)
-	def contains_hangul(path: str) -> bool:
-		try:
-			text = _read_text_any_encoding(path)
-			for ch in text:
-				code = ord(ch)
-				if 0xAC00 <= code <= 0xD7A3:
-					return True
-			return False
-		except Exception:
-			return False
-
-	# If transcript is in Hangul, convert it to romanized tokens and augment dictionary
-	trsfile_for_mlf = trsfile
-	if contains_hangul(trsfile):
-		print("Detected Hangul transcript; converting and augmenting dictionary...")
-		# Prepare temp input in ./tmp
-		os.system('cp -f "' + trsfile + '" ./tmp/hangul.txt')
-		# 1) Convert sentences to romanized word tokens into ./tmp/sentence_unicode.txt
-		#    Note: convert_sentences_unicode.py expects UTF-8 input; our hangul.txt is copied as-is.
-		os.system('cd ./tmp && python3 ../bin/convert_sentences_unicode.py hangul.txt')
-		trsfile_for_mlf = './tmp/sentence_unicode.txt'
-		# 2) Build kdict0/kdict1 in ./tmp from the same Hangul input
-		os.system('cd ./tmp && python3 ../bin/han2uniconversion.py hangul.txt')
-		os.system('cd ./tmp && python3 ../bin/make_kdict.py')
-		# 3) Merge with model dict using add_dict.py inside bin (expects kdict1 in CWD)
-		os.system('cp -f ./tmp/kdict1.txt ./bin/kdict1.txt')
-		os.system('cd ./bin && python3 add_dict.py')
-		# 4) Use the merged dict from bin for this run
-		os.system('cp -f ./bin/dict ' + word_dictionary)
-		display_map = _build_display_map('./tmp/hangul.txt', trsfile_for_mlf)
-	else:
-		# Default: start from model dict (+ optional local)
-		if os.path.exists("dict.local"):
-			os.system("cat " + mypath + "/dict dict.local > " + word_dictionary)
-		else:
-			os.system("cat " + mypath + "/dict > " + word_dictionary)
-		display_map = {}
-
-	# prepare wavefile: do a resampling if necessary
-	tmpwav = "./tmp/sound.wav"
-	SR = prep_wav(wavfile, tmpwav, sr_override, wave_start, wave_end)
-
-	if hmmsubdir == "FROM-SR":
-		hmmsubdir = "/" + str(SR)
-
-	# prepare mlfile (use converted transcript if applicable)
-	prep_mlf(trsfile_for_mlf, input_mlf, word_dictionary, surround_token, between_token)
-
-	# prepare scp files
-	prep_scp(tmpwav)
-
-	# generate the plp file using a given configuration file for HCopy
-	create_plp(mypath + hmmsubdir + '/config')
-
-	# run Viterbi decoding
-	print("Running HVite...")
-	mpfile = mypath + '/monophones'
-	if not os.path.exists(mpfile):
-		mpfile = mypath + '/hmmnames'
-	viterbi(input_mlf, word_dictionary, output_mlf, mpfile, mypath + hmmsubdir)
-
-	# output the alignment as a Praat TextGrid
-	alignments = readAlignedMLF(output_mlf, SR, float(wave_start))
-	if display_map is None:
-		display_map = {}
-	display_map.setdefault('SIL', 'sil')
-	display_map.setdefault('SP', 'sp')
-	writeTextGrid(outfile, alignments, display_map)
-
+	try:
+		aligner = Aligner(mypath, sr_override, surround_token, between_token, frontend=frontend, decoder=decoder,
+						  binary_model=binary_model, g2p_cache=g2p_cache, learned_lexicon=learned_lexicon)
+	except ValueError as e:
+		print(e)
+		sys.exit(1)
+
+	if manifest is not None:
+		results = aligner.align_many(read_manifest(manifest))
+		failed = 0
+		for wav, out, ok, msg in results:
+			if not ok:
+				failed += 1
+			print(("OK     " if ok else "FAILED ") + wav + " -> " + out + ("" if ok else ": " + msg))
+		print("Aligned " + str(len(results) - failed) + " of " + str(len(results)) + " file(s).")
+		if aligner.g2p_cache is not None:
+			print("G2P cache: %(hits)d hits, %(file_hits)d file hits, %(misses)d misses" % aligner.g2p_cache.stats())
+		sys.exit(1 if failed else 0)
+
+	aligner.align(wavfile, trsfile, outfile, wave_start, wave_end)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+"""
+Command-line usage:
+  python align_corpus.py [options] corpus
+  where corpus is either a directory of wave files with matching .lab/.txt transcripts
+  (searched recursively) or a manifest file as accepted by align.py --manifest,
+  and options may include:
+	-j jobs          -- number of worker processes (default: number of CPUs)
+	-o output_dir    -- where to write TextGrids in directory mode (default: next to each wave file)
+	-r sampling_rate -- override which sample rate model to use, one of 8000, 11025, and 16000
+	--model=dir      -- acoustic model directory (default: model/ next to align.py)
+	--frontend=name  -- feature extraction: hcopy (default) or numpy (see mfcc.py)
+	--decoder=name   -- forced alignment: hvite (default) or python (see viterbi_align.py)
+	--binary-model   -- let HVite load the HTK binary model made by make_binary_model.py, if up to date
+	--g2p-cache=file -- keep Hangul pronunciations in this SQLite file for later runs (see bin/g2p_cache.py)
+	--learned-lexicon=file -- remember G2P words in this lexicon store, capped, for later runs (see lexicon_store.py)
+
+The corpus is split into one shard per worker. Every worker aligns its shard with
+align.Aligner.align_many(), i.e. in its own working directory and with a single HCopy
+and HVite run. Per-file results and the aggregate throughput are printed at the end.
+"""
+
+import os
+import sys
+import getopt
+import time
+import wave
+import multiprocessing
+
+import align
+
+
+TRANSCRIPT_EXTS = ['.lab', '.txt']
+
+
+def find_corpus_entries(corpus_dir, output_dir=None):
+	"""
+	Pair every wave file under corpus_dir with the transcript of the same stem.
+	Returns (entries, unpaired) where entries are (wave_file, transcript_file, output_file)
+	triples and unpaired lists wave files without a transcript.
+	"""
+	entries = []
+	unpaired = []
+	for root, dirs, files in os.walk(corpus_dir):
+		dirs.sort()
+		for name in sorted(files):
+			base, ext = os.path.splitext(name)
+			if ext.lower() != '.wav':
+				continue
+			wavfile = os.path.join(root, name)
+			trsfile = None
+			for trs_ext in TRANSCRIPT_EXTS:
+				if os.path.exists(os.path.join(root, base + trs_ext)):
+					trsfile = os.path.join(root, base + trs_ext)
+					break
+			if trsfile is None:
+				unpaired.append(wavfile)
+				continue
+			if output_dir is None:
+				outfile = os.path.join(root, base + '.TextGrid')
+			else:
+				outfile = os.path.join(output_dir, os.path.relpath(root, corpus_dir), base + '.TextGrid')
+			entries.append((wavfile, trsfile, os.path.normpath(outfile)))
+	return entries, unpaired
+
+
+def audio_duration(wavfile):
+	"""Duration of a wave file in seconds, or 0.0 if it cannot be read."""
+	try:
+		f = wave.open(wavfile, 'r')
+		try:
+			return f.getnframes() / float(f.getframerate())
+		finally:
+			f.close()
+	except Exception:
+		return 0.0
+
+
+def shard_entries(entries, durations, jobs):
+	"""
+	Split entries into at most jobs shards of roughly equal total audio duration
+	(longest files first, each to the currently lightest shard). The shards are lists
+	of (index, entry) pairs, index being the position of the entry in entries.
+	"""
+	shards = [[] for _ in range(max(1, min(jobs, len(entries))))]
+	loads = [0.0] * len(shards)
+	for k in sorted(range(len(entries)), key=lambda k: -durations[k]):
+		lightest = loads.index(min(loads))
+		shards[lightest].append((k, entries[k]))
+		loads[lightest] += durations[k]
+	return [shard for shard in shards if shard]
+
+
+# one Aligner per worker process, created by _init_worker
+_aligner = None
+
+
+def _init_worker(mypath, sr_override, frontend='hcopy', decoder='hvite', binary_model=False, g2p_cache=None,
+				 learned_lexicon=None):
+	global _aligner
+	_aligner = align.Aligner(mypath, sr_override, frontend=frontend, decoder=decoder, binary_model=binary_model,
+							 g2p_cache=g2p_cache, learned_lexicon=learned_lexicon)
+
+
+def _align_shard(shard):
+	"""(index, result) pairs of the (index, entry) pairs of a shard."""
+	indexes = [k for k, entry in shard]
+	entries = [entry for k, entry in shard]
+	for entry in entries:
+		outdir = os.path.dirname(entry[2])
+		if outdir:
+			os.makedirs(outdir, exist_ok=True)
+	try:
+		results = _aligner.align_many(entries)
+	except Exception as e:
+		results = [(entry[0], entry[2], False, "Worker failed: " + str(e)) for entry in entries]
+	return list(zip(indexes, results))
+
+
+def align_corpus(entries, jobs, mypath=None, sr_override=None, frontend='hcopy', decoder='hvite',
+				 binary_model=False, g2p_cache=None, learned_lexicon=None):
+	"""
+	Align entries with a pool of jobs worker processes.
+	Returns (results, audio_seconds, wall_seconds) where results are the
+	(wave_file, output_file, ok, message) tuples of align.Aligner.align_many(),
+	in the order of entries.
+	"""
+	durations = [audio_duration(entry[0]) for entry in entries]
+	shards = shard_entries(entries, durations, jobs)
+
+	start = time.time()
+	indexed = []
+	if len(shards) == 1:
+		_init_worker(mypath, sr_override, frontend, decoder, binary_model, g2p_cache, learned_lexicon)
+		indexed.extend(_align_shard(shards[0]))
+	elif shards:
+		with multiprocessing.Pool(len(shards), _init_worker,
+								  (mypath, sr_override, frontend, decoder, binary_model, g2p_cache,
+								   learned_lexicon)) as pool:
+			for shard_results in pool.imap_unordered(_align_shard, shards):
+				indexed.extend(shard_results)
+	wall = time.time() - start
+
+	# by entry index: a manifest may align one wave file more than once
+	indexed.sort(key=lambda item: item[0])
+	audio_seconds = sum(durations[k] for k, (wav, out, ok, msg) in indexed if ok)
+	return [result for k, result in indexed], audio_seconds, wall
+
+
+if __name__ == '__main__':
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "j:o:r:", ["jobs=", "output=", "model=", "frontend=", "decoder=", "binary-model",
+															  "g2p-cache=", "learned-lexicon="])
+		if len(args) != 1:
+			raise ValueError("Specify a corpus directory or a manifest file!")
+		corpus = args[0]
+
+		jobs = align.getopt2("-j", opts, align.getopt2("--jobs", opts, None))
+		jobs = int(jobs) if jobs is not None else (os.cpu_count() or 1)
+		if jobs < 1:
+			raise ValueError("-j must be at least 1")
+		output_dir = align.getopt2("-o", opts, align.getopt2("--output", opts, None))
+		sr_override = align.getopt2("-r", opts, None)
+		if sr_override is not None:
+			sr_override = int(sr_override)
+		mypath = align.getopt2("--model", opts, None)
+		frontend = align.getopt2("--frontend", opts, 'hcopy')
+		decoder = align.getopt2("--decoder", opts, 'hvite')
+		binary_model = align.getopt2("--binary-model", opts) is not None
+		g2p_cache = align.getopt2("--g2p-cache", opts, None)
+		learned_lexicon = align.getopt2("--learned-lexicon", opts, None)
+	except Exception:
+		print(__doc__)
+		(_type, value, _traceback) = sys.exc_info()
+		print(value)
+		sys.exit(0)
+
+	if os.path.isdir(corpus):
+		entries, unpaired = find_corpus_entries(corpus, output_dir)
+		for wavfile in unpaired:
+			print("SKIPPING " + wavfile + ": no transcript")
+	else:
+		entries = align.read_manifest(corpus)
+
+	if not entries:
+		print("Nothing to align.")
+		sys.exit(1)
+
+	print("Aligning " + str(len(entries)) + " file(s) with " + str(min(jobs, len(entries))) + " worker(s)...")
+	results, audio_seconds, wall = align_corpus(entries, jobs, mypath, sr_override, frontend, decoder,
+												   binary_model, g2p_cache, learned_lexicon)
+
+	failed = 0
+	for wav, out, ok, msg in results:
+		if not ok:
+			failed += 1
+		print(("OK     " if ok else "FAILED ") + wav + " -> " + out + ("" if ok else ": " + msg))
+
+	print("Aligned " + str(len(results) - failed) + " of " + str(len(results)) + " file(s) in %.1f s" % wall)
+	if wall > 0:
+		print("Throughput: %.1f audio-seconds/s (%.1f s of audio)" % (audio_seconds / wall, audio_seconds))
+	sys.exit(1 if failed else 0)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+"""
+Command-line usage:
+  python align_server.py [options]
+  where options may include:
+	-j jobs          -- number of alignments allowed to run at the same time (default 2)
+	--socket=path    -- Unix domain socket to listen on (default tmp/aligner.sock next to this script)
+	--model=dir      -- acoustic model directory (default: model/ next to align.py)
+	--frontend=name  -- feature extraction: hcopy (default) or numpy (see mfcc.py)
+	--decoder=name   -- forced alignment: hvite (default) or python (see viterbi_align.py)
+	--binary-model   -- let HVite load the HTK binary model made by make_binary_model.py, if up to date
+	--g2p-cache=file -- keep Hangul pronunciations in this SQLite file for later runs (see bin/g2p_cache.py)
+	--learned-lexicon=file -- remember G2P words in this lexicon store, capped, for later runs (see lexicon_store.py)
+
+Long-running aligner service. The dictionary, G2P tables and model paths are loaded once
+(see align.Aligner) and alignment jobs are accepted as one JSON object per line:
+
+	{"wav": "a.wav", "transcript": "a.lab", "output": "a.TextGrid"}
+	{"wav": "a.wav", "transcript": "a.lab", "output": "a.TextGrid", "start": "1.5", "end": "3.0"}
+	{"batch": [["a.wav", "a.lab", "a.TextGrid"], ["b.wav", "b.lab", "b.TextGrid"]]}
+	{"ping": true}
+
+Each request gets one JSON line back with "ok" and "message" (plus "results" for a batch,
+as returned by align.Aligner.align_many). Paths are used as given, so they should be absolute.
+Use request_alignment() to talk to the server from Python.
+"""
+
+import os
+import sys
+import json
+import getopt
+import signal
+import socket
+import socketserver
+import threading
+
+import align
+
+
+DEFAULT_SOCKET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tmp', 'aligner.sock')
+
+
+def _log_text(log):
+	return ''.join(line + '\n' for line in log)
+
+
+class AlignerRequestHandler(socketserver.StreamRequestHandler):
+
+	def handle(self):
+		for raw in self.rfile:
+			if not raw.strip():
+				continue
+			try:
+				reply = self.server.run_job(json.loads(raw.decode('utf-8')))
+			except Exception as e:
+				reply = {"ok": False, "message": "Exception: " + str(e)}
+			self.wfile.write((json.dumps(reply, ensure_ascii=False) + '\n').encode('utf-8'))
+			self.wfile.flush()
+
+
+class AlignerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	"""Unix socket server sharing one align.Aligner; at most jobs alignments run at once."""
+
+	daemon_threads = True
+
+	def __init__(self, socket_path, aligner, jobs=2):
+		if os.path.exists(socket_path):
+			os.remove(socket_path)
+		socket_dir = os.path.dirname(socket_path)
+		if socket_dir:
+			os.makedirs(socket_dir, exist_ok=True)
+		socketserver.UnixStreamServer.__init__(self, socket_path, AlignerRequestHandler)
+		self.socket_path = socket_path
+		self.aligner = aligner
+		self.slots = threading.BoundedSemaphore(jobs)
+
+	def run_job(self, job):
+		if job.get("ping"):
+			return {"ok": True, "message": "pong"}
+
+		# the messages of this job only; jobs run in parallel threads sharing sys.stdout
+		log = []
+		with self.slots:
+			if "batch" in job:
+				entries = [tuple(entry) for entry in job["batch"]]
+				results = self.aligner.align_many(entries, log=log.append)
+				failed = sum(1 for r in results if not r[2])
+				message = "Aligned " + str(len(results) - failed) + " of " + str(len(results)) + " file(s)."
+				return {"ok": failed == 0, "message": message, "results": results, "log": _log_text(log)}
+
+			try:
+				self.aligner.align(job["wav"], job["transcript"], job["output"],
+								   str(job.get("start", "0.0")), job.get("end"), log=log.append)
+			except Exception as e:
+				return {"ok": False, "message": "Exception: " + str(e), "log": _log_text(log)}
+			ok = os.path.exists(job["output"])
+			return {"ok": ok, "message": "OK" if ok else "Failed without output", "log": _log_text(log)}
+
+	def server_close(self):
+		socketserver.UnixStreamServer.server_close(self)
+		if os.path.exists(self.socket_path):
+			os.remove(self.socket_path)
+
+
+def request_alignment(job, socket_path=DEFAULT_SOCKET, timeout=None):
+	"""Send one job (a dict as described above) to a running server and return its reply."""
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+		sock.settimeout(timeout)
+		sock.connect(socket_path)
+		sock.sendall((json.dumps(job, ensure_ascii=False) + '\n').encode('utf-8'))
+		with sock.makefile('rb') as f:
+			line = f.readline()
+	if not line:
+		raise ConnectionError("aligner server closed the connection without a reply")
+	return json.loads(line.decode('utf-8'))
+
+
+if __name__ == '__main__':
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "j:", ["socket=", "model=", "frontend=", "decoder=", "binary-model",
+														  "g2p-cache=", "learned-lexicon="])
+		if len(args) != 0:
+			raise ValueError("align_server.py takes no positional arguments")
+		jobs = int(align.getopt2("-j", opts, "2"))
+		if jobs < 1:
+			raise ValueError("-j must be at least 1")
+		socket_path = align.getopt2("--socket", opts, DEFAULT_SOCKET)
+		mypath = align.getopt2("--model", opts, None)
+		frontend = align.getopt2("--frontend", opts, 'hcopy')
+		decoder = align.getopt2("--decoder", opts, 'hvite')
+		binary_model = align.getopt2("--binary-model", opts) is not None
+		g2p_cache = align.getopt2("--g2p-cache", opts, None)
+		learned_lexicon = align.getopt2("--learned-lexicon", opts, None)
+	except Exception:
+		print(__doc__)
+		(_type, value, _traceback) = sys.exc_info()
+		print(value)
+		sys.exit(0)
+
+	aligner = align.Aligner(mypath, frontend=frontend, decoder=decoder, binary_model=binary_model, g2p_cache=g2p_cache,
+							learned_lexicon=learned_lexicon)
+	# load the G2P tables now rather than on the first Hangul job
+	aligner.g2p()
+
+	server = AlignerServer(socket_path, aligner, jobs)
+	signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+	print("Aligner listening on " + socket_path + " (" + str(jobs) + " concurrent job(s))")
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 import os
 import sys
+import heapq
+import tempfile
 
 """
    Usage:
+       python add_dict.py [origdict newdict outdict]
+
        Input: kdict1.txt
               dict (in model)
        Output: dict (a new and appended one)
@@ -12,44 +16,90 @@ import sys
    McMaster University
    (c) Dec. 2011
 """
-def read_file(origdict: str, newdict: str, outdict: str) -> None:
+# normalized lines sorted in memory at a time; more are spilled to disk as sorted runs
+RUN_SIZE = 1000000
+
+
+def load_lines(path: str):
+    """Yield the lines of a dictionary file with whitespace normalized, skipping empty ones."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for raw in f:
+            s = ' '.join(raw.strip().split())
+            if s:
+                yield s
+
+
+def _spill(run: set, tmpdir: str, count: int) -> str:
+    path = os.path.join(tmpdir, "run%06d" % count)
+    with open(path, 'w', encoding='utf-8') as fout:
+        for line in sorted(run):
+            fout.write(line + '\n')
+    return path
+
+
+def _read_run(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield line[:-1]
+
+
+def merged_lines(paths: list, tmpdir: str, run_size: int = RUN_SIZE):
+    """
+    Yield the normalized lines of all files in paths sorted and without duplicates.
+    Up to run_size distinct lines are collected in memory; when there are more, each
+    such run is written sorted to a file in tmpdir and the runs are merged with heapq.merge.
+    """
+    run = set()
+    runs = []
+    for path in paths:
+        for line in load_lines(path):
+            run.add(line)
+            if len(run) >= run_size:
+                runs.append(_spill(run, tmpdir, len(runs)))
+                run = set()
+    if not runs:
+        # everything fit in memory
+        yield from sorted(run)
+        return
+    if run:
+        runs.append(_spill(run, tmpdir, len(runs)))
+    previous = None
+    for line in heapq.merge(*[_read_run(path) for path in runs]):
+        if line != previous:
+            yield line
+            previous = line
+
+
+def read_file(origdict: str, newdict: str, outdict: str, run_size: int = RUN_SIZE) -> None:
     """
     Merge two dictionary files (one term per line) into a new sorted dictionary without duplicates.
     - origdict: existing dictionary (e.g., ../model/dict)
     - newdict:  new entries to append (e.g., kdict1.txt)
     - outdict:  output path (e.g., ./dict)
+    Memory use is bounded by run_size lines (see merged_lines), whatever the size of the files.
+    The output is written next to outdict and renamed, so outdict may be one of the inputs.
     """
-    # Read lines from both files, normalize whitespace, skip empties
-    def load_lines(path: str) -> list[str]:
-        lines: list[str] = []
-        with open(path, 'r', encoding='utf-8') as f:
-            for raw in f:
-                s = ' '.join(raw.strip().split())
-                if s:
-                    lines.append(s)
-        return lines
-
-    orig_lines = load_lines(origdict)
-    new_lines = load_lines(newdict)
-
-    # Merge and sort uniquely
-    merged = sorted(set(orig_lines) | set(new_lines))
-
-    # Write output (overwrite if exists)
-    with open(outdict, 'w', encoding='utf-8') as fout:
-        for line in merged:
-            fout.write(line + '\n')
+    with tempfile.TemporaryDirectory(prefix="add_dict", dir=os.path.dirname(os.path.abspath(outdict))) as tmpdir:
+        tmp = os.path.join(tmpdir, "dict")
+        with open(tmp, 'w', encoding='utf-8') as fout:
+            for line in merged_lines([origdict, newdict], tmpdir, run_size):
+                fout.write(line + '\n')
+        os.replace(tmp, outdict)
 
 
 if __name__ == "__main__":
     # Check whether there is a new dictionary that needs to be appended to the
     # original dict in the model directory. If present, create a merged dict in this folder.
+    # The three paths can be given explicitly so that callers (e.g. align.py) can
+    # merge into a private working directory instead of this folder.
     out_path = "dict"
     src_model_dict = "../model/dict"
     src_new_dict = "kdict1.txt"
+    if len(sys.argv) == 4:
+        src_model_dict, src_new_dict, out_path = sys.argv[1:4]
 
     if not os.path.exists(src_new_dict):
-        print("kdict1.txt is needed to process")
+        print(f"{src_new_dict} is needed to process")
         sys.exit(1)
 
     if not os.path.exists(src_model_dict):
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import sys
+import random
+import re
+
+import make_kdict
+from hangul_jamo import INITIALS, EXTRA_INITIALS, MEDIALS, FINALS, EXTRA_FINALS, name_phones, split_names
+
+"""
+    Usage: python3 check_kdict_rules.py [dictionary ...]
+
+    Checks that the compiled rule table in make_kdict.py rewrites pronunciations
+    exactly like the sequence of re.sub calls it replaced (kept below as
+    legacy_rules). The words compared are every word of the given HTK
+    dictionaries (default: ../model/dict and dict), split back into syllable
+    names, every single syllable, and random words of 2 to 6 syllables.
+    Both make_kdict.dictionary_entry and the batch API are checked.
+"""
+
+debug = 0
+debug2 = 0
+debug3 = 0
+
+
+def legacy_rules(pronstring):
+    """The phonological rules as make_kdict.py applied them before the rule table."""
+    # WITHIN-WORD PHONOLOGICAL RULES ARE DEFINED HERE
+    # Using regular expressions:
+
+    # (?=[...]) is a lookahead assertion that mathes if ... matches next
+    # (?![...]) matches if ... does not match next.
+
+    # (?<=[...]) is a positive lookbehind assertion
+    # (?<![...]) is a negative lookbehind assertion
+
+
+    # 1. Coda neutralization
+    # 1.1. SS + consonant
+
+    if debug and re.search(' gg (?![ayeowui])', pronstring): print("gg + Cons -> g + Cons: ", pronstring)
+    elif debug and re.search(' dd (?![ayeowui])', pronstring): print("dd + Cons -> d + Cons: ", pronstring)
+    elif debug and re.search(' bb (?![ayeowui])', pronstring): print("bb + Cons -> b + Cons: ", pronstring)
+    elif debug and re.search(' jj (?![ayeowui])', pronstring): print("jj + Cons -> j + Cons: ", pronstring)
+    elif debug and re.search(' [k] (?![ayeowui])', pronstring): print("k + cons -> g + Cons: ", pronstring)
+    elif debug and re.search(' [t] (?![ayeowui])', pronstring): print("t + cons -> t + Cons: ", pronstring)
+    elif debug and re.search(' [p] (?![ayeowui])', pronstring): print("p + cons -> b + Cons: ", pronstring)
+    elif debug and re.search(' [c] (?![ayeowui])', pronstring): print("c + Cons -> j + cons: ", pronstring)
+
+    # Coda neutralization
+    # {gg, dd, bb, jj, ss, s, k, t, p, c } --> {G, D, B, J} / __ Consnants
+    pronstring = re.sub('gg (?![ayeowui])', 'g ', pronstring)
+    pronstring = re.sub('dd (?![ayeowui])', 'd ', pronstring)
+    pronstring = re.sub('bb (?![ayeowui])', 'b ', pronstring)
+    pronstring = re.sub('jj (?![ayeowui])', 'j ', pronstring)
+    pronstring = re.sub('k (?![ayeowui])', 'g ', pronstring)
+    pronstring = re.sub('t (?![ayeowui])', 'd ', pronstring)
+    pronstring = re.sub('p (?![ayeowui])', 'b ', pronstring)
+    pronstring = re.sub('c (?![ayeowui])', 'j ', pronstring)
+
+    # {ss, s} --> {d} /___ consonant
+    if debug and re.search('ss (?![ayeowui])', pronstring): print("ss + C --> d + C: ", pronstring)
+    pronstring = re.sub(r'ss (?![ayeowui])', 'd ', pronstring)
+
+    if debug and re.search(' s (?![ayeowui])', pronstring): print("s + C --> d + C: ", pronstring)
+    pronstring = re.sub(r' s (?![ayeowui])', ' d ', pronstring)
+    # SS D --> D D --> D
+
+    pronstring = re.sub(' d d ', ' dd ', pronstring)
+    if debug and re.search(' d d ', pronstring):
+        print("d d: ", pronstring)
+
+    # nasalization: ss n --> n n; s n --> n
+    pronstring = re.sub(r'ss (?=[n])', 'n ', pronstring)
+    pronstring = re.sub(r' s (?=[n])', ' n ', pronstring)
+
+    # 2. Coda cluster simplification
+    # Underlying consonant clusters are subject to simplification,
+    # resulting in removal of either the first or the second consonant
+    pronstring = re.sub(r'lg h', 'l g', pronstring)
+    pronstring = re.sub(r'lg (?=[a e])', 'l g ', pronstring)
+    pronstring = re.sub(r'lg (?=[n b g])', 'g ', pronstring)
+    pronstring = re.sub(r'lh (?=[a d eo g j])', 'l ', pronstring)
+    pronstring = re.sub(r'nh (?=[n g s])', 'n ', pronstring)
+    pronstring = re.sub(r'nh (?=[a e i o u y eu])', 'n ', pronstring)
+    pronstring = re.sub(r'nj (?=[a e i o y eu])', 'n j', pronstring)
+
+    # 3. g h --> k
+    if debug2 and re.search(' [bdgj] h (?=[aeiouwy])', pronstring): print("b/d/g/j h V --> p/t/k/c V: ", pronstring)
+    pronstring = re.sub(' g h (?=[aeiouwy])', ' k ', pronstring)
+    pronstring = re.sub('b h (?=[aeiouwy])', ' p ', pronstring)
+    pronstring = re.sub('d h (?=[aeiouwy])', ' t ', pronstring)
+    pronstring = re.sub('j h (?=[aeiouwy])', ' c ', pronstring)
+
+    # h g --> k
+    if debug3 and re.search(' h [bdgj] (?=[aeiouwy])', pronstring): print("b/d/g/j h V --> p/t/k/c V: ", pronstring)
+    pronstring = re.sub(' h g (?=[aeiouwy])', ' k ', pronstring)
+    pronstring = re.sub('h b (?=[aeiouwy])', ' p ', pronstring)
+    pronstring = re.sub('h d (?=[aeiouwy])', ' t ', pronstring)
+    pronstring = re.sub('h j (?=[aeiouwy])', ' c ', pronstring)
+
+
+
+    # Intervocalic h-deletion and post-sonorant h deletion
+    if debug2 and re.search('(?<=[m n ng l r w y]) h (?=[aeiouwy])', pronstring): print("sonorants h V --> sonorants V: ", pronstring)
+    pronstring = re.sub('(?<=[m n ng l r w y]) h (?=[a e i o u])', ' ', pronstring)
+
+    if debug2 and re.search('(?<=[aeiouwy]) h (?=[aeiouwy])', pronstring): print("V h V --> V V: ", pronstring)
+    pronstring = re.sub('(?<=[aeiouwy]) h (?=[aeiouwy])', ' ', pronstring)
+
+    # h + d --> t;
+
+    # manh.da -> man.ta
+    pronstring = re.sub(r'nh d', 'n t', pronstring)
+    # manh.ji -> man.ci
+    pronstring = re.sub(r'nh j', 'n c', pronstring)
+
+    pronstring = re.sub(r'nj (?=[a y e o w u i])', 'n j ', pronstring)
+    pronstring = re.sub(r'nj (?![a y e o w u i])', 'n ', pronstring)
+
+    # coda cluster simplification + aspiration
+    pronstring = re.sub('lm (?=[d g])', 'm ', pronstring)
+    pronstring = re.sub('lm (?=[e i yi])', 'l m ', pronstring)
+
+    pronstring = re.sub(r'lb (?=[eu])', 'l b ', pronstring)
+    pronstring = re.sub(r'lb (?=[g])', 'b ', pronstring)
+    pronstring = re.sub(r'lb (?=[g])', 'l ', pronstring)
+    pronstring = re.sub(r'lt (?=[a])', 'l t ', pronstring)
+    pronstring = re.sub(r'gs (?=[a e i o u])', 'g s ', pronstring)
+    pronstring = re.sub(r'gs (?![a e i o u])', 'g ', pronstring)
+    pronstring = re.sub(r'bs (?![a y e o w u i])', 'b ', pronstring)
+    pronstring = re.sub(r'bs (?=[a e i o u])', 'b s ', pronstring)
+
+    # Nasalization
+    # {D, DD, T} --> {N} / __ {N, M}
+    pronstring = re.sub(r'[d dd t] (?=[n m])', 'n ', pronstring)
+
+    # {B, BB, P} --> {M} / ___ {M}
+    pronstring = re.sub(r'[b bb p] (?=[n m])', 'm ', pronstring)
+
+    # nasal place assimilation
+    if debug2 and re.search(r'n m', pronstring): print("Nasal place assimilation n m --> m m", pronstring)
+
+    pronstring = re.sub(r'm n', 'm m', pronstring)
+
+    # h n --> n n (nohneun --> nonneun)
+    pronstring = re.sub(r'h n', 'n n', pronstring)
+
+    # l r --> ll
+    pronstring = re.sub(r'l r', 'l l', pronstring)
+    # V l V --> V r V
+    pronstring = re.sub(r'(?<=[aeiouwy]) l (?=[aeiouwy])', ' r ', pronstring)
+
+    # SALM --> SAM
+    pronstring = re.sub(r'lm$', 'm', pronstring)
+    # GGADALG --> GGADAG
+    pronstring = re.sub(r'lg$', 'g', pronstring)
+    pronstring = re.sub(r'gs$', 'g', pronstring)
+    # Collapse some ambiguous vowels
+    # {YAE YE} -> {YE}
+    pronstring = re.sub(r' yae ', ' ye ', pronstring)
+    pronstring = re.sub(r' we ', ' oe ', pronstring)
+
+    # YO -> O
+    pronstring = re.sub(r'yo', 'yo', pronstring)
+    pronstring = re.sub(r'yae$', 'ye', pronstring)
+    #pronstring = re.sub(r'we$', 'oe', pronstring)
+
+    return pronstring
+
+
+def legacy_entry(line):
+    parts = line.split()
+    phones = []
+    for syl in parts[1:]:
+        p = name_phones(syl)
+        phones.append(p if p is not None else syl)
+    return parts[0] + ' ' + legacy_rules(' '.join(map(str.lower, phones))) + " sp"
+
+
+def kdict0_lines(dictionaries, random_words=200000, seed=1):
+    lines = []
+    for path in dictionaries:
+        with open(path, 'r', encoding='utf-8') as f:
+            for raw in f:
+                parts = raw.split()
+                if parts:
+                    syllables = split_names(parts[0])
+                    if syllables:
+                        lines.append(''.join(syllables) + ' ' + ' '.join(syllables))
+    names = [i + m + f for i in INITIALS + EXTRA_INITIALS for m in MEDIALS for f in FINALS + EXTRA_FINALS]
+    lines.extend(name + ' ' + name for name in names)
+    rng = random.Random(seed)
+    for _ in range(random_words):
+        syllables = [rng.choice(names) for _ in range(rng.randint(2, 6))]
+        lines.append(''.join(syllables) + ' ' + ' '.join(syllables))
+    return lines
+
+
+if __name__ == "__main__":
+    dictionaries = sys.argv[1:] or ["../model/dict", "dict"]
+    lines = kdict0_lines(dictionaries)
+    expected = [legacy_entry(line) for line in lines]
+    single = [make_kdict.dictionary_entry(line) for line in lines]
+    batch = make_kdict.dictionary_entries(lines)
+    mismatches = [(e, s, b) for e, s, b in zip(expected, single, batch) if not e == s == b]
+    for e, s, b in mismatches[:20]:
+        print("MISMATCH: expected %r, got %r / %r" % (e, s, b))
+    print("%d words checked, %d mismatches" % (len(lines), len(mismatches)))
+    sys.exit(1 if mismatches or len(batch) != len(lines) else 0)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import sys
+import atexit
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import hangul_jamo
+import make_kdict
+
+"""
+    Usage: python3 g2p_cache.py <cache_file> [--purge]
+
+    Persistent cache of make_kdict.py pronunciations, shared by runs and by
+    worker processes through one SQLite file (WAL mode, so readers do not wait
+    for writers).
+
+    The key is a kdict0.txt line (word and syllables) together with
+    rules_hash(), a hash of make_kdict.RULES and the jamo tables. Editing the
+    rules therefore misses every entry written before the edit; --purge
+    deletes those stale entries. Each G2PCache keeps the most recently used
+    entries in memory in front of the file and counts memory hits, file hits
+    and misses. stats() returns the counts. The file keeps running totals over
+    all processes, which the command line prints.
+
+    Lookups answered from memory or the file do not write: new entries are
+    written when they are computed, and the counts are added to the running
+    totals with them, every FLUSH_LOOKUPS lookups, and by flush() / close()
+    (also when the interpreter exits), so workers sharing the file do not wait for its write lock
+    on cached lookups.
+"""
+
+BATCH = 500  # keys per SELECT, below SQLite's limit on query parameters
+
+FLUSH_LOOKUPS = 10000  # lookups counted in memory before the totals in the file are updated
+
+
+def rules_hash():
+    """Hash of everything that decides a pronunciation: the jamo tables, the rules and applyrule."""
+    h = hashlib.sha1()
+    for table in (hangul_jamo.INITIALS, hangul_jamo.EXTRA_INITIALS, hangul_jamo.MEDIALS,
+                  hangul_jamo.FINALS, hangul_jamo.EXTRA_FINALS):
+        h.update(repr(table).encode('utf-8'))
+    for rule in make_kdict.RULES:
+        if not isinstance(rule, make_kdict.Report):
+            h.update(repr(rule).encode('utf-8'))
+    h.update(repr(make_kdict.applyrule).encode('utf-8'))
+    return h.hexdigest()
+
+
+class G2PCache(object):
+    """
+    kdict0.txt line -> kdict1.txt entry, in memory (up to memory_size entries, least
+    recently used dropped first) and in the SQLite file path (none: memory only).
+    With max_entries the file keeps that many entries, deleting the ones written
+    first (FIFO: reading an entry does not make it newer, as that would be a write).
+    """
+
+    def __init__(self, path=None, memory_size=100000, max_entries=None, timeout=60.0):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.rules = rules_hash()
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.file_hits = 0
+        self.misses = 0
+        # counts not yet added to the totals in the file
+        self.pending = {'hits': 0, 'file_hits': 0, 'misses': 0}
+        self.db = None
+        # one object may serve several threads (align_server.py)
+        self.lock = threading.Lock()
+        if path is not None:
+            self.db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            with self.db:
+                self.db.execute("CREATE TABLE IF NOT EXISTS entries "
+                                "(rules TEXT NOT NULL, line TEXT NOT NULL, entry TEXT NOT NULL, "
+                                "UNIQUE (rules, line))")
+                self.db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+            atexit.register(self.flush)
+
+    def _remember(self, line, entry):
+        self.memory[line] = entry
+        self.memory.move_to_end(line)
+        if len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def _load(self, lines):
+        found = {}
+        for i in range(0, len(lines), BATCH):
+            chunk = lines[i:i + BATCH]
+            query = ("SELECT line, entry FROM entries WHERE rules = ? AND line IN (%s)"
+                     % ','.join('?' * len(chunk)))
+            found.update(self.db.execute(query, [self.rules] + chunk))
+        return found
+
+    def _store(self, computed):
+        """Write computed entries and the pending counts in one transaction (counts only if computed is empty)."""
+        with self.db:
+            if computed:
+                self.db.executemany("INSERT OR REPLACE INTO entries (rules, line, entry) VALUES (?, ?, ?)",
+                                    [(self.rules, line, entry) for line, entry in computed.items()])
+                if self.max_entries is not None:
+                    self.db.execute("DELETE FROM entries WHERE rowid <= "
+                                    "(SELECT MAX(rowid) FROM entries) - ?", (self.max_entries,))
+            self.db.executemany("INSERT INTO counters (name, value) VALUES (?, ?) "
+                                "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                                sorted(self.pending.items()))
+        self.pending = dict.fromkeys(self.pending, 0)
+
+    def flush(self):
+        """Add the pending counts to the running totals in the file."""
+        with self.lock:
+            if self.db is not None and any(self.pending.values()):
+                self._store({})
+
+    def entries(self, lines):
+        """make_kdict.dictionary_entries(lines), computing only what is not cached."""
+        with self.lock:
+            return self._entries(lines)
+
+    def _entries(self, lines):
+        keys = [' '.join(line.split()) for line in lines]
+        result = {}
+        hits = 0
+        for key in keys:
+            if key in self.memory and key not in result:
+                result[key] = self.memory[key]
+                self.memory.move_to_end(key)
+                hits += 1
+        wanted = sorted(set(keys) - set(result))
+        found = self._load(wanted) if self.db is not None and wanted else {}
+        missing = [key for key in wanted if key not in found]
+        computed = dict(zip(missing, make_kdict.dictionary_entries(missing)))
+        for key, entry in list(found.items()) + list(computed.items()):
+            result[key] = entry
+            self._remember(key, entry)
+
+        self.hits += hits
+        self.file_hits += len(found)
+        self.misses += len(missing)
+        self.pending['hits'] += hits
+        self.pending['file_hits'] += len(found)
+        self.pending['misses'] += len(missing)
+        if self.db is not None and (computed or sum(self.pending.values()) >= FLUSH_LOOKUPS):
+            self._store(computed)
+        return [result[key] for key in keys]
+
+    def stats(self):
+        """Counts of this object: hits (memory), file_hits, misses and hit_rate."""
+        total = self.hits + self.file_hits + self.misses
+        return {'hits': self.hits, 'file_hits': self.file_hits, 'misses': self.misses,
+                'hit_rate': (self.hits + self.file_hits) / total if total else 0.0}
+
+    def totals(self):
+        """Running counts of all processes using the file, plus its entries for the current rules."""
+        self.flush()
+        totals = dict(self.db.execute("SELECT name, value FROM counters"))
+        totals['entries'] = self.db.execute("SELECT COUNT(*) FROM entries WHERE rules = ?",
+                                            (self.rules,)).fetchone()[0]
+        return totals
+
+    def purge(self):
+        """Delete the entries made with other rules; returns how many."""
+        with self.db:
+            return self.db.execute("DELETE FROM entries WHERE rules != ?", (self.rules,)).rowcount
+
+    def close(self):
+        self.flush()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+            atexit.unregister(self.flush)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3) or sys.argv[2:] not in ([], ["--purge"]):
+        print("Usage: python3 g2p_cache.py <cache_file> [--purge]")
+        sys.exit(1)
+
+    cache = G2PCache(sys.argv[1])
+    if sys.argv[2:] == ["--purge"]:
+        print("Deleted %d stale entries" % cache.purge())
+    totals = cache.totals()
+    lookups = sum(totals.get(name, 0) for name in ('hits', 'file_hits', 'misses'))
+    print("rules %s: %d entries" % (cache.rules[:12], totals['entries']))
+    print("hits %d, file hits %d, misses %d (hit rate %.1f%%)"
+          % (totals.get('hits', 0), totals.get('file_hits', 0), totals.get('misses', 0),
+             100.0 * (lookups - totals.get('misses', 0)) / lookups if lookups else 0.0))
+    cache.close()
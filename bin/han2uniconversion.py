@@ -4,7 +4,9 @@ import sys
 import os
 import re
 import codecs
-import unicodedata
+from collections import Counter
+
+import hangul_roman
 
 # Tae-Jin Yoon
 # McMaster University
@@ -28,23 +30,40 @@ import unicodedata
 
 debug = 0
 
-def read_file(infile):
+def read_file(infile, ofile="kdict0.txt"):
     # An input file in Korean
     f = codecs.open(infile, encoding="utf-8")
     # An output file of words both with Korean and Unicode
     ###fwlistout = codecs.open("kwordlist.txt", encoding='utf-8', mode="w+")
 
     # output files
-    kdictout = codecs.open("kdict0.txt", "w+", encoding="utf-8")
+    kdictout = codecs.open(ofile, "w+", encoding="utf-8")
     ###kwordfreq = codecs.open("kwordfreq.txt", "w+", encoding="utf-8")
     ###kwordlist = codecs.open("word.list", "w+", encoding="utf-8")
     ###ksylfreq = codecs.open("ksylfreq.txt", "w+", encoding="utf-8")
 
+    for entry in dictionary_words(f):
+        kdictout.write(entry + "\n")
+
+    # close all the open files
+    ###fwlistout.close()
+    kdictout.close()
+    ###kwordfreq.close()
+    ###kwordlist.close()
+    ###ksylfreq.close() 
+    f.close()
+
+
+def frequencies(lines):
+    """
+    Count the words of lines of Hangul text, as "WORD SYL SYL ..." entries, and their
+    syllables. Returns (kworddict, ksyldict), both collections.Counter.
+    """
     # Dictionary to store words and syllable with frequency
-    kworddict = {}
-    ksyldict = {}
-    
-    for line in f.readlines():
+    kworddict = Counter()
+    ksyldict = Counter()
+
+    for line in lines:
         # A space (' ') is used to separate A sentence in each line to words.
         line = line.strip().split(' ')
         for wrd in line:
@@ -55,44 +74,14 @@ def read_file(infile):
             ###fwlistout.write("\n")
 
             # Each word chunk will be divided into syllabaries
-            # Each syllabary is represented as fullname in the form of
+            # Each syllabary is represented by the last element of its fullname,
             #   fullname: HANGUL SYLLABLE GI
-
-            wordlist = []
-            for i in range(len(wrd)):
-                try:
-                    fullname = unicodedata.name(wrd[i])
-                except ValueError:
-                    # Some characters may not have a name; skip them
-                    continue
-                if debug:
-                    print("fullname: ", fullname)
-                wordlist.append(fullname)
-
-            # Now, we only select the last element in fullname
-            # and process it. 
- 
-            wordlist2 = []
-            for syllable in wordlist:
-                syllable = syllable.strip().split()
-
-                # "CJK" for Hanja (Chinese Characters)
-                # BRACKETS and ELLIPSIS are removed 
-                # DIGITS which are of the length 2of 2
-
-                # note on continuation line
-                # \ and implicite continaution line in {}, (), and []
-                if len(syllable) == 3 and \
-                   not(syllable[0]=="CJK" or
-                        syllable[2]=="BRACKET" or
-                        syllable[2] == "ELLIPSIS") :
-
-                    # count the frequency of syllables (using dictionary)
-                    if debug:
-                        print("unicode chars: ", syllable[2])
-                    ksyldict[syllable[2]] = ksyldict.get(syllable[2], 0) + 1
-                    wordlist2.append(syllable[2])
-
+            # "CJK" for Hanja (Chinese Characters), BRACKETS and ELLIPSIS are removed,
+            # DIGITS (fullnames of length 2) as well; see hangul_roman.py
+            wordlist2 = hangul_roman.syllables(wrd)
+            for syllable in wordlist2:
+                # count the frequency of syllables (using dictionary)
+                ksyldict[syllable] += 1
 
             if debug:
                 print("wordlist: ", wordlist2)
@@ -105,7 +94,7 @@ def read_file(infile):
 
             # contruct a word frequency (using dictionary)
             if len(wordlist) > 2:
-                kworddict[wordlist] = kworddict.get(wordlist, 0) + 1
+                kworddict[wordlist] += 1
                 #kdictout.write(wordlist)
 
                 # a pair of word and syllables ("NOGGI NOG GI")
@@ -113,6 +102,16 @@ def read_file(infile):
                 ###fwlistout.write(wordlist)
                 ###fwlistout.write("\n")
 
+    return kworddict, ksyldict
+
+
+def dictionary_words(lines):
+    """
+    Return the sorted, unique "WORD SYL SYL ..." entries (the lines of kdict0.txt)
+    for the words in lines of Hangul text.
+    """
+    kworddict, ksyldict = frequencies(lines)
+
     # Make a word frequency list
     wlist = list(kworddict.items())
     ###for word, freq in wlist: print(word, freq, file=kwordfreq)
@@ -124,22 +123,17 @@ def read_file(infile):
 
     # Sort the list of words
     words.sort()
+    entries = []
     for w in words:
         word = w.split()
         ###print(word[0], file=kwordlist)
-        kdictout.write(' '.join(word) + "\n")
+        entries.append(' '.join(word))
 
     # Make a syllable frequency list
     syllist = list(ksyldict.items())
     ###for syl, freq in syllist: print(syl, freq, file=ksylfreq)
 
-    # close all the open files
-    ###fwlistout.close()
-    kdictout.close()
-    ###kwordfreq.close()
-    ###kwordlist.close()
-    ###ksylfreq.close() 
-    f.close()
+    return entries
         
 if __name__ == "__main__":
     # remove the existing files to prevent from being appended.
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import sys
+import codecs
+
+import convert_sentences_unicode
+import han2uniconversion
+import hangul_jamo
+import make_kdict
+
+"""
+    Usage: python3 hangul_g2p.py <input_utf8_text> [sentence_file dict_file]
+
+    The Hangul G2P chain in one call, without intermediate files:
+        convert_sentences_unicode.py  -> romanized sentences (sentence_unicode.txt)
+        han2uniconversion.py          -> words and their syllables (kdict0.txt)
+        make_kdict.py                 -> pronunciation dictionary (kdict1.txt)
+
+    Import it and call g2p(text) to get the romanized lines and the dictionary
+    entries in memory. The output is the same as running the scripts one by one.
+    Pass a g2p_cache.G2PCache to g2p() to reuse pronunciations across calls and runs.
+    word_entries(words) makes entries for words that are already romanized (GICA).
+
+    In-process calls are quiet: the rule trace make_kdict.py prints as a script
+    (see make_kdict.script_trace) is only made for the flags in trace, and goes
+    to log. The command line prints the same trace as the scripts.
+"""
+
+
+def romanize(text):
+    """Romanized lines of text (the lines of sentence_unicode.txt)."""
+    return convert_sentences_unicode.convert_lines(text.splitlines())
+
+
+def dictionary_entries(text, cache=None, trace=make_kdict.QUIET, log=print):
+    """
+    Pronunciation dictionary entries for the words of text (the lines of kdict1.txt).
+    With a g2p_cache.G2PCache, words already in the cache are not converted again
+    (and nothing is traced).
+    """
+    words = han2uniconversion.dictionary_words(text.splitlines())
+    if cache is not None:
+        return cache.entries(words)
+    return make_kdict.dictionary_entries(words, trace, log)
+
+
+def word_entries(words, cache=None, trace=make_kdict.QUIET, log=print):
+    """
+    Dictionary entries for romanized words such as GICA, split into syllable names by
+    hangul_jamo.split_names. Words that are not spelled in syllable names are left out.
+    """
+    lines = []
+    for word in words:
+        syllables = hangul_jamo.split_names(word)
+        if syllables:
+            lines.append(word + ' ' + ' '.join(syllables))
+    if cache is not None:
+        return cache.entries(lines)
+    return make_kdict.dictionary_entries(lines, trace, log)
+
+
+def pronunciations(text):
+    """The entries of dictionary_entries(text) as {word: [phone, ...]}."""
+    prons = {}
+    for entry in dictionary_entries(text):
+        parts = entry.split()
+        prons[parts[0]] = parts[1:]
+    return prons
+
+
+def g2p(text, cache=None, trace=make_kdict.QUIET, log=print):
+    """Return (romanized lines, dictionary entries) for Hangul text."""
+    return romanize(text), dictionary_entries(text, cache, trace, log)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 4):
+        print("Usage: python3 hangul_g2p.py <input_utf8_text> [sentence_file dict_file]")
+        sys.exit(1)
+
+    sentence_file, dict_file = "sentence_unicode.txt", "kdict1.txt"
+    if len(sys.argv) == 4:
+        sentence_file, dict_file = sys.argv[2:4]
+
+    with codecs.open(sys.argv[1], encoding="utf-8") as f:
+        romanized, entries = g2p(f.read(), trace=make_kdict.script_trace())
+    with codecs.open(sentence_file, "w", encoding="utf-8") as fout:
+        for line in romanized:
+            fout.write(line + "\n")
+    with codecs.open(dict_file, "w", encoding="utf-8") as fout:
+        for line in entries:
+            fout.write(line + "\n")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import sys
+
+"""
+    Usage: python3 hangul_jamo.py --check
+
+    Onset/nucleus/coda phones of Hangul syllables, computed instead of looked up
+    in the kdictmap table.
+
+    A precomposed syllable is U+AC00 + (initial * 21 + medial) * 28 + final, and its
+    Unicode name spells the three jamo, e.g. HANGUL SYLLABLE TYULG = T + YU + LG.
+    The phones are those jamo names in lower case: 'TYULG' -> 't yu lg'.
+
+    syllable_phones(ch) works from the code point, name_phones(name) from the
+    syllable name as han2uniconversion.py writes it (this is what make_kdict.py
+    uses in place of kdictmap). name_phones also accepts the extra names kdictmap
+    lists (an L initial and R, JJ, DD, BB codas), so it returns exactly
+    kdictmap.get(name). split_names(word) splits a romanized word (GICA) back
+    into syllable names.
+
+    --check compares both with kdictmap for all 11,172 syllables and every
+    kdictmap entry.
+"""
+
+SBASE = 0xAC00
+NUM_MEDIALS = 21
+NUM_FINALS = 28
+NUM_SYLLABLES = 19 * NUM_MEDIALS * NUM_FINALS
+
+INITIALS = ('G', 'GG', 'N', 'D', 'DD', 'R', 'M', 'B', 'BB', 'S', 'SS', '', 'J', 'JJ', 'C', 'K', 'T', 'P', 'H')
+MEDIALS = ('A', 'AE', 'YA', 'YAE', 'EO', 'E', 'YEO', 'YE', 'O', 'WA', 'WAE', 'OE', 'YO', 'U', 'WEO', 'WE',
+           'WI', 'YU', 'EU', 'YI', 'I')
+FINALS = ('', 'G', 'GG', 'GS', 'N', 'NJ', 'NH', 'D', 'L', 'LG', 'LM', 'LB', 'LS', 'LT', 'LP', 'LH', 'M', 'B',
+          'BS', 'S', 'SS', 'NG', 'J', 'C', 'K', 'T', 'P', 'H')
+
+# in kdictmap, but not used by any Unicode syllable name
+EXTRA_INITIALS = ('L',)
+EXTRA_FINALS = ('R', 'JJ', 'DD', 'BB')
+
+_INITIAL_SET = frozenset(INITIALS + EXTRA_INITIALS)
+_MEDIAL_SET = frozenset(MEDIALS)
+_FINAL_SET = frozenset(FINALS + EXTRA_FINALS)
+# first letters of the medials: a name starting with one has no initial
+_MEDIAL_INITIALS = frozenset(m[0] for m in MEDIALS)
+
+
+def _join(initial, medial, final):
+    return ' '.join(part.lower() for part in (initial, medial, final) if part)
+
+
+def syllable_phones(ch):
+    """Phones of a precomposed Hangul syllable ('GA' -> 'g a'), or None for other characters."""
+    index = ord(ch) - SBASE
+    if not 0 <= index < NUM_SYLLABLES:
+        return None
+    return _join(INITIALS[index // (NUM_MEDIALS * NUM_FINALS)],
+                 MEDIALS[index // NUM_FINALS % NUM_MEDIALS],
+                 FINALS[index % NUM_FINALS])
+
+
+def name_phones(name):
+    """Phones for a syllable name such as 'TYULG' ('t yu lg'), or None if it is not one."""
+    # initials and medials are at most 2 and 3 letters long; names split in only one way
+    for i in range(min(2, len(name)), -1, -1):
+        if name[:i] not in _INITIAL_SET:
+            continue
+        for m in range(min(3, len(name) - i), 0, -1):
+            if name[i:i + m] in _MEDIAL_SET and name[i + m:] in _FINAL_SET:
+                return _join(name[:i], name[i:i + m], name[i + m:])
+    return None
+
+
+def split_names(word):
+    """
+    Split a word spelled in syllable names into them ('GICA' -> ['GI', 'CA']), or None.
+    Of several splits the one with the fewest syllables is taken ('YEOL' rather than
+    'YE OL'), then the one with the fewest syllables without an initial, so a consonant
+    between vowels starts the next syllable ('GANA' -> ['GA', 'NA'], not ['GAN', 'A']).
+    """
+    # best[i]: (syllables, syllables without an initial, split) for word[i:]
+    best = [None] * len(word) + [(0, 0, [])]
+    for i in range(len(word) - 1, -1, -1):
+        for n in range(1, min(len(word) - i, 7) + 1):
+            rest = best[i + n]
+            name = word[i:i + n]
+            if rest is None or name_phones(name) is None:
+                continue
+            candidate = (rest[0] + 1, rest[1] + (name[0] in _MEDIAL_INITIALS), [name] + rest[2])
+            if best[i] is None or candidate[:2] < best[i][:2]:
+                best[i] = candidate
+    return best[0][2] if best[0] is not None else None
+
+
+def check():
+    """Compare with kdictmap; returns the list of mismatches."""
+    import unicodedata
+    from kdictmap import kdictmap
+
+    errors = []
+    for index in range(NUM_SYLLABLES):
+        ch = chr(SBASE + index)
+        name = unicodedata.name(ch).split()[2]
+        if syllable_phones(ch) != kdictmap.get(name) or name_phones(name) != kdictmap.get(name):
+            errors.append((name, kdictmap.get(name), syllable_phones(ch), name_phones(name)))
+    for name, phones in kdictmap.items():
+        if name_phones(name) != phones:
+            errors.append((name, phones, None, name_phones(name)))
+    # and nothing that kdictmap does not have
+    for initial in INITIALS + EXTRA_INITIALS:
+        for medial in MEDIALS:
+            for final in FINALS + EXTRA_FINALS:
+                if initial + medial + final not in kdictmap:
+                    errors.append((initial + medial + final, None, None, name_phones(initial + medial + final)))
+    return errors
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["--check"]:
+        print("Usage: python3 hangul_jamo.py --check")
+        sys.exit(1)
+    errors = check()
+    for error in errors[:20]:
+        print("MISMATCH %s: kdictmap %r, code point %r, name %r" % error)
+    print("%d syllables checked, %d mismatches" % (NUM_SYLLABLES, len(errors)))
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import sys
+import re
+import codecs
+import unicodedata
+
+"""
+    Usage: python3 hangul_roman.py <input_utf8_text> [output_file]
+
+    Romanization of Hangul text by Unicode character names (HANGUL SYLLABLE GI
+    -> GI), shared by convert_sentences_unicode.py, han2uniconversion.py and
+    the web app preview.
+
+    The token of each character is worked out from its name once and kept
+    in a translation table, so a whole line is converted by one str.translate.
+    The tables behave like the per-character code they replace:
+        SENTENCE_TABLE  (convert_sentences_unicode.py, webapp) three-word names
+                        other than CJK ... give their last word, DIGIT ONE etc.
+                        give the digit, whitespace is kept to split words on,
+                        anything else is dropped
+        SYLLABLE_TABLE  (han2uniconversion.py) three-word names other than
+                        CJK ... and ... BRACKET / ... ELLIPSIS, each token
+                        followed by a space to split syllables on
+
+    With an output file (default sentence_unicode.txt) the input is converted
+    line by line like convert_sentences_unicode.py.
+"""
+
+DIGITS = {
+    "ZERO": "0", "ONE": "1", "TWO": "2", "THREE": "3",
+    "FOUR": "4", "FIVE": "5", "SIX": "6", "SEVEN": "7",
+    "EIGHT": "8", "NINE": "9",
+}
+
+# single digits at the start of a sentence get a leading 0
+_LEADING_DIGIT = re.compile('^([1-9]) ')
+
+
+def _name_parts(ch):
+    try:
+        return unicodedata.name(ch).split()
+    except ValueError:
+        # Some characters may not have a Unicode name; skip
+        return []
+
+
+def sentence_token(ch):
+    """Token of ch in a romanized sentence ('' if it is dropped); whitespace stays."""
+    if ch.isspace():
+        return ch
+    parts = _name_parts(ch)
+    if len(parts) == 3 and parts[0] != "CJK":
+        return parts[2]
+    if len(parts) == 2:
+        # DIGIT ONE/TWO/...
+        return DIGITS.get(parts[1], '')
+    return ''
+
+
+def syllable_token(ch):
+    """Syllable of ch in a kdict0.txt entry followed by a space ('' if it is dropped)."""
+    parts = _name_parts(ch)
+    if len(parts) == 3 and not (parts[0] == "CJK" or parts[2] == "BRACKET" or parts[2] == "ELLIPSIS"):
+        return parts[2] + ' '
+    return ''
+
+
+class TokenTable(dict):
+    """str.translate table filled in from token(ch) the first time a character is seen."""
+
+    def __init__(self, token):
+        dict.__init__(self)
+        self.token = token
+
+    def __missing__(self, code):
+        value = self[code] = self.token(chr(code))
+        return value
+
+
+SENTENCE_TABLE = TokenTable(sentence_token)
+SYLLABLE_TABLE = TokenTable(syllable_token)
+
+
+def romanize_words(line):
+    """The romanized words of line, e.g. ['GICA', 'GA'] for '기차가 가'."""
+    return line.translate(SENTENCE_TABLE).split()
+
+
+def romanize_line(line):
+    """Romanize one line as convert_sentences_unicode.py does; returns None if nothing is left of it."""
+    words = romanize_words(line)
+    if not words:
+        return None
+    sentence = ' '.join(words)
+    # GET RID OF ELLIPSIS, BRACKETS, etc.
+    sentence = sentence.replace('ELLIPSIS', '').replace('BRACKETS', '')
+    # PUT LEADING 0 IN SINGLE DIGITS at line start
+    return _LEADING_DIGIT.sub(r'0\1 ', sentence)
+
+
+def romanize_lines(lines):
+    """Romanized lines, one at a time, leaving out the ones with nothing left."""
+    for line in lines:
+        sentence = romanize_line(line)
+        if sentence is not None:
+            yield sentence
+
+
+def syllables(word):
+    """The syllables of a word as han2uniconversion.py lists them, e.g. ['GI', 'CA']."""
+    return word.translate(SYLLABLE_TABLE).split(' ')[:-1]
+
+
+def romanize_file(infile, ofile):
+    """Romanize infile into ofile line by line (sentence_unicode.txt)."""
+    with codecs.open(infile, encoding="utf-8") as fin, codecs.open(ofile, "w", encoding="utf-8") as fout:
+        for sentence in romanize_lines(fin):
+            fout.write(sentence + "\n")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python3 hangul_roman.py <input_utf8_text> [output_file]")
+        sys.exit(1)
+    romanize_file(sys.argv[1], sys.argv[2] if len(sys.argv) == 3 else "sentence_unicode.txt")
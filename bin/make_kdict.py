@@ -7,9 +7,10 @@ import re
 import codecs
 import string
 import unicodedata
+import itertools
 
-# kdictmap includes files that decomposed syllables into segments
-from kdictmap import * 
+# hangul_jamo decomposes syllables into segments (as the kdictmap table used to)
+from hangul_jamo import name_phones
 
 # Tae-Jin Yoon
 # MaMaster University
@@ -23,7 +24,7 @@ from kdictmap import *
     Korean Phonological Rules
 
     input: kdict0.txt (from han2uniconversion.py)
-    output kdict1.txt (sorted and uniq with kdictmap)
+    output kdict1.txt (sorted and uniq, syllables decomposed by hangul_jamo)
 """
 
 # I made a dictionary datastructure using:
@@ -40,212 +41,313 @@ debug2 = 0
 debug3 = 1
 applyrule = 1
 
-def read_file(infile, ofile):
+# WITHIN-WORD PHONOLOGICAL RULES ARE DEFINED HERE
+# Using regular expressions:
+
+# (?=[...]) is a lookahead assertion that mathes if ... matches next
+# (?![...]) matches if ... does not match next.
+
+# (?<=[...]) is a positive lookbehind assertion
+# (?<![...]) is a negative lookbehind assertion
+
+# RULES is applied from top to bottom, each (pattern, replacement) pair as one
+# re.sub over the whole pronunciation string, so a rule sees the output of the
+# rules above it. Report(flag, ...) entries print the pronunciation at that point
+# when the flag (debug, debug2, debug3) is in the trace of the call; only the first
+# matching (pattern, message) of an entry is printed. A trace is a set of flag
+# names: QUIET prints nothing, script_trace() is what the flags above switch on.
+
+QUIET = frozenset()
+
+
+def script_trace():
+    """The names of the flags above that are on: the trace of make_kdict.py run as a script."""
+    return frozenset(name for name, on in (('debug', debug), ('debug2', debug2), ('debug3', debug3)) if on)
+
+
+class Report(object):
+
+    def __init__(self, flag, *alternatives):
+        self.flag = flag
+        self.alternatives = alternatives
+
+
+RULES = (
+    # 1. Coda neutralization
+    # 1.1. SS + consonant
+    Report('debug',
+           (' gg (?![ayeowui])', "gg + Cons -> g + Cons: "),
+           (' dd (?![ayeowui])', "dd + Cons -> d + Cons: "),
+           (' bb (?![ayeowui])', "bb + Cons -> b + Cons: "),
+           (' jj (?![ayeowui])', "jj + Cons -> j + Cons: "),
+           (' [k] (?![ayeowui])', "k + cons -> g + Cons: "),
+           (' [t] (?![ayeowui])', "t + cons -> t + Cons: "),
+           (' [p] (?![ayeowui])', "p + cons -> b + Cons: "),
+           (' [c] (?![ayeowui])', "c + Cons -> j + cons: ")),
+
+    # Coda neutralization
+    # {gg, dd, bb, jj, ss, s, k, t, p, c } --> {G, D, B, J} / __ Consnants
+    ('gg (?![ayeowui])', 'g '),
+    ('dd (?![ayeowui])', 'd '),
+    ('bb (?![ayeowui])', 'b '),
+    ('jj (?![ayeowui])', 'j '),
+    ('k (?![ayeowui])', 'g '),
+    ('t (?![ayeowui])', 'd '),
+    ('p (?![ayeowui])', 'b '),
+    ('c (?![ayeowui])', 'j '),
+
+    # {ss, s} --> {d} /___ consonant
+    Report('debug', ('ss (?![ayeowui])', "ss + C --> d + C: ")),
+    (r'ss (?![ayeowui])', 'd '),
+
+    Report('debug', (' s (?![ayeowui])', "s + C --> d + C: ")),
+    (r' s (?![ayeowui])', ' d '),
+    # SS D --> D D --> D
+
+    (' d d ', ' dd '),
+    Report('debug', (' d d ', "d d: ")),
+
+    # nasalization: ss n --> n n; s n --> n
+    (r'ss (?=[n])', 'n '),
+    (r' s (?=[n])', ' n '),
+
+    # 2. Coda cluster simplification
+    # Underlying consonant clusters are subject to simplification,
+    # resulting in removal of either the first or the second consonant
+    (r'lg h', 'l g'),
+    (r'lg (?=[a e])', 'l g '),
+    (r'lg (?=[n b g])', 'g '),
+    (r'lh (?=[a d eo g j])', 'l '),
+    (r'nh (?=[n g s])', 'n '),
+    (r'nh (?=[a e i o u y eu])', 'n '),
+    (r'nj (?=[a e i o y eu])', 'n j'),
+
+    # 3. g h --> k
+    Report('debug2', (' [bdgj] h (?=[aeiouwy])', "b/d/g/j h V --> p/t/k/c V: ")),
+    (' g h (?=[aeiouwy])', ' k '),
+    ('b h (?=[aeiouwy])', ' p '),
+    ('d h (?=[aeiouwy])', ' t '),
+    ('j h (?=[aeiouwy])', ' c '),
+
+    # h g --> k
+    Report('debug3', (' h [bdgj] (?=[aeiouwy])', "b/d/g/j h V --> p/t/k/c V: ")),
+    (' h g (?=[aeiouwy])', ' k '),
+    ('h b (?=[aeiouwy])', ' p '),
+    ('h d (?=[aeiouwy])', ' t '),
+    ('h j (?=[aeiouwy])', ' c '),
+
+    # Intervocalic h-deletion and post-sonorant h deletion
+    Report('debug2', ('(?<=[m n ng l r w y]) h (?=[aeiouwy])', "sonorants h V --> sonorants V: ")),
+    ('(?<=[m n ng l r w y]) h (?=[a e i o u])', ' '),
+
+    Report('debug2', ('(?<=[aeiouwy]) h (?=[aeiouwy])', "V h V --> V V: ")),
+    ('(?<=[aeiouwy]) h (?=[aeiouwy])', ' '),
+
+    # h + d --> t;
+
+    # manh.da -> man.ta
+    (r'nh d', 'n t'),
+    # manh.ji -> man.ci
+    (r'nh j', 'n c'),
+
+    (r'nj (?=[a y e o w u i])', 'n j '),
+    (r'nj (?![a y e o w u i])', 'n '),
+
+    # coda cluster simplification + aspiration
+    ('lm (?=[d g])', 'm '),
+    ('lm (?=[e i yi])', 'l m '),
+
+    (r'lb (?=[eu])', 'l b '),
+    (r'lb (?=[g])', 'b '),
+    (r'lb (?=[g])', 'l '),
+    (r'lt (?=[a])', 'l t '),
+    (r'gs (?=[a e i o u])', 'g s '),
+    (r'gs (?![a e i o u])', 'g '),
+    (r'bs (?![a y e o w u i])', 'b '),
+    (r'bs (?=[a e i o u])', 'b s '),
+
+    # Nasalization
+    # {D, DD, T} --> {N} / __ {N, M}
+    (r'[d dd t] (?=[n m])', 'n '),
+
+    # {B, BB, P} --> {M} / ___ {M}
+    (r'[b bb p] (?=[n m])', 'm '),
+
+    # nasal place assimilation
+    Report('debug2', (r'n m', "Nasal place assimilation n m --> m m")),
+
+    (r'm n', 'm m'),
+
+    # h n --> n n (nohneun --> nonneun)
+    (r'h n', 'n n'),
+
+    # l r --> ll
+    (r'l r', 'l l'),
+    # V l V --> V r V
+    (r'(?<=[aeiouwy]) l (?=[aeiouwy])', ' r '),
+
+    # SALM --> SAM
+    (r'lm$', 'm'),
+    # GGADALG --> GGADAG
+    (r'lg$', 'g'),
+    (r'gs$', 'g'),
+    # Collapse some ambiguous vowels
+    # {YAE YE} -> {YE}
+    (r' yae ', ' ye '),
+    (r' we ', ' oe '),
+
+    # YO -> O
+    (r'yo', 'yo'),
+    (r'yae$', 'ye'),
+    #(r'we$', 'oe'),
+)
+
+
+class RuleEngine(object):
+    """
+    RULES compiled once. apply() rewrites one pronunciation string; apply_all()
+    rewrites a list of them with one re.sub per rule over all of them joined by
+    newlines. No rule can match a newline, and with re.M "$" matches at the end
+    of every line, so each string comes out as apply() would make it.
+    The Report steps whose flag is in trace (the engine's own trace unless a call
+    gives one) pass their message and the pronunciation to log.
+    """
+
+    def __init__(self, rules, trace=QUIET, log=print):
+        self.trace = trace
+        self.log = log
+        self.steps = []
+        for rule in rules:
+            if isinstance(rule, Report):
+                self.steps.append((rule.flag, [(re.compile(p), message) for p, message in rule.alternatives]))
+            elif rule[0] != rule[1]:
+                # no-op rules such as yo -> yo are left out
+                self.steps.append((None, re.compile(rule[0], re.M), rule[1]))
+
+    def _report(self, step, pronstrings, trace, log):
+        if step[0] not in trace:
+            return
+        for pronstring in pronstrings:
+            for pattern, message in step[1]:
+                if pattern.search(pronstring):
+                    log(message + ' ' + pronstring)
+                    break
+
+    def apply(self, pronstring, trace=None, log=None):
+        trace = self.trace if trace is None else trace
+        log = self.log if log is None else log
+        for step in self.steps:
+            if step[0] is None:
+                pronstring = step[1].sub(step[2], pronstring)
+            else:
+                self._report(step, (pronstring,), trace, log)
+        return pronstring
+
+    def apply_all(self, pronstrings, trace=None, log=None):
+        trace = self.trace if trace is None else trace
+        log = self.log if log is None else log
+        text = '\n'.join(pronstrings)
+        for step in self.steps:
+            if step[0] is None:
+                text = step[1].sub(step[2], text)
+            else:
+                self._report(step, text.split('\n'), trace, log)
+        return text.split('\n') if pronstrings else []
+
+
+rule_engine = RuleEngine(RULES)
+
+
+def read_file(infile, ofile, batch_size=100000):
 
     fin = codecs.open(infile, mode="r", encoding="utf-8")
     # overwrite output to avoid accidental appends across runs
     fout = codecs.open(ofile, mode="w", encoding="utf-8")
 
-    for line in fin.readlines():
-        # example line: ABI A BI
-        line = line.strip().split()
-        # The first eleement in line is a word
-        word = line[0]
-
-        pronunciation = []
-        
-        nsyll = len(line[1:])
-        for i in range(nsyll):
-            syl = line[i+1]
-
-            # print out {word syl} pair for debugging 
-            if debug:
-                print(line[0], syl)
-
-            # Check whether the syllable is in the kdictmap dictionary
-            if syl in kdictmap:
-                pronunciation.append(kdictmap[syl])
-            else:
-                if debug:
-                    print("#### Syllable not in kdictmap")
-                pronunciation.append(syl)
-        
-
-        # change the pronunciation sequences to lower-case sequences
-        # e.g. S A NG G I D OE N --> s a ng g i d oe n
-        pronunciation = list(map(str.lower, pronunciation))
-
-        # The broken up segements in each syllable are not glued together
-        # with a space between segments.
-
-        pronstring = ' '.join(pronunciation)
-
-
-        #if debug: print "pronunciation string: ", pronstring
-
-        final_dict_entry = []
-
-        # If applyrule flag is on, the dictionary is made with phonological rules implemented
-        # If applyrule flag is off, the dictionary contains phonemic sequences	
-        if applyrule == 1:
-
-            # WITHIN-WORD PHONOLOGICAL RULES ARE DEFINED HERE 
-            # Using regular expressions:
-
-            # (?=[...]) is a lookahead assertion that mathes if ... matches next
-            # (?![...]) matches if ... does not match next.
-         
-            # (?<=[...]) is a positive lookbehind assertion
-            # (?<![...]) is a negative lookbehind assertion
- 
-
-            # 1. Coda neutralization 
-            # 1.1. SS + consonant      
-
-            if debug and re.search(' gg (?![ayeowui])', pronstring): print("gg + Cons -> g + Cons: ", pronstring)
-            elif debug and re.search(' dd (?![ayeowui])', pronstring): print("dd + Cons -> d + Cons: ", pronstring)
-            elif debug and re.search(' bb (?![ayeowui])', pronstring): print("bb + Cons -> b + Cons: ", pronstring)
-            elif debug and re.search(' jj (?![ayeowui])', pronstring): print("jj + Cons -> j + Cons: ", pronstring)
-            elif debug and re.search(' [k] (?![ayeowui])', pronstring): print("k + cons -> g + Cons: ", pronstring)
-            elif debug and re.search(' [t] (?![ayeowui])', pronstring): print("t + cons -> t + Cons: ", pronstring)
-            elif debug and re.search(' [p] (?![ayeowui])', pronstring): print("p + cons -> b + Cons: ", pronstring)
-            elif debug and re.search(' [c] (?![ayeowui])', pronstring): print("c + Cons -> j + cons: ", pronstring)
-
-            # Coda neutralization
-            # {gg, dd, bb, jj, ss, s, k, t, p, c } --> {G, D, B, J} / __ Consnants
-            pronstring = re.sub('gg (?![ayeowui])', 'g ', pronstring)
-            pronstring = re.sub('dd (?![ayeowui])', 'd ', pronstring)
-            pronstring = re.sub('bb (?![ayeowui])', 'b ', pronstring)
-            pronstring = re.sub('jj (?![ayeowui])', 'j ', pronstring)
-            pronstring = re.sub('k (?![ayeowui])', 'g ', pronstring)
-            pronstring = re.sub('t (?![ayeowui])', 'd ', pronstring)
-            pronstring = re.sub('p (?![ayeowui])', 'b ', pronstring)
-            pronstring = re.sub('c (?![ayeowui])', 'j ', pronstring)
-              
-            # {ss, s} --> {d} /___ consonant
-            if debug and re.search('ss (?![ayeowui])', pronstring): print("ss + C --> d + C: ", pronstring)
-            pronstring = re.sub(r'ss (?![ayeowui])', 'd ', pronstring)
-
-            if debug and re.search(' s (?![ayeowui])', pronstring): print("s + C --> d + C: ", pronstring)
-            pronstring = re.sub(r' s (?![ayeowui])', ' d ', pronstring)
-            # SS D --> D D --> D
-
-            pronstring = re.sub(' d d ', ' dd ', pronstring)
-            if debug and re.search(' d d ', pronstring):
-                print("d d: ", pronstring)
-        
-            # nasalization: ss n --> n n; s n --> n
-            pronstring = re.sub(r'ss (?=[n])', 'n ', pronstring)
-            pronstring = re.sub(r' s (?=[n])', ' n ', pronstring)
-
-            # 2. Coda cluster simplification
-            # Underlying consonant clusters are subject to simplification, 
-            # resulting in removal of either the first or the second consonant
-            pronstring = re.sub(r'lg h', 'l g', pronstring)
-            pronstring = re.sub(r'lg (?=[a e])', 'l g ', pronstring)
-            pronstring = re.sub(r'lg (?=[n b g])', 'g ', pronstring)
-            pronstring = re.sub(r'lh (?=[a d eo g j])', 'l ', pronstring)
-            pronstring = re.sub(r'nh (?=[n g s])', 'n ', pronstring)
-            pronstring = re.sub(r'nh (?=[a e i o u y eu])', 'n ', pronstring)
-            pronstring = re.sub(r'nj (?=[a e i o y eu])', 'n j', pronstring)
-
-            # 3. g h --> k
-            if debug2 and re.search(' [bdgj] h (?=[aeiouwy])', pronstring): print("b/d/g/j h V --> p/t/k/c V: ", pronstring)
-            pronstring = re.sub(' g h (?=[aeiouwy])', ' k ', pronstring)
-            pronstring = re.sub('b h (?=[aeiouwy])', ' p ', pronstring)
-            pronstring = re.sub('d h (?=[aeiouwy])', ' t ', pronstring)
-            pronstring = re.sub('j h (?=[aeiouwy])', ' c ', pronstring)
-
-            # h g --> k 
-            if debug3 and re.search(' h [bdgj] (?=[aeiouwy])', pronstring): print("b/d/g/j h V --> p/t/k/c V: ", pronstring)
-            pronstring = re.sub(' h g (?=[aeiouwy])', ' k ', pronstring)
-            pronstring = re.sub('h b (?=[aeiouwy])', ' p ', pronstring)
-            pronstring = re.sub('h d (?=[aeiouwy])', ' t ', pronstring)
-            pronstring = re.sub('h j (?=[aeiouwy])', ' c ', pronstring)
-
-            
-
-            # Intervocalic h-deletion and post-sonorant h deletion
-            if debug2 and re.search('(?<=[m n ng l r w y]) h (?=[aeiouwy])', pronstring): print("sonorants h V --> sonorants V: ", pronstring)
-            pronstring = re.sub('(?<=[m n ng l r w y]) h (?=[a e i o u])', ' ', pronstring)
-            
-            if debug2 and re.search('(?<=[aeiouwy]) h (?=[aeiouwy])', pronstring): print("V h V --> V V: ", pronstring)
-            pronstring = re.sub('(?<=[aeiouwy]) h (?=[aeiouwy])', ' ', pronstring)
-
-            # h + d --> t;  
-
-            # manh.da -> man.ta
-            pronstring = re.sub(r'nh d', 'n t', pronstring)
-            # manh.ji -> man.ci
-            pronstring = re.sub(r'nh j', 'n c', pronstring)
-
-            pronstring = re.sub(r'nj (?=[a y e o w u i])', 'n j ', pronstring)
-            pronstring = re.sub(r'nj (?![a y e o w u i])', 'n ', pronstring)
-
-            # coda cluster simplification + aspiration
-            pronstring = re.sub('lm (?=[d g])', 'm ', pronstring)
-            pronstring = re.sub('lm (?=[e i yi])', 'l m ', pronstring)
-
-            pronstring = re.sub(r'lb (?=[eu])', 'l b ', pronstring)
-            pronstring = re.sub(r'lb (?=[g])', 'b ', pronstring)
-            pronstring = re.sub(r'lb (?=[g])', 'l ', pronstring)
-            pronstring = re.sub(r'lt (?=[a])', 'l t ', pronstring)
-            pronstring = re.sub(r'gs (?=[a e i o u])', 'g s ', pronstring)
-            pronstring = re.sub(r'gs (?![a e i o u])', 'g ', pronstring)
-            pronstring = re.sub(r'bs (?![a y e o w u i])', 'b ', pronstring)
-            pronstring = re.sub(r'bs (?=[a e i o u])', 'b s ', pronstring) 
-
-            # Nasalization
-            # {D, DD, T} --> {N} / __ {N, M}
-            pronstring = re.sub(r'[d dd t] (?=[n m])', 'n ', pronstring)
-
-            # {B, BB, P} --> {M} / ___ {M}
-            pronstring = re.sub(r'[b bb p] (?=[n m])', 'm ', pronstring)
-
-            # nasal place assimilation
-            if debug2 and re.search(r'n m', pronstring): print("Nasal place assimilation n m --> m m", pronstring)
-          
-            pronstring = re.sub(r'm n', 'm m', pronstring)
-
-            # h n --> n n (nohneun --> nonneun)
-            pronstring = re.sub(r'h n', 'n n', pronstring)
-
-            # l r --> ll
-            pronstring = re.sub(r'l r', 'l l', pronstring)
-            # V l V --> V r V
-            pronstring = re.sub(r'(?<=[aeiouwy]) l (?=[aeiouwy])', ' r ', pronstring)
-     
-            # SALM --> SAM
-            pronstring = re.sub(r'lm$', 'm', pronstring)
-            # GGADALG --> GGADAG
-            pronstring = re.sub(r'lg$', 'g', pronstring)
-            pronstring = re.sub(r'gs$', 'g', pronstring)
-            # Collapse some ambiguous vowels
-            # {YAE YE} -> {YE}
-            pronstring = re.sub(r' yae ', ' ye ', pronstring)
-            pronstring = re.sub(r' we ', ' oe ', pronstring)
- 
-            # YO -> O
-            pronstring = re.sub(r'yo', 'yo', pronstring)
-            pronstring = re.sub(r'yae$', 'ye', pronstring)
-            #pronstring = re.sub(r'we$', 'oe', pronstring)
-
-        # Add "sp" at the end of dict for consistency with the main dictionary
-        final_dict_entry.append([word, pronstring+" sp"])
-        # Uncomment the line below if you don't want sp at the end
-        # final_dict_entry.append([word, pronstring])
-
-        # FINALLY SORT THE NEWLY GENERATED PRONUNCIATION DICTIONARY
-        final_dict_entry.sort()
-        for i in final_dict_entry:
-            final_pronunciation = ' '.join(i)
-            # if debug:
-            #     print(final_pronunciation)
-            fout.write(final_pronunciation+"\n")
+    while True:
+        lines = list(itertools.islice(fin, batch_size))
+        if not lines:
+            break
+        for entry in dictionary_entries(lines, script_trace()):
+            fout.write(entry + "\n")
 
     fin.close()
     fout.close()
-        
+
+
+def phonemic(line, trace=QUIET, log=print):
+    """
+    Split one kdict0.txt line ("ABI A BI") into the word and its phonemic
+    pronunciation string ("a b i"), before any phonological rule.
+    """
+    # example line: ABI A BI
+    line = line.strip().split()
+    # The first eleement in line is a word
+    word = line[0]
+
+    pronunciation = []
+    
+    nsyll = len(line[1:])
+    for i in range(nsyll):
+        syl = line[i+1]
+
+        # print out {word syl} pair for debugging 
+        if 'debug' in trace:
+            log(line[0] + ' ' + syl)
+
+        # Check whether the syllable is a Hangul syllable name
+        phones = name_phones(syl)
+        if phones is not None:
+            pronunciation.append(phones)
+        else:
+            if 'debug' in trace:
+                log("#### Not a Hangul syllable")
+            pronunciation.append(syl)
+    
+
+    # change the pronunciation sequences to lower-case sequences
+    # e.g. S A NG G I D OE N --> s a ng g i d oe n
+    pronunciation = list(map(str.lower, pronunciation))
+
+    # The broken up segements in each syllable are not glued together
+    # with a space between segments.
+
+    pronstring = ' '.join(pronunciation)
+
+    return word, pronstring
+
+
+def dictionary_entry(line, trace=QUIET, log=print):
+    """
+    Turn one kdict0.txt line ("ABI A BI") into its kdict1.txt line: the word
+    followed by its pronunciation with the phonological rules applied and "sp".
+    The debug output of the flags in trace goes to log.
+    """
+    word, pronstring = phonemic(line, trace, log)
+
+    # If applyrule flag is on, the dictionary is made with phonological rules implemented
+    # If applyrule flag is off, the dictionary contains phonemic sequences
+    if applyrule == 1:
+        pronstring = rule_engine.apply(pronstring, trace, log)
+
+    # Add "sp" at the end of dict for consistency with the main dictionary
+    return word + ' ' + pronstring + " sp"
+    # Use the line below instead if you don't want sp at the end
+    # return word + ' ' + pronstring
+
+
+def dictionary_entries(lines, trace=QUIET, log=print):
+    """
+    dictionary_entry for many kdict0.txt lines at once, in order. The rules run
+    once per batch instead of once per word (see RuleEngine.apply_all).
+    """
+    # per-word debug output comes word by word only when the words go one at a time
+    if applyrule != 1 or 'debug' in trace or 'debug2' in trace:
+        return [dictionary_entry(line, trace, log) for line in lines]
+    words, pronstrings = zip(*[phonemic(line) for line in lines]) if lines else ((), ())
+    return [word + ' ' + pronstring + " sp"
+            for word, pronstring in zip(words, rule_engine.apply_all(pronstrings, trace, log))]
+
 if __name__ == "__main__":
     if os.path.exists("kdict1.txt"):
         os.remove("kdict1.txt")
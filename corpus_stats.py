@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+"""
+Command-line usage:
+  python corpus_stats.py [options] corpus ...
+  where each corpus is a Hangul text file or a directory of .lab/.txt transcripts
+  (searched recursively), and options may include:
+	-j jobs          -- number of worker processes (default: number of CPUs)
+	-o prefix        -- write the frequency lists to prefix.words.txt and prefix.syllables.txt
+	--dict=file      -- lexicon to measure the OOV rate against (default: the model dict)
+	--model=dir      -- acoustic model directory whose dict is used (default: model/ next to align.py)
+	--top=n          -- number of most frequent OOV words to print (default 20)
+	--chunk=n        -- lines per counting task (default 20000)
+	--g2p-cache=file -- pronounce the OOV words into this SQLite file (see bin/g2p_cache.py)
+
+Word and syllable frequencies of a corpus as bin/han2uniconversion.py counts them,
+and its out-of-vocabulary rate against a lexicon, for sizing a make_lexicon.py run
+or filling a G2P cache before aligning the corpus.
+
+The files are read line by line (the encoding detected from the start of each file,
+see text_encoding.open_text) and the lines sent to the workers in chunks, at most two
+per worker at a time, so memory use depends on the vocabulary of the corpus and not on
+its size. Each worker counts its chunk with han2uniconversion.frequencies and the
+counters are added up as they come back.
+
+The frequency lists have one "WORD SYL SYL ... count" or "SYL count" line per entry,
+most frequent first.
+"""
+
+import os
+import sys
+import getopt
+import time
+import collections
+import multiprocessing
+
+import align
+import make_lexicon
+import text_encoding
+
+
+def _count(lines):
+	"""Word ("WORD SYL SYL") and syllable counts of a chunk of lines, in a worker process."""
+	return align._import_g2p().han2uniconversion.frequencies(lines)
+
+
+def find_texts(paths):
+	"""The text files of paths: files as given, directories searched for transcripts."""
+	texts = []
+	for path in paths:
+		if os.path.isdir(path):
+			texts.extend(make_lexicon.find_transcripts(path))
+		else:
+			texts.append(path)
+	return texts
+
+
+def line_chunks(texts, chunk=20000):
+	"""Lists of up to chunk lines of all texts, reading one line at a time."""
+	lines = []
+	for path in texts:
+		with text_encoding.open_text(path) as f:
+			for line in f:
+				lines.append(line)
+				if len(lines) == chunk:
+					yield lines
+					lines = []
+	if lines:
+		yield lines
+
+
+def count_corpus(texts, pool, jobs, chunk=20000):
+	"""Word and syllable counters of texts, counted by pool with at most 2 * jobs chunks pending."""
+	words = collections.Counter()
+	syllables = collections.Counter()
+	pending = collections.deque()
+	for lines in line_chunks(texts, chunk):
+		pending.append(pool.apply_async(_count, (lines,)))
+		while len(pending) >= 2 * jobs:
+			chunk_words, chunk_syllables = pending.popleft().get()
+			words.update(chunk_words)
+			syllables.update(chunk_syllables)
+	while pending:
+		chunk_words, chunk_syllables = pending.popleft().get()
+		words.update(chunk_words)
+		syllables.update(chunk_syllables)
+	return words, syllables
+
+
+def oov_words(words, dictionary):
+	"""The entries of the word counter whose word has no entry in dictionary, most frequent first."""
+	return [(entry, count) for entry, count in _by_count(words) if entry.split()[0] not in dictionary]
+
+
+def _by_count(counter):
+	return sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+
+
+def write_frequencies(counter, path):
+	with open(path, 'w', encoding='utf-8') as fout:
+		for entry, count in _by_count(counter):
+			fout.write("%s %d\n" % (entry, count))
+
+
+def prewarm(pool, oov, chunk=5000):
+	"""Pronounce the OOV entries into the G2P cache of the pool workers; returns the summed cache stats."""
+	entries = sorted(entry for entry, count in oov)
+	stats = {}
+	for chunk_entries, cache_stats in pool.imap(make_lexicon._pronounce,
+												[entries[i:i + chunk] for i in range(0, len(entries), chunk)]):
+		for name, value in cache_stats.items():
+			if name != 'hit_rate':
+				stats[name] = stats.get(name, 0) + value
+	return stats
+
+
+if __name__ == '__main__':
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "j:o:", ["jobs=", "dict=", "model=", "top=", "chunk=", "g2p-cache="])
+		if not args:
+			raise ValueError("Specify text files or directories of transcripts!")
+
+		jobs = align.getopt2("-j", opts, align.getopt2("--jobs", opts, None))
+		jobs = int(jobs) if jobs is not None else (os.cpu_count() or 1)
+		if jobs < 1:
+			raise ValueError("-j must be at least 1")
+		chunk = int(align.getopt2("--chunk", opts, "20000"))
+		if chunk < 1:
+			raise ValueError("--chunk must be at least 1")
+		top = int(align.getopt2("--top", opts, "20"))
+		prefix = align.getopt2("-o", opts, None)
+		lexicon = align.getopt2("--dict", opts, None)
+		if lexicon is None:
+			lexicon = align.resolve_model(align.getopt2("--model", opts, None))[0] + '/dict'
+		g2p_cache = align.getopt2("--g2p-cache", opts, None)
+	except Exception:
+		print(__doc__)
+		(_type, value, _traceback) = sys.exc_info()
+		print(value)
+		sys.exit(0)
+
+	texts = find_texts(args)
+	if not texts:
+		print("No text files found.")
+		sys.exit(1)
+
+	start = time.time()
+	with multiprocessing.Pool(jobs, make_lexicon._init_worker, (g2p_cache,)) as pool:
+		words, syllables = count_corpus(texts, pool, jobs, chunk)
+		oov = oov_words(words, align._read_dictionary_words(lexicon))
+		cache_stats = prewarm(pool, oov) if g2p_cache is not None and oov else None
+
+	tokens = sum(words.values())
+	oov_tokens = sum(count for entry, count in oov)
+	print("%d file(s), %d word token(s), %d distinct word(s), %d syllable token(s), %d distinct syllable(s)"
+		  % (len(texts), tokens, len(words), sum(syllables.values()), len(syllables)))
+	print("OOV against %s: %d of %d distinct words (%.2f%%), %d of %d tokens (%.2f%%)"
+		  % (lexicon, len(oov), len(words), 100.0 * len(oov) / len(words) if words else 0.0,
+			 oov_tokens, tokens, 100.0 * oov_tokens / tokens if tokens else 0.0))
+	for entry, count in oov[:top]:
+		print("  %s %d" % (entry, count))
+	if cache_stats is not None:
+		print("G2P cache: %(hits)d hits, %(file_hits)d file hits, %(misses)d misses" % cache_stats)
+	if prefix is not None:
+		write_frequencies(words, prefix + '.words.txt')
+		write_frequencies(syllables, prefix + '.syllables.txt')
+		print("Wrote %s.words.txt and %s.syllables.txt" % (prefix, prefix))
+	print("Done in %.1f s" % (time.time() - start))
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+
+"""
+Command-line usage:
+  python htkmodel.py hmm_dir
+	-- load hmm_dir/macros and hmm_dir/hmmdefs (compiling the cache if needed) and print a summary
+  python htkmodel.py --compile hmm_dir
+	-- (re)write the compiled cache hmm_dir/hmmdefs.cache and verify it
+
+Reader for the text HTK model files (macros, hmmdefs) used by HVite. It covers what
+our acoustic models use: global options (~o), variance floors (~v), shared states (~s,
+e.g. "silst" shared by sil and the sp tee model), shared transition matrices (~t) and
+HMMs (~h) whose states are single diagonal-covariance Gaussians.
+
+The model is compiled into contiguous NumPy arrays: means, inverse variances and log
+constants (-GCONST/2) with one row per distinct state, so shared states are scored only
+once, log transition matrices padded to the largest model, and a phone -> state row index.
+The terms the likelihoods are computed from (means / variances and the per-state constant
+with -0.5 * sum(mean^2 / variance) folded in) are compiled too, so no process derives
+its own copy of them.
+load_model() keeps these arrays in hmmdefs.cache next to the model: a small JSON header
+(with SHA-1 checksums of the source files and of the array data) followed by the raw
+arrays, which later loads map read-only instead of parsing text, so worker processes
+share the same pages. A cache whose sources changed is rebuilt. Requires NumPy.
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import tempfile
+
+import numpy as np
+
+
+_TOKEN = re.compile(r'<[^>]*>|~[a-zA-Z]|"[^"]*"|[^\s<>"]+')
+
+CACHE_NAME = 'hmmdefs.cache'
+CACHE_MAGIC = b'KFAMODEL2\n'
+_ALIGN = 64
+
+# arrays making up a compiled model, in file order
+_ARRAYS = ('means', 'inv_variances', 'log_consts', 'scaled_means', 'gauss_consts', 'hmm_sizes', 'state_index',
+		   'log_transp')
+
+
+class HMM(object):
+	"""One model: emitting state rows (states 2..N-1) and its N x N log transition matrix."""
+
+	def __init__(self, name, states, log_transp):
+		self.name = name
+		self.states = states
+		self.log_transp = log_transp
+
+	@property
+	def num_states(self):
+		return len(self.log_transp)
+
+	def is_tee(self):
+		"""True if the model can be passed through without consuming a frame (like sp)."""
+		return self.log_transp[0, -1] > -np.inf
+
+
+class HTKModel(object):
+	"""
+	A compiled set of HMMs. Per distinct state: means and inv_variances (states x dims)
+	and log_consts (states), and for the likelihoods scaled_means (means * inv_variances)
+	and gauss_consts (log_consts - 0.5 * sum(means * scaled_means)), derived from the
+	others unless given. Per phone (in the order of phones): hmm_sizes (number of
+	states), state_index (the emitting state rows, -1 padded) and log_transp (padded with -inf).
+	"""
+
+	def __init__(self, means, inv_variances, log_consts, phones, hmm_sizes, state_index, log_transp,
+				 parm_kind=None, state_names=None, scaled_means=None, gauss_consts=None):
+		self.means = means
+		self.inv_variances = inv_variances
+		self.log_consts = log_consts
+		self.phones = list(phones)
+		self.hmm_sizes = hmm_sizes
+		self.state_index = state_index
+		self.log_transp = log_transp
+		self.parm_kind = parm_kind
+		self.state_names = state_names or {}
+		self.hmms = {}
+		for h, name in enumerate(self.phones):
+			n = int(hmm_sizes[h])
+			self.hmms[name] = HMM(name, state_index[h, :n - 2], log_transp[h, :n, :n])
+		if scaled_means is None:
+			scaled_means = means * inv_variances
+		if gauss_consts is None:
+			# -0.5 * sum(mu^2 / var) folded into the per-state constant
+			gauss_consts = log_consts - 0.5 * np.sum(means * scaled_means, axis=1)
+		self.scaled_means = scaled_means
+		self.gauss_consts = gauss_consts
+
+	def arrays(self):
+		return dict((name, getattr(self, name)) for name in _ARRAYS)
+
+	@property
+	def num_states(self):
+		return len(self.means)
+
+	@property
+	def vec_size(self):
+		return self.means.shape[1]
+
+	def log_likelihoods(self, features, states=None):
+		"""
+		Log output probabilities (frames x states) of diagonal Gaussians,
+		-0.5 * (gconst + sum((o - mu)^2 / var)), for all states or the given state rows.
+		"""
+		features = np.asarray(features, dtype=np.float64)
+		if features.shape[1] != self.vec_size:
+			raise ValueError("feature dimension " + str(features.shape[1]) + " does not match the model (" +
+							 str(self.vec_size) + ")")
+		if states is None:
+			inv_var, scaled, const = self.inv_variances, self.scaled_means, self.gauss_consts
+		else:
+			inv_var, scaled, const = self.inv_variances[states], self.scaled_means[states], self.gauss_consts[states]
+		return const + features @ scaled.T - 0.5 * ((features * features) @ inv_var.T)
+
+
+class _Parser(object):
+
+	def __init__(self):
+		self.means = []
+		self.variances = []
+		self.gconsts = []
+		self.shared_states = {}
+		self.shared_transp = {}
+		self.hmms = {}
+		self.parm_kind = None
+
+	def parse_file(self, path):
+		with open(path, 'r') as f:
+			self.tokens = _TOKEN.findall(f.read())
+		self.pos = 0
+		while self.pos < len(self.tokens):
+			tok = self.next()
+			if tok == '~o':
+				self.parse_options()
+			elif tok == '~v':
+				self.name()
+				self.expect('<VARIANCE>')
+				self.vector()
+			elif tok == '~s':
+				name = self.name()
+				self.shared_states[name] = self.state_body()
+			elif tok == '~t':
+				name = self.name()
+				self.expect('<TRANSP>')
+				self.shared_transp[name] = self.matrix()
+			elif tok == '~h':
+				name = self.name()
+				self.hmms[name] = self.hmm(name)
+			else:
+				raise ValueError(path + ": unexpected token " + tok)
+
+	def next(self):
+		tok = self.tokens[self.pos]
+		self.pos += 1
+		return tok
+
+	def peek(self):
+		return self.tokens[self.pos].upper() if self.pos < len(self.tokens) else None
+
+	def expect(self, want):
+		tok = self.next()
+		if tok.upper() != want:
+			raise ValueError("expected " + want + ", found " + tok)
+
+	def name(self):
+		return self.next().strip('"')
+
+	def vector(self):
+		n = int(self.next())
+		values = np.array([float(v) for v in self.tokens[self.pos:self.pos + n]])
+		self.pos += n
+		return values
+
+	def matrix(self):
+		n = int(self.next())
+		values = np.array([float(v) for v in self.tokens[self.pos:self.pos + n * n]])
+		self.pos += n * n
+		return values.reshape(n, n)
+
+	def parse_options(self):
+		while self.peek() is not None and self.peek().startswith('<') and self.peek() not in ('<BEGINHMM>', '<NUMSTATES>'):
+			tok = self.next().upper()
+			if tok == '<STREAMINFO>':
+				n = int(self.next())
+				self.pos += n
+			elif tok == '<VECSIZE>':
+				self.next()
+			elif tok in ('<NULLD>', '<DIAGC>', '<INVDIAGC>', '<FULLC>'):
+				continue
+			else:
+				self.parm_kind = tok.strip('<>')
+
+	def state_body(self):
+		"""Parse a state (a single Gaussian) and return its row index."""
+		if self.peek() == '<NUMMIXES>':
+			self.next()
+			if int(self.next()) != 1:
+				raise ValueError("only single-Gaussian states are supported")
+		if self.peek() == '<MIXTURE>':
+			self.next()
+			self.next()
+			self.next()
+		self.expect('<MEAN>')
+		mean = self.vector()
+		self.expect('<VARIANCE>')
+		var = self.vector()
+		if self.peek() == '<GCONST>':
+			self.next()
+			gconst = float(self.next())
+		else:
+			gconst = len(var) * np.log(2.0 * np.pi) + np.sum(np.log(var))
+		self.means.append(mean)
+		self.variances.append(var)
+		self.gconsts.append(gconst)
+		return len(self.means) - 1
+
+	def hmm(self, name):
+		self.expect('<BEGINHMM>')
+		if self.peek() not in ('<NUMSTATES>',):
+			self.parse_options()
+		self.expect('<NUMSTATES>')
+		n = int(self.next())
+		states = [None] * (n - 2)
+		transp = None
+		while True:
+			tok = self.next()
+			utok = tok.upper()
+			if utok == '<STATE>':
+				i = int(self.next())
+				if self.peek() == '~S':
+					self.next()
+					ref = self.name()
+					if ref not in self.shared_states:
+						raise ValueError("HMM " + name + " uses undefined state ~s \"" + ref + "\"")
+					states[i - 2] = self.shared_states[ref]
+				else:
+					states[i - 2] = self.state_body()
+			elif utok == '<TRANSP>':
+				transp = self.matrix()
+			elif utok == '~T':
+				transp = self.shared_transp[self.name()]
+			elif utok == '<ENDHMM>':
+				break
+			else:
+				raise ValueError("HMM " + name + ": unexpected token " + tok)
+		if transp is None or any(s is None for s in states):
+			raise ValueError("HMM " + name + " is incomplete")
+		return states, transp
+
+	def compile(self):
+		"""The parsed model as an HTKModel."""
+		phones = sorted(self.hmms)
+		largest = max(len(self.hmms[name][1]) for name in phones)
+		hmm_sizes = np.zeros(len(phones), dtype=np.int32)
+		state_index = np.full((len(phones), largest - 2), -1, dtype=np.int32)
+		log_transp = np.full((len(phones), largest, largest), -np.inf)
+		for h, name in enumerate(phones):
+			states, transp = self.hmms[name]
+			n = len(transp)
+			hmm_sizes[h] = n
+			state_index[h, :n - 2] = states
+			with np.errstate(divide='ignore'):
+				log_transp[h, :n, :n] = np.log(transp)
+		state_names = dict((idx, name) for name, idx in self.shared_states.items())
+		return HTKModel(np.array(self.means), 1.0 / np.array(self.variances), -0.5 * np.array(self.gconsts),
+						phones, hmm_sizes, state_index, log_transp, self.parm_kind, state_names)
+
+
+def parse_model(paths):
+	"""Parse text HTK model files (later files may use macros from earlier ones)."""
+	parser = _Parser()
+	for path in paths:
+		parser.parse_file(path)
+	return parser.compile()
+
+
+def model_files(hmmdir):
+	"""The model files HVite is given for hmmdir, in order."""
+	return [os.path.join(hmmdir, 'macros'), os.path.join(hmmdir, 'hmmdefs')]
+
+
+def source_checksum(paths):
+	"""SHA-1 over the contents of the model source files."""
+	sha = hashlib.sha1()
+	for path in paths:
+		with open(path, 'rb') as f:
+			sha.update(f.read())
+	return sha.hexdigest()
+
+
+def _data_checksum(arrays):
+	sha = hashlib.sha1()
+	for name in _ARRAYS:
+		sha.update(np.ascontiguousarray(arrays[name]).tobytes())
+	return sha.hexdigest()
+
+
+def save_cache(model, path, checksum):
+	"""Write model to path atomically as a compiled cache for sources with the given checksum."""
+	arrays = model.arrays()
+	layout = {}
+	offset = 0
+	for name in _ARRAYS:
+		a = arrays[name]
+		layout[name] = [a.dtype.str, list(a.shape), offset]
+		offset += -(-a.nbytes // _ALIGN) * _ALIGN
+	header = json.dumps({
+		'source_sha1': checksum,
+		'data_sha1': _data_checksum(arrays),
+		'phones': model.phones,
+		'parm_kind': model.parm_kind,
+		'state_names': dict((str(k), v) for k, v in model.state_names.items()),
+		'arrays': layout,
+	}).encode('utf-8')
+	data_start = -(-(len(CACHE_MAGIC) + 8 + len(header)) // _ALIGN) * _ALIGN
+
+	fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path), dir=os.path.dirname(path) or '.')
+	try:
+		with os.fdopen(fd, 'wb') as fw:
+			fw.write(CACHE_MAGIC + len(header).to_bytes(8, 'little') + header)
+			for name in _ARRAYS:
+				a = np.ascontiguousarray(arrays[name])
+				fw.seek(data_start + layout[name][2])
+				fw.write(a.tobytes())
+			fw.truncate(data_start + offset)
+		os.chmod(tmp, 0o644)
+		os.replace(tmp, path)
+	except BaseException:
+		os.remove(tmp)
+		raise
+
+
+def load_cache(path, checksum=None, verify=False):
+	"""
+	Map a compiled cache read-only and return the model. Raises ValueError if the file is
+	not a cache, was built from sources other than checksum, or (with verify) is corrupt.
+	"""
+	with open(path, 'rb') as f:
+		if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+			raise ValueError(path + " is not a compiled model")
+		header = json.loads(f.read(int.from_bytes(f.read(8), 'little')).decode('utf-8'))
+		data_start = -(-f.tell() // _ALIGN) * _ALIGN
+	if checksum is not None and header['source_sha1'] != checksum:
+		raise ValueError(path + " is stale: the model files have changed")
+
+	data = np.memmap(path, dtype=np.uint8, mode='r')
+	arrays = {}
+	for name in _ARRAYS:
+		dtype, shape, offset = header['arrays'][name]
+		dtype = np.dtype(dtype)
+		start = data_start + offset
+		count = int(np.prod(shape))
+		if start + count * dtype.itemsize > len(data):
+			raise ValueError(path + " is truncated")
+		arrays[name] = data[start:start + count * dtype.itemsize].view(dtype).reshape(shape)
+	if verify and _data_checksum(arrays) != header['data_sha1']:
+		raise ValueError(path + " is corrupt: data checksum mismatch")
+	state_names = dict((int(k), v) for k, v in header['state_names'].items())
+	return HTKModel(arrays['means'], arrays['inv_variances'], arrays['log_consts'], header['phones'],
+					arrays['hmm_sizes'], arrays['state_index'], arrays['log_transp'],
+					header['parm_kind'], state_names, arrays['scaled_means'], arrays['gauss_consts'])
+
+
+def compile_model(hmmdir, cache_path=None):
+	"""Parse hmmdir/macros and hmmdir/hmmdefs and (re)write the compiled cache; returns its path."""
+	paths = model_files(hmmdir)
+	cache_path = cache_path or os.path.join(hmmdir, CACHE_NAME)
+	save_cache(parse_model(paths), cache_path, source_checksum(paths))
+	return cache_path
+
+
+def load_model(hmmdir, cache=True):
+	"""
+	Load hmmdir/macros and hmmdir/hmmdefs, from the compiled cache when it matches them.
+	Otherwise the text is parsed and, with cache set, the cache is (re)written if the
+	model directory is writable.
+	"""
+	paths = model_files(hmmdir)
+	if not cache:
+		return parse_model(paths)
+	checksum = source_checksum(paths)
+	cache_path = os.path.join(hmmdir, CACHE_NAME)
+	try:
+		return load_cache(cache_path, checksum)
+	except (OSError, ValueError, KeyError):
+		pass
+	model = parse_model(paths)
+	try:
+		save_cache(model, cache_path, checksum)
+	except OSError:
+		return model
+	return load_cache(cache_path, checksum)
+
+
+if __name__ == '__main__':
+	args = sys.argv[1:]
+	if len(args) == 2 and args[0] == '--compile':
+		path = compile_model(args[1])
+		load_cache(path, source_checksum(model_files(args[1])), verify=True)
+		print("Wrote " + path)
+		sys.exit(0)
+	if len(args) != 1:
+		print(__doc__)
+		sys.exit(0)
+	model = load_model(args[0])
+	print(str(len(model.hmms)) + " HMMs, " + str(model.num_states) + " distinct states, " +
+		  str(model.vec_size) + " dimensions, parameter kind " + str(model.parm_kind))
+	for name in model.phones:
+		hmm = model.hmms[name]
+		print("  %-4s %d states%s" % (name, hmm.num_states, " (tee)" if hmm.is_tee() else ""))
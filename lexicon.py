@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+Command-line usage:
+  python lexicon.py dictionary word ...
+	-- print the entries of the words (plus sil and sp) as a job dictionary gets them
+
+The pronunciation dictionaries of an alignment job. The base Lexicon (the model dict
+followed by dict.local) is read once per process and never changed; it keeps the lines
+in file order and an index from each word to its lines. Every job puts the entries it
+adds (from the G2P) into its own LexiconOverlay, so jobs do not see each other's words
+and nothing shared is written or sorted again.
+
+For HVite a job gets only the entries of the words it uses (see overlay.entries): the
+base entries in file order, or, when the job added entries, the sorted union of the
+base and job entries with whitespace normalized, as bin/add_dict.py would have merged
+them into the dictionary.
+"""
+
+import sys
+import collections
+
+
+# entries every job dictionary has
+KEEP = ('sil', 'sp')
+
+
+class Lexicon(object):
+	"""Read-only dictionary lines with an index from each word to the positions of its lines."""
+
+	def __init__(self, lines):
+		self.lines = tuple(line.rstrip('\n') for line in lines)
+		index = {}
+		for position, line in enumerate(self.lines):
+			parts = line.split(None, 1)
+			if parts:
+				index.setdefault(parts[0], []).append(position)
+		self.index = dict((word, tuple(positions)) for word, positions in index.items())
+
+	@classmethod
+	def from_files(cls, *paths):
+		"""The lines of the files one after the other; a missing path (None) is skipped."""
+		lines = []
+		for path in paths:
+			if path is not None:
+				with open(path, 'r', encoding='utf-8') as f:
+					lines.extend(f.read().splitlines())
+		return cls(lines)
+
+	def __contains__(self, word):
+		return word in self.index
+
+	def __len__(self):
+		return len(self.index)
+
+	def entries(self, words):
+		"""The lines of words, in file order."""
+		positions = sorted(p for word in set(words) for p in self.index.get(word, ()))
+		return [self.lines[p] for p in positions]
+
+
+class LexiconOverlay(object):
+	"""
+	The entries one job adds over a base Lexicon. words is the word index of the job
+	(a ChainMap over the base index, so a pronouncer can add to it as to a dict) and
+	lines the added entries, whitespace normalized.
+	"""
+
+	def __init__(self, base, lines=()):
+		self.base = base
+		self.words = collections.ChainMap({}, base.index)
+		self.lines = []
+		self.add(lines)
+
+	def add(self, lines):
+		for line in lines:
+			parts = line.split()
+			if parts:
+				self.lines.append(' '.join(parts))
+				self.words[parts[0]] = True
+
+	def __contains__(self, word):
+		return word in self.words
+
+	def entries(self, words, keep=KEEP):
+		"""The dictionary lines of words and keep for this job (see the module documentation)."""
+		wanted = set(words).union(keep)
+		base = self.base.entries(wanted)
+		if not self.lines:
+			return base
+		merged = set(' '.join(line.split()) for line in base)
+		merged.update(line for line in self.lines if line.split(None, 1)[0] in wanted)
+		return sorted(merged)
+
+
+if __name__ == '__main__':
+	if len(sys.argv) < 3:
+		print(__doc__)
+		sys.exit(0)
+	for line in LexiconOverlay(Lexicon.from_files(sys.argv[1])).entries(sys.argv[2:]):
+		print(line)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+
+"""
+Command-line usage:
+  python lexicon_store.py [options] store
+  where store is the SQLite file of the lexicon (created if missing) and options may include:
+	--import=file    -- add the entries of an HTK dictionary file (may be repeated)
+	--replace        -- with --import, the words of the file lose the entries they had before
+	--delete=file    -- delete the words listed in file, one per line
+	--lookup=word    -- print the entries of word (may be repeated)
+	--export=file    -- write the store as an HTK dictionary
+	--words=file     -- with --export, only the words listed in file (plus sil and sp)
+	--curated        -- with --export, leave out the learned words
+	--cap=n          -- keep at most n learned words from now on
+	--evict          -- evict the least recently used learned words beyond the cap now
+  Without options the number of words, entries and learned words and the version are printed.
+
+An indexed pronunciation lexicon, for dictionaries too large to rewrite or search as
+a flat file on every change. The entries are kept in a SQLite table whose primary key
+is (word, entry), so looking up a word is a B-tree search and the words of a job are
+fetched in a few queries. Entries are stored as bin/add_dict.py merges them: whitespace
+normalized, without duplicates.
+
+Every change (upsert, delete) is one transaction that also counts up the version of
+the store; the file is in WAL mode, so readers keep seeing the previous version until
+the transaction is committed and never a partial one. export() writes a dictionary
+next to its destination and renames it into place, so the file is complete or untouched.
+
+Besides these curated entries the store has a tier of learned words: pronunciations
+that alignment jobs made with the G2P (align.py --learned-lexicon=file), with the
+time each word was last used. learn() adds entries and evicts the least recently used
+learned words beyond the cap (learned_cap(), DEFAULT_LEARNED_CAP to begin with);
+recall() returns the entries of learned words and marks them used. A word is either
+curated or learned: learn() leaves curated words alone and upsert() moves learned
+words to the curated entries. Curated entries are never evicted.
+
+recall() only reads: the times it marks are kept in memory and written in one
+transaction every FLUSH_TOUCHES words, before learn() and evict(), and by flush() /
+close() (also when the interpreter exits), so concurrent jobs recalling words do not
+wait for the write lock. Learned entries are keyed to the G2P rules that made them
+(bin/g2p_cache.rules_hash); opening the store drops the learned words of other rules.
+"""
+
+import os
+import sys
+import time
+import atexit
+import getopt
+import sqlite3
+import tempfile
+import threading
+
+import lexicon
+
+
+BATCH = 500  # words per SELECT, below SQLite's limit on query parameters
+
+DEFAULT_LEARNED_CAP = 100000
+
+FLUSH_TOUCHES = 1000  # recalled words marked in memory before their times are written
+
+
+def g2p_rules():
+	"""The hash of the current G2P rules (bin/g2p_cache.rules_hash) that learned entries are keyed to."""
+	bin_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin')
+	if bin_dir not in sys.path:
+		sys.path.insert(0, bin_dir)
+	import g2p_cache
+	return g2p_cache.rules_hash()
+
+
+def _normalized(lines):
+	for line in lines:
+		parts = line.split()
+		if parts:
+			yield parts[0], ' '.join(parts)
+
+
+class LexiconStore(object):
+	"""
+	HTK dictionary entries in the SQLite file path, indexed by word. Learned entries are
+	those of the G2P rules hash rules (default: the current rules, see g2p_rules).
+	"""
+
+	def __init__(self, path, timeout=60.0, rules=None):
+		self.path = path
+		self.rules = g2p_rules() if rules is None else rules
+		self.db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+		# one object may serve several threads (align_server.py)
+		self.lock = threading.RLock()
+		# word -> time of its last recall, not yet written
+		self.touched = {}
+		self.db.execute("PRAGMA journal_mode=WAL")
+		with self.db:
+			self.db.execute("CREATE TABLE IF NOT EXISTS entries "
+							"(word TEXT NOT NULL, entry TEXT NOT NULL, PRIMARY KEY (word, entry)) WITHOUT ROWID")
+			columns = [row[1] for row in self.db.execute("PRAGMA table_info(learned)")]
+			if columns and 'rules' not in columns:
+				# learned before entries were keyed to their rules: which rules is not known
+				self.db.execute("DROP TABLE learned")
+				self.db.execute("DROP TABLE IF EXISTS usage")
+			self.db.execute("CREATE TABLE IF NOT EXISTS learned (word TEXT NOT NULL, entry TEXT NOT NULL, "
+							"rules TEXT NOT NULL, PRIMARY KEY (word, entry)) WITHOUT ROWID")
+			self.db.execute("CREATE TABLE IF NOT EXISTS usage (word TEXT PRIMARY KEY, last_used REAL NOT NULL)")
+			self.db.execute("CREATE INDEX IF NOT EXISTS usage_last_used ON usage (last_used)")
+			self.db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+			self.db.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('version', 0)")
+			self.db.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('learned_cap', ?)",
+							(DEFAULT_LEARNED_CAP,))
+			stale = [row[0] for row in self.db.execute("SELECT DISTINCT word FROM learned WHERE rules != ?",
+													   (self.rules,))]
+			if stale:
+				self._forget(stale)
+				self._commit_version()
+		atexit.register(self.flush)
+
+	def __contains__(self, word):
+		with self.lock:
+			return self.db.execute("SELECT 1 FROM entries WHERE word = ? UNION ALL "
+								   "SELECT 1 FROM learned WHERE word = ? LIMIT 1", (word, word)).fetchone() is not None
+
+	def _meta(self, name):
+		return self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()[0]
+
+	def version(self):
+		"""The number of changes committed to the store."""
+		with self.lock:
+			return self._meta('version')
+
+	def counts(self):
+		"""(curated words, curated entries, learned words) in the store."""
+		with self.lock:
+			return (self.db.execute("SELECT COUNT(DISTINCT word), COUNT(*) FROM entries").fetchone() +
+					self.db.execute("SELECT COUNT(*) FROM usage").fetchone())
+
+	def lookup(self, word):
+		"""The entries of word (curated or learned), sorted."""
+		with self.lock:
+			return [row[0] for row in self.db.execute(
+				"SELECT entry FROM entries WHERE word = ? UNION ALL SELECT entry FROM learned WHERE word = ? "
+				"ORDER BY entry", (word, word))]
+
+	def _select(self, table, words):
+		entries = []
+		for i in range(0, len(words), BATCH):
+			chunk = words[i:i + BATCH]
+			entries.extend(row[0] for row in self.db.execute(
+				"SELECT entry FROM %s WHERE word IN (%s)" % (table, ','.join('?' * len(chunk))), chunk))
+		return entries
+
+	def lookup_many(self, words, learned=True):
+		"""The entries of words (in no particular order), a few hundred words per query."""
+		words = sorted(set(words))
+		with self.lock:
+			return self._select('entries', words) + (self._select('learned', words) if learned else [])
+
+	def _commit_version(self):
+		self.db.execute("UPDATE meta SET value = value + 1 WHERE name = 'version'")
+
+	def _forget(self, words):
+		"""Delete learned words; returns the number of entries deleted."""
+		before = self.db.total_changes
+		self.db.executemany("DELETE FROM learned WHERE word = ?", [(word,) for word in words])
+		forgotten = self.db.total_changes - before
+		self.db.executemany("DELETE FROM usage WHERE word = ?", [(word,) for word in words])
+		return forgotten
+
+	def upsert(self, lines, replace=False):
+		"""
+		Add the dictionary lines in one transaction; with replace the words of lines keep
+		only these entries. Returns (entries added, entries removed).
+		"""
+		rows = sorted(set(_normalized(lines)))
+		words = sorted(set(word for word, entry in rows))
+		with self.lock, self.db:
+			removed = 0
+			if replace:
+				removed = self._delete(words)
+			self._forget(words)
+			before = self.db.total_changes
+			self.db.executemany("INSERT OR IGNORE INTO entries (word, entry) VALUES (?, ?)", rows)
+			added = self.db.total_changes - before
+			self._commit_version()
+		return added, removed
+
+	def _delete(self, words):
+		before = self.db.total_changes
+		self.db.executemany("DELETE FROM entries WHERE word = ?", [(word,) for word in words])
+		return self.db.total_changes - before
+
+	def delete(self, words):
+		"""Delete all entries of words in one transaction; returns how many."""
+		words = sorted(set(words))
+		with self.lock, self.db:
+			removed = self._delete(words) + self._forget(words)
+			self._commit_version()
+		return removed
+
+	def learned_cap(self):
+		"""The number of learned words kept."""
+		with self.lock:
+			return self._meta('learned_cap')
+
+	def set_learned_cap(self, cap):
+		with self.lock, self.db:
+			self.db.execute("UPDATE meta SET value = ? WHERE name = 'learned_cap'", (cap,))
+
+	def _evict(self):
+		cap = self._meta('learned_cap')
+		if self.db.execute("SELECT COUNT(*) FROM usage").fetchone()[0] <= cap:
+			return 0
+		# the learned words after the cap most recently used ones
+		stale = [row[0] for row in self.db.execute(
+			"SELECT word FROM usage ORDER BY last_used DESC, word LIMIT -1 OFFSET ?", (cap,))]
+		self._forget(stale)
+		return len(stale)
+
+	def evict(self):
+		"""Evict the least recently used learned words beyond the cap; returns how many."""
+		with self.lock, self.db:
+			self._flush()
+			evicted = self._evict()
+			if evicted:
+				self._commit_version()
+		return evicted
+
+	def learn(self, lines, now=None):
+		"""
+		Add the dictionary lines of words that are not curated to the learned words, mark
+		those words used at now (default: the current time) and evict beyond the cap.
+		Returns (entries added, words evicted).
+		"""
+		now = time.time() if now is None else now
+		rows = sorted(set(_normalized(lines)))
+		with self.lock, self.db:
+			self._flush()
+			curated = set(entry.split(None, 1)[0]
+						  for entry in self._select('entries', sorted(set(word for word, entry in rows))))
+			rows = [(word, entry, self.rules) for word, entry in rows if word not in curated]
+			before = self.db.total_changes
+			self.db.executemany("INSERT OR IGNORE INTO learned (word, entry, rules) VALUES (?, ?, ?)", rows)
+			added = self.db.total_changes - before
+			self._touch(set(word for word, entry, rules in rows), now)
+			evicted = self._evict()
+			self._commit_version()
+		return added, evicted
+
+	def _touch(self, words, now):
+		self.db.executemany("INSERT INTO usage (word, last_used) VALUES (?, ?) "
+							"ON CONFLICT (word) DO UPDATE SET last_used = excluded.last_used",
+							[(word, now) for word in sorted(words)])
+
+	def recall(self, words, now=None):
+		"""
+		The entries of the learned words among words, which are marked used at now (written
+		later, see flush).
+		"""
+		now = time.time() if now is None else now
+		words = sorted(set(words))
+		with self.lock:
+			entries = []
+			for i in range(0, len(words), BATCH):
+				chunk = words[i:i + BATCH]
+				entries.extend(row[0] for row in self.db.execute(
+					"SELECT entry FROM learned WHERE rules = ? AND word IN (%s)" % ','.join('?' * len(chunk)),
+					[self.rules] + chunk))
+			for entry in entries:
+				self.touched[entry.split(None, 1)[0]] = now
+			if len(self.touched) >= FLUSH_TOUCHES:
+				with self.db:
+					self._flush()
+		return entries
+
+	def _flush(self):
+		# only words still learned: a word evicted or curated since its recall stays out
+		self.db.executemany("UPDATE usage SET last_used = MAX(last_used, ?) WHERE word = ?",
+							[(now, word) for word, now in sorted(self.touched.items())])
+		self.touched = {}
+
+	def flush(self):
+		"""Write the times recall() marked."""
+		with self.lock:
+			if self.touched and self.db is not None:
+				with self.db:
+					self._flush()
+
+	def import_file(self, path, replace=False):
+		"""upsert() the lines of an HTK dictionary file."""
+		with open(path, 'r', encoding='utf-8') as f:
+			return self.upsert(f, replace)
+
+	def export(self, path, words=None, keep=lexicon.KEEP, learned=True):
+		"""
+		Write the entries of words and keep (all entries without words), learned ones too
+		unless learned is false, to path, sorted as bin/add_dict.py sorts them; returns the
+		number of entries written.
+		"""
+		if words is None:
+			with self.lock:
+				entries = [row[0] for row in self.db.execute("SELECT entry FROM entries")]
+				if learned:
+					entries.extend(row[0] for row in self.db.execute("SELECT entry FROM learned"))
+		else:
+			entries = self.lookup_many(set(words).union(keep), learned)
+		entries.sort()
+
+		fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path), dir=os.path.dirname(path) or '.')
+		try:
+			with os.fdopen(fd, 'w', encoding='utf-8') as fout:
+				for entry in entries:
+					fout.write(entry + '\n')
+			os.chmod(tmp, 0o644)
+			os.replace(tmp, path)
+		except BaseException:
+			os.remove(tmp)
+			raise
+		return len(entries)
+
+	def close(self):
+		self.flush()
+		with self.lock:
+			if self.db is not None:
+				self.db.close()
+				self.db = None
+				atexit.unregister(self.flush)
+
+
+def _read_words(path):
+	with open(path, 'r', encoding='utf-8') as f:
+		return [line.split()[0] for line in f if line.split()]
+
+
+if __name__ == '__main__':
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "", ["import=", "replace", "delete=", "lookup=", "export=", "words=",
+															 "curated", "cap=", "evict"])
+		if len(args) != 1:
+			raise ValueError("Specify the store file!")
+	except Exception:
+		print(__doc__)
+		(_type, value, _traceback) = sys.exc_info()
+		print(value)
+		sys.exit(0)
+
+	store = LexiconStore(args[0])
+	replace = ('--replace', '') in opts
+	learned = ('--curated', '') not in opts
+	words = None
+	for opt, value in opts:
+		if opt == '--words':
+			words = _read_words(value)
+	for opt, value in opts:
+		if opt == '--import':
+			print("%s: %d entries added, %d removed" % ((value,) + store.import_file(value, replace)))
+		elif opt == '--delete':
+			print("%s: %d entries deleted" % (value, store.delete(_read_words(value))))
+		elif opt == '--lookup':
+			for entry in store.lookup(value):
+				print(entry)
+		elif opt == '--export':
+			print("Wrote %d entries to %s" % (store.export(value, words, learned=learned), value))
+		elif opt == '--cap':
+			store.set_learned_cap(int(value))
+		elif opt == '--evict':
+			print("%d learned words evicted" % store.evict())
+	if not opts:
+		print("%d words, %d entries, %d learned words (cap %d), version %d"
+			  % (store.counts() + (store.learned_cap(), store.version())))
+	store.close()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+"""
+Command-line usage:
+  python lint_dict.py [options] dictionary ...
+  checks HTK pronunciation dictionaries and prints a report for each; options may include:
+	--model=dir      -- acoustic model directory whose monophones are the known phones
+	                    (default: model/ next to align.py)
+	--phones=file    -- list of known phones, one per line (default: the model's monophones)
+	--add-sp         -- end every entry with sp (as add_sp_to_all_words.py does)
+	--remove-sp      -- remove the sp at the end of entries (as remove_sp_from_dict.py does)
+	--dedupe         -- leave out entries that are already in the output
+	-o file          -- write the dictionary, changed by the options above, to file (may be the input)
+	--report=file    -- also write the report to file
+	--top=n          -- problems and final phones listed per kind (default 20)
+  The exit status is 1 if a dictionary has unknown phones, entries without phones,
+  duplicate entries or conflicting entries.
+
+One pass over each dictionary does what add_sp_to_all_words.py, remove_sp_from_dict.py
+and dict_comparison.sh did in several, and checks what HVite would otherwise only
+complain about when it loads the dictionary:
+  unknown phones   phones that are not in the model's monophones
+  no phones        a word without a pronunciation
+  duplicates       the same entry (whitespace normalized) more than once, e.g. "A a sp" twice
+  conflicts        entries of a word that differ only in the sp at their end
+The report also counts entries, words, words with several pronunciations, entries with
+and without sp, and the final phones of the entries without sp. The entries sil sil and
+sp sp are left as they are. The output is written next to its destination and renamed
+into place, so it may replace the input.
+"""
+
+import os
+import sys
+import getopt
+import tempfile
+import collections
+
+import align
+
+
+SPECIAL = (['sil', 'sil'], ['sp', 'sp'])
+
+PROBLEMS = (
+	('unknown_phones', "unknown phones"),
+	('no_phones', "entries without phones"),
+	('duplicates', "duplicate entries"),
+	('conflicts', "entries differing only in sp"),
+)
+
+
+def read_phones(path):
+	with open(path, 'r') as f:
+		return set(line.strip() for line in f if line.strip())
+
+
+def fix_sp(parts, sp=None):
+	"""The entry parts with sp added at the end (sp='add') or removed (sp='remove'), or unchanged."""
+	if sp is None or parts in SPECIAL:
+		return parts
+	if sp == 'add' and parts[-1] != 'sp':
+		return parts + ['sp']
+	if sp == 'remove' and len(parts) > 2 and parts[-1] == 'sp':
+		return parts[:-1]
+	return parts
+
+
+class DictionaryLinter(object):
+	"""Checks the lines of one dictionary as they pass through check(); see the module documentation."""
+
+	def __init__(self, phones, sp=None, dedupe=False):
+		self.phones = phones
+		self.sp = sp
+		self.dedupe = dedupe
+		self.counts = collections.Counter()
+		self.problems = dict((kind, []) for kind, title in PROBLEMS)
+		self.unknown = collections.Counter()
+		self.final_phones = collections.Counter()
+		# word -> pronunciations (without the final sp) -> whether they ended in sp
+		self.pronunciations = {}
+		self.seen = set()
+		self.written = set()
+
+	def check(self, number, line):
+		"""Check line number of the dictionary; returns the line to write, or None to leave it out."""
+		parts = line.split()
+		if not parts:
+			self.counts['blank'] += 1
+			return line
+		self.counts['entries'] += 1
+		entry = ' '.join(parts)
+		where = "%d: %s" % (number, entry)
+
+		if entry in self.seen:
+			self.problems['duplicates'].append(where)
+		self.seen.add(entry)
+		if len(parts) == 1:
+			self.problems['no_phones'].append(where)
+
+		unknown = [phone for phone in parts[1:] if phone not in self.phones]
+		if unknown:
+			self.unknown.update(unknown)
+			self.problems['unknown_phones'].append(where + "  (" + ' '.join(unknown) + ")")
+
+		if parts in SPECIAL:
+			self.counts['special'] += 1
+		else:
+			with_sp = len(parts) > 2 and parts[-1] == 'sp'
+			pronunciation = ' '.join(parts[1:-1] if with_sp else parts[1:])
+			variants = self.pronunciations.setdefault(parts[0], {})
+			if variants.get(pronunciation, with_sp) != with_sp:
+				self.problems['conflicts'].append(where)
+			variants.setdefault(pronunciation, with_sp)
+			if with_sp:
+				self.counts['with_sp'] += 1
+			else:
+				self.counts['without_sp'] += 1
+				if len(parts) > 1:
+					self.final_phones[parts[-1]] += 1
+
+		fixed = fix_sp(parts, self.sp)
+		if fixed is not parts:
+			self.counts['changed'] += 1
+			line = ' '.join(fixed)
+		if self.dedupe:
+			key = ' '.join(fixed)
+			if key in self.written:
+				self.counts['dropped'] += 1
+				return None
+			self.written.add(key)
+		return line
+
+	def failed(self):
+		return any(self.problems.values())
+
+	def report(self, name, top=20):
+		words = len(self.pronunciations)
+		variants = sum(1 for pronunciations in self.pronunciations.values() if len(pronunciations) > 1)
+		entries = self.counts['entries']
+		lines = ["%s:" % name,
+				 "  %d entries, %d words (%d with several pronunciations), %d blank lines"
+				 % (entries, words, variants, self.counts['blank']),
+				 "  %d end in sp (%.2f%%), %d do not (%.2f%%), %d sil/sp definitions"
+				 % (self.counts['with_sp'], 100.0 * self.counts['with_sp'] / entries if entries else 0.0,
+					self.counts['without_sp'], 100.0 * self.counts['without_sp'] / entries if entries else 0.0,
+					self.counts['special'])]
+		if self.final_phones:
+			lines.append("  final phones without sp: " +
+						 ', '.join("%s %d" % item for item in self.final_phones.most_common(top)))
+		for kind, title in PROBLEMS:
+			found = self.problems[kind]
+			lines.append("  %s: %d" % (title, len(found)))
+			if kind == 'unknown_phones' and self.unknown:
+				lines.append("    phones: " + ', '.join("%s %d" % item for item in self.unknown.most_common()))
+			lines.extend("    " + where for where in found[:top])
+			if len(found) > top:
+				lines.append("    ...")
+		if self.sp is not None or self.dedupe:
+			lines.append("  %d entries changed, %d left out" % (self.counts['changed'], self.counts['dropped']))
+		return '\n'.join(lines)
+
+
+def lint_file(path, linter, output=None):
+	"""Run the lines of the dictionary path through linter, writing what it returns to output (if given)."""
+	fout = None
+	if output is not None:
+		fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(output), dir=os.path.dirname(output) or '.')
+		fout = os.fdopen(fd, 'w', encoding='utf-8')
+	try:
+		with open(path, 'r', encoding='utf-8') as f:
+			for number, raw in enumerate(f, 1):
+				line = linter.check(number, raw.rstrip('\n'))
+				if fout is not None and line is not None:
+					fout.write(line + '\n')
+		if fout is not None:
+			fout.close()
+			os.chmod(tmp, 0o644)
+			os.replace(tmp, output)
+	except BaseException:
+		if fout is not None:
+			fout.close()
+			os.remove(tmp)
+		raise
+	return linter
+
+
+if __name__ == '__main__':
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "o:", ["model=", "phones=", "add-sp", "remove-sp", "dedupe",
+														 "report=", "top="])
+		if not args:
+			raise ValueError("Specify one or more dictionaries!")
+		output = align.getopt2("-o", opts, None)
+		if output is not None and len(args) != 1:
+			raise ValueError("-o needs a single dictionary")
+		add_sp = align.getopt2("--add-sp", opts) is not None
+		remove_sp = align.getopt2("--remove-sp", opts) is not None
+		if add_sp and remove_sp:
+			raise ValueError("--add-sp and --remove-sp exclude each other")
+		sp = 'add' if add_sp else 'remove' if remove_sp else None
+		dedupe = align.getopt2("--dedupe", opts) is not None
+		phones_file = align.getopt2("--phones", opts, None)
+		if phones_file is None:
+			phones_file = align._phone_list(align.resolve_model(align.getopt2("--model", opts, None))[0])
+		report_file = align.getopt2("--report", opts, None)
+		top = int(align.getopt2("--top", opts, "20"))
+	except Exception:
+		print(__doc__)
+		(_type, value, _traceback) = sys.exc_info()
+		print(value)
+		sys.exit(0)
+
+	phones = read_phones(phones_file)
+	reports = []
+	failed = False
+	for path in args:
+		linter = lint_file(path, DictionaryLinter(phones, sp, dedupe), output)
+		reports.append(linter.report(path, top))
+		failed = failed or linter.failed()
+	text = '\n\n'.join(reports)
+	print(text)
+	if report_file is not None:
+		with open(report_file, 'w', encoding='utf-8') as f:
+			f.write(text + '\n')
+	sys.exit(1 if failed else 0)
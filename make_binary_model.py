@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+"""
+Command-line usage:
+  python make_binary_model.py [--model=dir]
+	-- save every acoustic model (model/8000, model/11025, model/16000, whichever exist,
+	   or the given model directory) in HTK binary format with HHEd -B
+
+The binary files go to <hmm dir>/binary with a checksum of the text macros and
+hmmdefs they were made from. align.py --binary-model (and align_corpus.py,
+align_server.py) then has HVite load them instead of parsing the text model; a
+binary model whose checksum no longer matches is ignored until this is rerun.
+"""
+
+import os
+import sys
+import getopt
+
+import align
+
+
+if __name__ == '__main__':
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "", ["model="])
+		if len(args) != 0:
+			raise ValueError("make_binary_model.py takes no positional arguments")
+		mypath = align.getopt2("--model", opts, None)
+	except Exception:
+		print(__doc__)
+		(_type, value, _traceback) = sys.exc_info()
+		print(value)
+		sys.exit(0)
+
+	mypath, hmmsubdir, sr_models = align.resolve_model(mypath)
+	if hmmsubdir == "FROM-SR":
+		hmmdirs = [mypath + "/" + str(SR) for SR in sr_models if os.path.isdir(mypath + "/" + str(SR))]
+	else:
+		hmmdirs = [mypath + hmmsubdir]
+
+	failed = 0
+	for hmmdir in hmmdirs:
+		try:
+			print("Wrote " + align.make_binary_model(hmmdir, align._phone_list(mypath)))
+		except RuntimeError as e:
+			failed += 1
+			print(e)
+	sys.exit(1 if failed else 0)
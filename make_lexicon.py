@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+"""
+Command-line usage:
+  python make_lexicon.py [options] corpus output_dict
+  where corpus is either a directory of .lab/.txt transcripts (searched recursively)
+  or a manifest file as accepted by align.py --manifest, and options may include:
+	-j jobs          -- number of worker processes (default: number of CPUs)
+	--model=dir      -- acoustic model directory whose dict is merged in (default: model/ next to align.py)
+	--new-only       -- write only the G2P entries, not merged with the model dictionary
+	--chunk=n        -- words per G2P task (default 5000)
+	--g2p-cache=file -- reuse and keep pronunciations in this SQLite file (see bin/g2p_cache.py)
+	--store=file     -- also add the G2P entries to this lexicon store (see lexicon_store.py)
+
+Builds the dictionary for a whole corpus at once, like make_dict.sh does for one text
+file. The transcripts are read and romanized by the worker processes, the distinct
+words of all of them collected, and the G2P (bin/make_kdict.py) run once per distinct
+word, in chunks spread over the same workers. The result is merged with the model
+dictionary as bin/add_dict.py does (sorted, without duplicate lines) and written in
+one step, so output_dict is complete or untouched.
+"""
+
+import os
+import sys
+import getopt
+import time
+import tempfile
+import multiprocessing
+
+import align
+import align_corpus
+
+
+# set by _init_worker in every worker process
+_g2p = None
+_cache = None
+
+
+def find_transcripts(corpus):
+	"""The transcript files of a corpus directory (sorted) or of a manifest."""
+	if not os.path.isdir(corpus):
+		return [entry[1] for entry in align.read_manifest(corpus)]
+	transcripts = []
+	for root, dirs, files in os.walk(corpus):
+		dirs.sort()
+		for name in sorted(files):
+			if os.path.splitext(name)[1].lower() in align_corpus.TRANSCRIPT_EXTS:
+				transcripts.append(os.path.join(root, name))
+	return transcripts
+
+
+def _init_worker(g2p_cache=None):
+	global _g2p, _cache
+	_g2p = align._import_g2p()
+	if g2p_cache is not None:
+		import g2p_cache as cache_module
+		_cache = cache_module.G2PCache(g2p_cache)
+
+
+def _transcript_words(trsfile):
+	"""The kdict0.txt lines ("WORD SYL SYL") of one transcript; none unless it has Hangul."""
+	text = align._read_text_any_encoding(trsfile)
+	if not align._contains_hangul(text):
+		return []
+	return _g2p.han2uniconversion.dictionary_words(text.splitlines())
+
+
+def _pronounce(words):
+	if _cache is not None:
+		entries = _cache.entries(words)
+		# pool workers are terminated, not exited, so add the counts to the file's totals now
+		_cache.flush()
+		return entries, _cache.stats()
+	return _g2p.make_kdict.dictionary_entries(words), None
+
+
+def build_lexicon(transcripts, jobs, chunk=5000, g2p_cache=None):
+	"""
+	G2P entries for the distinct words of transcripts. Returns (entries, stats), stats
+	counting files, word occurrences (once per file), distinct words and, with a cache,
+	its hits and misses summed over the workers.
+	"""
+	stats = {'files': len(transcripts), 'occurrences': 0}
+	vocabulary = set()
+	with multiprocessing.Pool(jobs, _init_worker, (g2p_cache,)) as pool:
+		for words in pool.imap_unordered(_transcript_words, transcripts, chunksize=16):
+			stats['occurrences'] += len(words)
+			vocabulary.update(words)
+		vocabulary = sorted(vocabulary)
+		stats['words'] = len(vocabulary)
+
+		entries = []
+		chunks = [vocabulary[i:i + chunk] for i in range(0, len(vocabulary), chunk)]
+		for chunk_entries, cache_stats in pool.imap(_pronounce, chunks):
+			entries.extend(chunk_entries)
+			for name, value in (cache_stats or {}).items():
+				if name != 'hit_rate':
+					stats[name] = stats.get(name, 0) + value
+	return entries, stats
+
+
+def merge_dictionary(entries, outdict, model_dict=None):
+	"""
+	Write entries, merged with model_dict if given, to outdict as bin/add_dict.py
+	merges them (whitespace normalized, sorted, no duplicate lines); returns the line count.
+	"""
+	lines = set(' '.join(entry.split()) for entry in entries)
+	if model_dict is not None:
+		with open(model_dict, 'r', encoding='utf-8') as f:
+			lines.update(' '.join(raw.split()) for raw in f)
+	lines.discard('')
+	merged = sorted(lines)
+
+	fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(outdict), dir=os.path.dirname(outdict) or '.')
+	try:
+		with os.fdopen(fd, 'w', encoding='utf-8') as fout:
+			for line in merged:
+				fout.write(line + '\n')
+		os.chmod(tmp, 0o644)
+		os.replace(tmp, outdict)
+	except BaseException:
+		os.remove(tmp)
+		raise
+	return len(merged)
+
+
+if __name__ == '__main__':
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "j:", ["jobs=", "model=", "new-only", "chunk=", "g2p-cache=", "store="])
+		if len(args) != 2:
+			raise ValueError("Specify a corpus directory or a manifest file, and an output dictionary!")
+		corpus, outdict = args
+
+		jobs = align.getopt2("-j", opts, align.getopt2("--jobs", opts, None))
+		jobs = int(jobs) if jobs is not None else (os.cpu_count() or 1)
+		if jobs < 1:
+			raise ValueError("-j must be at least 1")
+		chunk = int(align.getopt2("--chunk", opts, "5000"))
+		if chunk < 1:
+			raise ValueError("--chunk must be at least 1")
+		mypath = align.getopt2("--model", opts, None)
+		new_only = align.getopt2("--new-only", opts) is not None
+		g2p_cache = align.getopt2("--g2p-cache", opts, None)
+		store = align.getopt2("--store", opts, None)
+	except Exception:
+		print(__doc__)
+		(_type, value, _traceback) = sys.exc_info()
+		print(value)
+		sys.exit(0)
+
+	transcripts = find_transcripts(corpus)
+	if not transcripts:
+		print("No transcripts found.")
+		sys.exit(1)
+
+	start = time.time()
+	entries, stats = build_lexicon(transcripts, jobs, chunk, g2p_cache)
+	model_dict = None if new_only else align.resolve_model(mypath)[0] + '/dict'
+	count = merge_dictionary(entries, outdict, model_dict)
+
+	print("%(files)d transcript(s), %(occurrences)d word occurrence(s), %(words)d distinct word(s)" % stats)
+	if 'misses' in stats:
+		print("G2P cache: %(hits)d hits, %(file_hits)d file hits, %(misses)d misses" % stats)
+	print("Wrote %d entries to %s in %.1f s" % (count, outdict, time.time() - start))
+	if store is not None:
+		import lexicon_store
+		lexicon = lexicon_store.LexiconStore(store)
+		added, removed = lexicon.upsert(entries)
+		print("Added %d entries to %s" % (added, store))
+		lexicon.close()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+
+"""
+Command-line usage:
+  python mfcc.py config_file wave_file output_file
+	-- compute features like "HCopy -C config_file wave_file output_file"
+  python mfcc.py --compare config_file wave_file htk_file
+	-- compute features and report how far they are from a file written by HCopy
+
+In-process replacement for HCopy for the feature kinds our models use (MFCC with
+optional _0, _D and _A qualifiers, e.g. MFCC_0_D_A in model/16000/config). The
+computation follows HTK's HSigP/HParm: pre-emphasis and Hamming window per frame,
+magnitude spectrum, triangular mel filterbank, log with a floor of 1.0, DCT,
+cepstral liftering, C0 appended after the cepstra, then regression deltas over
+a window with the first and last frames replicated.
+
+Features can be returned as arrays or written as HTK parameter files that HVite
+reads like HCopy output. Requires NumPy.
+"""
+
+import sys
+import struct
+import wave
+
+import numpy as np
+
+
+# HTK parameter kinds and qualifier bits (HTK book, section 5.10)
+PARMKIND_BASE = {'WAVEFORM': 0, 'LPC': 1, 'LPREFC': 2, 'LPCEPSTRA': 3, 'LPDELCEP': 4,
+				 'IREFC': 5, 'MFCC': 6, 'FBANK': 7, 'MELSPEC': 8, 'USER': 9, 'DISCRETE': 10, 'PLP': 11}
+PARMKIND_QUALIFIERS = {'E': 0o100, 'N': 0o200, 'D': 0o400, 'A': 0o1000, 'C': 0o2000,
+					   'Z': 0o4000, 'K': 0o10000, '0': 0o20000, 'V': 0o40000, 'T': 0o100000}
+
+HTK_DEFAULTS = {
+	'TARGETKIND': 'MFCC',
+	'PREEMCOEF': 0.97,
+	'USEHAMMING': True,
+	'NUMCHANS': 20,
+	'NUMCEPS': 12,
+	'CEPLIFTER': 22,
+	'LOFREQ': -1.0,
+	'HIFREQ': -1.0,
+	'USEPOWER': False,
+	'DELTAWINDOW': 2,
+	'ACCWINDOW': 2,
+	'ZMEANSOURCE': False,
+}
+
+
+def read_htk_config(path):
+	"""
+	Parse an HTK configuration file into a dict of upper-case keys.
+	Values become floats, ints or booleans (T/F) where possible; module prefixes such as
+	"HPARM:" are dropped.
+	"""
+	config = {}
+	with open(path, 'r') as f:
+		for line in f:
+			line = line.split('#', 1)[0].strip()
+			if '=' not in line:
+				continue
+			key, value = [part.strip() for part in line.split('=', 1)]
+			key = key.split(':')[-1].strip().upper()
+			value = value.strip('"\'')
+			if value in ('T', 'TRUE'):
+				config[key] = True
+			elif value in ('F', 'FALSE'):
+				config[key] = False
+			else:
+				try:
+					config[key] = int(value)
+				except ValueError:
+					try:
+						config[key] = float(value)
+					except ValueError:
+						config[key] = value
+	return config
+
+
+def parse_parmkind(kind):
+	"""Return (base kind, set of qualifiers) for a string such as MFCC_0_D_A."""
+	parts = kind.upper().split('_')
+	if parts[0] not in PARMKIND_BASE:
+		raise ValueError("unknown HTK parameter kind: " + kind)
+	for q in parts[1:]:
+		if q not in PARMKIND_QUALIFIERS:
+			raise ValueError("unknown HTK parameter qualifier _" + q + " in " + kind)
+	return parts[0], set(parts[1:])
+
+
+def parmkind_code(kind):
+	base, qualifiers = parse_parmkind(kind)
+	code = PARMKIND_BASE[base]
+	for q in qualifiers:
+		code |= PARMKIND_QUALIFIERS[q]
+	return code
+
+
+def read_wav(path):
+	"""Return (samples as float64 in 16-bit units, sample rate) of a PCM wave file (first channel)."""
+	f = wave.open(path, 'r')
+	try:
+		nchannels, sampwidth, framerate, nframes = f.getnchannels(), f.getsampwidth(), f.getframerate(), f.getnframes()
+		data = f.readframes(nframes)
+	finally:
+		f.close()
+	if sampwidth == 2:
+		samples = np.frombuffer(data, dtype='<i2').astype(np.float64)
+	elif sampwidth == 1:
+		samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float64) - 128.0) * 256.0
+	elif sampwidth == 4:
+		samples = np.frombuffer(data, dtype='<i4').astype(np.float64) / 65536.0
+	else:
+		raise ValueError("unsupported sample width: " + str(sampwidth))
+	if nchannels > 1:
+		samples = samples[::nchannels]
+	return samples, framerate
+
+
+def write_htk(path, features, samp_period, parm_kind):
+	"""Write features (frames x dims) as a big-endian HTK parameter file; samp_period in 100 ns units."""
+	features = np.asarray(features, dtype='>f4')
+	nframes, dims = features.shape
+	with open(path, 'wb') as fw:
+		fw.write(struct.pack('>iihh', nframes, int(round(samp_period)), dims * 4, parm_kind))
+		fw.write(features.tobytes())
+
+
+def read_htk(path):
+	"""Return (features, samp_period, parm_kind) of a big-endian HTK parameter file."""
+	with open(path, 'rb') as f:
+		nframes, samp_period, samp_size, parm_kind = struct.unpack('>iihh', f.read(12))
+		data = np.frombuffer(f.read(nframes * samp_size), dtype='>f4')
+	return data.reshape(nframes, samp_size // 4).astype(np.float64), samp_period, parm_kind
+
+
+def deltas(features, window):
+	"""HTK regression coefficients over +-window frames, replicating the first and last frame."""
+	if window < 1:
+		raise ValueError("delta window must be at least 1")
+	padded = np.concatenate([np.repeat(features[:1], window, axis=0), features,
+							 np.repeat(features[-1:], window, axis=0)])
+	n = len(features)
+	num = np.zeros_like(features)
+	for theta in range(1, window + 1):
+		num += theta * (padded[window + theta:window + theta + n] - padded[window - theta:window - theta + n])
+	return num / (2.0 * sum(theta * theta for theta in range(1, window + 1)))
+
+
+class MFCC(object):
+	"""MFCC front end configured like HCopy from an HTK configuration dict."""
+
+	def __init__(self, config):
+		cfg = dict(HTK_DEFAULTS)
+		cfg.update(config)
+		self.target_kind = str(cfg['TARGETKIND']).upper()
+		base, self.qualifiers = parse_parmkind(self.target_kind)
+		if base != 'MFCC' or self.qualifiers - {'0', 'D', 'A'}:
+			raise ValueError("only MFCC with _0, _D and _A is supported, not " + self.target_kind)
+		if 'A' in self.qualifiers and 'D' not in self.qualifiers:
+			raise ValueError("_A requires _D: " + self.target_kind)
+		if 'SOURCERATE' not in cfg:
+			raise ValueError("SOURCERATE must be set in the configuration")
+
+		self.source_rate = float(cfg['SOURCERATE'])
+		self.target_rate = float(cfg.get('TARGETRATE', 100000.0))
+		self.frame_size = int(round(float(cfg.get('WINDOWSIZE', 256000.0)) / self.source_rate))
+		self.frame_rate = int(round(self.target_rate / self.source_rate))
+		self.sample_rate = int(round(1.0e7 / self.source_rate))
+		self.preemph = float(cfg['PREEMCOEF'])
+		self.use_hamming = bool(cfg['USEHAMMING'])
+		self.zmean = bool(cfg['ZMEANSOURCE'])
+		self.num_chans = int(cfg['NUMCHANS'])
+		self.num_ceps = int(cfg['NUMCEPS'])
+		self.ceplifter = int(cfg['CEPLIFTER'])
+		self.use_power = bool(cfg['USEPOWER'])
+		self.delta_window = int(cfg['DELTAWINDOW'])
+		self.acc_window = int(cfg['ACCWINDOW'])
+		self.parm_kind = parmkind_code(self.target_kind)
+
+		n = np.arange(self.frame_size)
+		self.window = 0.54 - 0.46 * np.cos(2.0 * np.pi * n / (self.frame_size - 1))
+		self.fft_size = 1 << int(np.ceil(np.log2(self.frame_size)))
+		self.fbank_weights, self.klo, self.khi = self._mel_filterbank(float(cfg['LOFREQ']), float(cfg['HIFREQ']))
+
+		# DCT matrix (NUMCHANS x NUMCEPS), C0 weights and the lifter, as in HSigP
+		k = np.arange(1, self.num_chans + 1) - 0.5
+		j = np.arange(1, self.num_ceps + 1)
+		mfnorm = np.sqrt(2.0 / self.num_chans)
+		self.dct = mfnorm * np.cos(np.outer(k, j) * np.pi / self.num_chans)
+		self.c0_norm = mfnorm
+		if self.ceplifter > 0:
+			self.lifter = 1.0 + self.ceplifter / 2.0 * np.sin(j * np.pi / self.ceplifter)
+		else:
+			self.lifter = np.ones(self.num_ceps)
+
+	@classmethod
+	def from_config_file(cls, path):
+		return cls(read_htk_config(path))
+
+	def _mel_filterbank(self, lofreq, hifreq):
+		"""Weight matrix mapping FFT bins klo..khi to the mel channels, following HSigP InitFBank."""
+		nby2 = self.fft_size // 2
+		fres = 1.0e7 / (self.source_rate * self.fft_size * 700.0)
+
+		def mel(k):
+			return 1127.0 * np.log(1.0 + (k - 1) * fres)
+
+		klo, khi = 2, nby2
+		mlo, mhi = 0.0, mel(nby2 + 1)
+		if lofreq >= 0.0:
+			mlo = 1127.0 * np.log(1.0 + lofreq / 700.0)
+			klo = max(2, int(lofreq * self.source_rate * 1.0e-7 * self.fft_size + 2.5))
+		if hifreq >= 0.0:
+			mhi = 1127.0 * np.log(1.0 + hifreq / 700.0)
+			khi = min(nby2, int(hifreq * self.source_rate * 1.0e-7 * self.fft_size + 0.5))
+
+		max_chan = self.num_chans + 1
+		cf = np.empty(max_chan + 1)
+		cf[0] = mlo
+		cf[1:] = np.arange(1, max_chan + 1) / float(max_chan) * (mhi - mlo) + mlo
+
+		ks = np.arange(klo, khi + 1)
+		melk = mel(ks)
+		lo_chan = np.searchsorted(cf[1:], melk, side='left')
+		lo_wt = np.where(lo_chan > 0,
+						 (cf[np.minimum(lo_chan + 1, max_chan)] - melk) / (cf[np.minimum(lo_chan + 1, max_chan)] - cf[lo_chan]),
+						 (cf[1] - melk) / (cf[1] - mlo))
+
+		weights = np.zeros((len(ks), self.num_chans + 2))
+		rows = np.arange(len(ks))
+		weights[rows, lo_chan] += lo_wt
+		weights[rows, lo_chan + 1] += 1.0 - lo_wt
+		# channel 0 and channel NUMCHANS+1 are the outer edges and are not kept
+		return weights[:, 1:self.num_chans + 1], klo, khi
+
+	def frames(self, signal):
+		"""Frames (n x WINDOWSIZE) of a signal, as strided views without copying."""
+		signal = np.asarray(signal, dtype=np.float64)
+		if len(signal) < self.frame_size:
+			return np.empty((0, self.frame_size))
+		return np.lib.stride_tricks.sliding_window_view(signal, self.frame_size)[::self.frame_rate]
+
+	def static(self, frames):
+		"""Static coefficients (c1..cN, then C0 with _0) for a block of frames."""
+		x = np.array(frames, dtype=np.float64)
+		if self.zmean:
+			x -= x.mean(axis=1, keepdims=True)
+		if self.preemph != 0.0:
+			x[:, 1:] -= self.preemph * x[:, :-1].copy()
+			x[:, 0] *= 1.0 - self.preemph
+		if self.use_hamming:
+			x *= self.window
+		spec = np.fft.rfft(x, n=self.fft_size, axis=1)[:, self.klo - 1:self.khi]
+		ek = spec.real ** 2 + spec.imag ** 2
+		if not self.use_power:
+			ek = np.sqrt(ek)
+		fbank = np.log(np.maximum(ek @ self.fbank_weights, 1.0))
+		ceps = (fbank @ self.dct) * self.lifter
+		if '0' in self.qualifiers:
+			ceps = np.hstack([ceps, fbank.sum(axis=1, keepdims=True) * self.c0_norm])
+		return ceps
+
+	def _dynamic(self, static):
+		parts = [static]
+		if 'D' in self.qualifiers:
+			parts.append(deltas(static, self.delta_window))
+			if 'A' in self.qualifiers:
+				parts.append(deltas(parts[1], self.acc_window))
+		return np.hstack(parts)
+
+	def compute(self, signal):
+		"""Feature matrix (frames x dims) of one signal."""
+		return self.compute_many([signal])[0]
+
+	def compute_many(self, signals):
+		"""
+		Feature matrices for several signals. The frames of all signals go through one
+		batched FFT and filterbank pass; deltas are then taken per signal.
+		"""
+		framed = [self.frames(s) for s in signals]
+		counts = [len(f) for f in framed]
+		if sum(counts) == 0:
+			return [np.empty((0, self.dims)) for _ in signals]
+		static = self.static(np.concatenate([f for f in framed if len(f)]))
+		out = []
+		start = 0
+		for n in counts:
+			out.append(self._dynamic(static[start:start + n]) if n else np.empty((0, self.dims)))
+			start += n
+		return out
+
+	@property
+	def dims(self):
+		n = self.num_ceps + (1 if '0' in self.qualifiers else 0)
+		if 'D' in self.qualifiers:
+			n *= 3 if 'A' in self.qualifiers else 2
+		return n
+
+	def wav_features(self, wavfile):
+		samples, rate = read_wav(wavfile)
+		if rate != self.sample_rate:
+			raise ValueError(wavfile + ": sample rate " + str(rate) + " does not match SOURCERATE (" +
+							 str(self.sample_rate) + " Hz)")
+		return self.compute(samples)
+
+	def convert(self, wavfile, outfile):
+		"""Equivalent of HCopy for one file."""
+		write_htk(outfile, self.wav_features(wavfile), self.target_rate, self.parm_kind)
+
+	def convert_many(self, pairs):
+		"""Equivalent of HCopy -S for a list of (wave file, feature file) pairs, batched."""
+		signals = []
+		for wavfile, outfile in pairs:
+			samples, rate = read_wav(wavfile)
+			if rate != self.sample_rate:
+				raise ValueError(wavfile + ": sample rate " + str(rate) + " does not match SOURCERATE (" +
+								 str(self.sample_rate) + " Hz)")
+			signals.append(samples)
+		for (wavfile, outfile), feats in zip(pairs, self.compute_many(signals)):
+			write_htk(outfile, feats, self.target_rate, self.parm_kind)
+
+
+def compare_with_htk(config_file, wavfile, htk_file):
+	"""
+	Compare our features for wavfile with an HCopy output file.
+	Returns (max absolute difference per dimension, max relative difference overall).
+	"""
+	ours = MFCC.from_config_file(config_file).wav_features(wavfile)
+	ref, samp_period, parm_kind = read_htk(htk_file)
+	if ours.shape != ref.shape:
+		raise ValueError("shape mismatch: ours " + str(ours.shape) + ", HCopy " + str(ref.shape))
+	diff = np.abs(ours - ref)
+	rel = diff / np.maximum(np.abs(ref), 1.0)
+	return diff.max(axis=0), float(rel.max())
+
+
+if __name__ == '__main__':
+	args = sys.argv[1:]
+	if len(args) == 4 and args[0] == '--compare':
+		per_dim, worst = compare_with_htk(args[1], args[2], args[3])
+		print("max abs difference per dimension:")
+		print(' '.join('%.2e' % d for d in per_dim))
+		print("max relative difference: %.2e" % worst)
+		sys.exit(0 if worst < 1e-3 else 1)
+	if len(args) != 3:
+		print(__doc__)
+		sys.exit(0)
+	MFCC.from_config_file(args[0]).convert(args[1], args[2])
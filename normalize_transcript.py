@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+"""
+Command-line usage:
+  python normalize_transcript.py file ...
+	-- print the normalized lines of transcript files, as align.py turns them into words
+  python normalize_transcript.py --benchmark file_or_dir ...
+	-- check the normalizer against the replace chain align.py used before and time both
+	   over the given transcripts (directories are searched for .lab and .txt files)
+
+The transcript normalization of align.text_words, built once from the tables below
+into one regex that makes a single pass over a line:
+  TAGS         noise and breath marks are rewritten
+  PUNCTUATION  characters are deleted
+  DASH         pairs of dashes are deleted, also when only punctuation is between them
+after which the line is upper-cased and hyphenated words (TWENTY-TWO) split in two.
+This gives the same result as the replace chain, which rewrote the tags, then deleted
+the punctuation one character at a time and then the pairs of dashes left over.
+"""
+
+import os
+import re
+import sys
+import time
+
+import text_encoding
+
+
+TAGS = (
+	('{breath}', '{BR}'),
+	('&lt;noise&gt;', '{NS}'),
+	('{laugh}', '{LG}'),
+	('{laughter}', '{LG}'),
+	('{cough}', '{CG}'),
+	('{lipsmack}', '{LS}'),
+)
+
+PUNCTUATION = ',.:;!?"%()'
+
+DASH = '-'
+
+# this pattern matches hyphenated words, such as TWENTY-TWO; however, it doesn't work
+# with longer things like SOMETHING-OR-OTHER
+HYPHENATED = r'([A-Z]+)-([A-Z]+)'
+
+
+class TranscriptNormalizer(object):
+	"""Normalizes transcript lines into MLF words (before the dictionary lookup)."""
+
+	def __init__(self, tags=TAGS, punctuation=PUNCTUATION, dash=DASH, hyphenated=HYPHENATED):
+		self.tags = dict(tags)
+		punctuation = '[' + re.escape(punctuation) + ']'
+		# tags first: a tag may contain punctuation (&lt;noise&gt;)
+		self.pattern = re.compile('|'.join([re.escape(tag) for tag, replacement in tags] +
+										   [re.escape(dash) + punctuation + '*' + re.escape(dash), punctuation]))
+		self.dash = dash
+		self.hyphenated = re.compile(hyphenated)
+
+	def _replace(self, match):
+		return self.tags.get(match.group(), '')
+
+	def normalize(self, line):
+		"""One line of a transcript, normalized."""
+		line = self.pattern.sub(self._replace, line).upper()
+		if self.dash in line:
+			line = self.hyphenated.sub(r'\1 \2', line)
+		return line
+
+	def words(self, line):
+		return self.normalize(line).split()
+
+	def iter_words(self, lines):
+		"""The words of lines (any iterable, e.g. an open file), one line at a time."""
+		for line in lines:
+			for word in self.normalize(line.rstrip('\r\n')).split():
+				yield word
+
+
+normalizer = TranscriptNormalizer()
+
+
+def _replace_chain(txt):
+	"""The normalization as align.text_words did it before TranscriptNormalizer."""
+	txt = txt.replace('{breath}', '{BR}').replace('&lt;noise&gt;', '{NS}')
+	txt = txt.replace('{laugh}', '{LG}').replace('{laughter}', '{LG}')
+	txt = txt.replace('{cough}', '{CG}').replace('{lipsmack}', '{LS}')
+
+	for pun in [',', '.', ':', ';', '!', '?', '"', '%', '(', ')', '--', '---']:
+		txt = txt.replace(pun, '')
+
+	txt = txt.upper()
+
+	return re.sub(re.compile(HYPHENATED), r'\1 \2', txt)
+
+
+def _transcript_files(paths):
+	files = []
+	for path in paths:
+		if not os.path.isdir(path):
+			files.append(path)
+			continue
+		for root, dirs, names in os.walk(path):
+			dirs.sort()
+			files.extend(os.path.join(root, name) for name in sorted(names)
+						 if os.path.splitext(name)[1].lower() in ('.lab', '.txt'))
+	return files
+
+
+def benchmark(paths, repeat=5):
+	"""Compare with the replace chain over the lines of the transcripts; returns the number of differences."""
+	lines = []
+	for path in _transcript_files(paths):
+		lines.extend(text_encoding.read_text(path).splitlines())
+	differences = sum(1 for line in lines if normalizer.normalize(line) != _replace_chain(line))
+
+	timings = []
+	for function in (_replace_chain, normalizer.normalize):
+		start = time.perf_counter()
+		for k in range(repeat):
+			for line in lines:
+				function(line)
+		timings.append((time.perf_counter() - start) / repeat)
+	print("%d line(s), %d difference(s)" % (len(lines), differences))
+	print("replace chain: %.3f s, normalizer: %.3f s (%.1fx)"
+		  % (timings[0], timings[1], timings[0] / timings[1] if timings[1] else 0.0))
+	return differences
+
+
+if __name__ == '__main__':
+	if len(sys.argv) < 2 or sys.argv[1:] == ['--benchmark']:
+		print(__doc__)
+		sys.exit(0)
+	if sys.argv[1] == '--benchmark':
+		sys.exit(1 if benchmark(sys.argv[2:]) else 0)
+	for path in sys.argv[1:]:
+		for line in text_encoding.read_text(path).splitlines():
+			print(normalizer.normalize(line))
@@ -0,0 +1,116 @@
+"""mfcc.py: the feature layout of model/16000/config, and parity with HCopy where HTK is installed."""
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mfcc
+
+
+CONFIG = os.path.join(ROOT, 'model', '16000', 'config')
+WAVFILE = os.path.join(ROOT, 'test', 'mv01_t01_s01.wav')
+
+NUM_STATIC = 13  # c1..c12, then C0
+STATIC_TOLERANCE = 1e-3  # HCopy computes in single precision; relative, |value| floored at 1
+DYNAMIC_TOLERANCE = 1e-2
+
+
+def regression(static, t, window=2):
+	"""The HTK regression coefficients of frame t, the first and last frames replicated."""
+	last = len(static) - 1
+	num = sum(theta * (static[min(t + theta, last)] - static[max(t - theta, 0)]) for theta in range(1, window + 1))
+	return num / (2.0 * sum(theta * theta for theta in range(1, window + 1)))
+
+
+def relative_difference(ours, ref):
+	return float((np.abs(ours - ref) / np.maximum(np.abs(ref), 1.0)).max())
+
+
+class LayoutTest(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		cls.config = mfcc.read_htk_config(CONFIG)
+		cls.front_end = mfcc.MFCC(cls.config)
+		cls.samples, cls.rate = mfcc.read_wav(WAVFILE)
+		cls.features = cls.front_end.wav_features(WAVFILE)
+
+	def test_frame_count(self):
+		# 25 ms windows every 10 ms at 16 kHz, as many as fit in the signal
+		self.assertEqual(self.rate, 16000)
+		self.assertEqual(len(self.features), (len(self.samples) - 400) // 160 + 1)
+
+	def test_kind(self):
+		self.assertEqual(self.features.shape[1], 3 * NUM_STATIC)
+		self.assertEqual(self.front_end.parm_kind, mfcc.parmkind_code('MFCC_0_D_A'))
+
+	def test_c0_follows_cepstra(self):
+		without_c0 = mfcc.MFCC(dict(self.config, TARGETKIND='MFCC')).compute(self.samples)
+		self.assertEqual(without_c0.shape[1], NUM_STATIC - 1)
+		np.testing.assert_allclose(self.features[:, :NUM_STATIC - 1], without_c0)
+
+	def test_deltas_and_accelerations(self):
+		static = self.features[:, :NUM_STATIC]
+		delta = self.features[:, NUM_STATIC:2 * NUM_STATIC]
+		accel = self.features[:, 2 * NUM_STATIC:]
+		for t in (0, 1, len(static) // 2, len(static) - 1):
+			np.testing.assert_allclose(delta[t], regression(static, t), atol=1e-9)
+			np.testing.assert_allclose(accel[t], regression(delta, t), atol=1e-9)
+
+	def test_batch_matches_single(self):
+		first, second = self.front_end.compute_many([self.samples, self.samples[:8000]])
+		np.testing.assert_allclose(first, self.features)
+		np.testing.assert_allclose(second, self.front_end.compute(self.samples[:8000]))
+
+	def test_htk_file_round_trip(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, 'x.mfc')
+			self.front_end.convert(WAVFILE, path)
+			features, samp_period, parm_kind = mfcc.read_htk(path)
+		self.assertEqual((samp_period, parm_kind), (100000, self.front_end.parm_kind))
+		np.testing.assert_allclose(features, self.features, rtol=1e-6, atol=1e-4)
+
+
+@unittest.skipIf(shutil.which('HCopy') is None, "HCopy (HTK) is not installed")
+class HCopyParityTest(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, 'hcopy.mfc')
+			subprocess.run(['HCopy', '-C', CONFIG, WAVFILE, path], check=True, stdout=subprocess.DEVNULL)
+			cls.ref, cls.samp_period, cls.parm_kind = mfcc.read_htk(path)
+		cls.ours = mfcc.MFCC.from_config_file(CONFIG).wav_features(WAVFILE)
+
+	def test_header(self):
+		self.assertEqual(self.samp_period, 100000)
+		self.assertEqual(self.parm_kind, mfcc.parmkind_code('MFCC_0_D_A'))
+
+	def test_frame_count(self):
+		self.assertEqual(self.ours.shape, self.ref.shape)
+
+	def test_static_coefficients(self):
+		self.assertLess(relative_difference(self.ours[:, :NUM_STATIC], self.ref[:, :NUM_STATIC]), STATIC_TOLERANCE)
+
+	def test_dynamic_coefficients(self):
+		self.assertLess(relative_difference(self.ours[:, NUM_STATIC:], self.ref[:, NUM_STATIC:]), DYNAMIC_TOLERANCE)
+
+	def test_hcopy_layout(self):
+		# C0 last among the statics, then deltas and accelerations with a window of 2
+		static = self.ref[:, :NUM_STATIC]
+		delta = self.ref[:, NUM_STATIC:2 * NUM_STATIC]
+		for t in (0, len(static) // 2, len(static) - 1):
+			np.testing.assert_allclose(delta[t], regression(static, t), rtol=1e-3, atol=1e-3)
+			np.testing.assert_allclose(self.ref[t, 2 * NUM_STATIC:], regression(delta, t), rtol=1e-3, atol=1e-3)
+
+
+if __name__ == '__main__':
+	unittest.main()
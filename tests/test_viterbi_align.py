@@ -0,0 +1,126 @@
+"""viterbi_align.py: the phone network around the sp tee model, and boundary parity with HVite where HTK is installed."""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import align
+import htkmodel
+import mfcc
+import viterbi_align
+
+
+HMMDIR = os.path.join(ROOT, 'model', '16000')
+DICTIONARY = os.path.join(ROOT, 'model', 'dict')
+MONOPHONES = os.path.join(ROOT, 'model', 'monophones')
+UTTERANCE = os.path.join(ROOT, 'test', 'mv01_t01_s01')
+FRAME = 100000  # 10 ms in HTK time units
+
+
+def transcript(path):
+	with open(path, 'r', encoding='utf-8') as f:
+		return ['sil'] + f.read().split() + ['sil']
+
+
+def phone_segments(lines):
+	"""(start, end, phone, word or None) of HVite -m style alignment lines."""
+	segments = []
+	for line in lines:
+		parts = line.split()
+		segments.append((int(parts[0]), int(parts[1]), parts[2], parts[4] if len(parts) == 5 else None))
+	return segments
+
+
+def states_of(network, k):
+	return np.flatnonzero(network.phone == k)
+
+
+def arc(network, src, dst):
+	"""Log probability of the arc from state src to state dst (-inf if there is none)."""
+	where = np.flatnonzero(network.offsets == dst - src)
+	return network.weights[where[0], dst] if len(where) else -np.inf
+
+
+class TeeModelTest(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		cls.model = htkmodel.load_model(HMMDIR)
+		cls.pronunciations = viterbi_align.read_pronunciations(DICTIONARY)
+		cls.words = transcript(UTTERANCE + '.lab')
+		cls.features = mfcc.MFCC.from_config_file(os.path.join(HMMDIR, 'config')).wav_features(UTTERANCE + '.wav')
+
+	def test_sp_shares_the_middle_state_of_sil(self):
+		self.assertTrue(self.model.hmms['sp'].is_tee())
+		self.assertEqual(list(self.model.hmms['sp'].states), [self.model.hmms['sil'].states[1]])
+
+	def test_sp_can_be_skipped(self):
+		network = viterbi_align.PhoneNetwork(self.model, ['GICADO', 'sil'], self.pronunciations)
+		phones = [phone for phone, word, is_first in network.instances]
+		self.assertEqual(phones, ['g', 'i', 'c', 'a', 'd', 'o', 'sp', 'sil'])
+		last_o = states_of(network, phones.index('o'))[-1]
+		sp = states_of(network, phones.index('sp'))[0]
+		first_sil = states_of(network, phones.index('sil'))[0]
+		self.assertGreater(arc(network, last_o, sp), -np.inf)
+		self.assertGreater(arc(network, last_o, first_sil), -np.inf)
+		self.assertGreater(arc(network, sp, first_sil), -np.inf)
+
+	def test_network_can_end_after_skipping_sp(self):
+		network = viterbi_align.PhoneNetwork(self.model, ['sil', 'GICADO'], self.pronunciations)
+		phones = [phone for phone, word, is_first in network.instances]
+		self.assertGreater(network.final[states_of(network, phones.index('o'))[-1]], -np.inf)
+		self.assertGreater(network.final[states_of(network, phones.index('sp'))[0]], -np.inf)
+
+	def test_tee_model_alone_is_rejected(self):
+		with self.assertRaises(ValueError):
+			viterbi_align.PhoneNetwork(self.model, ['sp'], self.pronunciations)
+
+	def test_alignment_covers_the_utterance(self):
+		lines = viterbi_align.ViterbiAligner(self.model).align(self.features, self.words, self.pronunciations)
+		segments = phone_segments(lines)
+		self.assertEqual(segments[0][0], 0)
+		self.assertEqual(segments[-1][1], len(self.features) * FRAME)
+		for (start, end, phone, word), following in zip(segments, segments[1:] + [None]):
+			self.assertGreater(end, start)
+			if following is not None:
+				self.assertEqual(end, following[0])
+		self.assertEqual([word for start, end, phone, word in segments if word is not None], self.words)
+
+
+@unittest.skipIf(shutil.which('HVite') is None, "HVite (HTK) is not installed")
+class HViteParityTest(unittest.TestCase):
+
+	def test_boundaries_within_a_frame(self):
+		with tempfile.TemporaryDirectory() as workdir:
+			mfcfile = os.path.join(workdir, 'utt.mfc')
+			mfcc.MFCC.from_config_file(os.path.join(HMMDIR, 'config')).convert(UTTERANCE + '.wav', mfcfile)
+			with open(os.path.join(workdir, 'test.scp'), 'w') as fw:
+				fw.write(mfcfile + '\n')
+			input_mlf = os.path.join(workdir, 'tmp.mlf')
+			align.writeBatchInputMLF(input_mlf, [('utt', transcript(UTTERANCE + '.lab'))])
+
+			hvite_mlf = os.path.join(workdir, 'hvite.mlf')
+			python_mlf = os.path.join(workdir, 'python.mlf')
+			align.viterbi(input_mlf, DICTIONARY, hvite_mlf, MONOPHONES, HMMDIR, workdir, log=lambda message: None)
+			viterbi_align.viterbi(input_mlf, DICTIONARY, python_mlf, HMMDIR, workdir, log=lambda message: None)
+			hvite = phone_segments(align.readBatchAlignedMLF(hvite_mlf)['utt'])
+			ours = phone_segments(align.readBatchAlignedMLF(python_mlf)['utt'])
+
+		# sp may take no frames in one and one frame in the other; its neighbours then move by a frame
+		hvite_phones = [segment for segment in hvite if segment[2] != 'sp']
+		our_phones = [segment for segment in ours if segment[2] != 'sp']
+		self.assertEqual([segment[2:] for segment in our_phones], [segment[2:] for segment in hvite_phones])
+		for (start, end, phone, word), (ref_start, ref_end, ref_phone, ref_word) in zip(our_phones, hvite_phones):
+			self.assertLessEqual(abs(start - ref_start), FRAME, phone)
+			self.assertLessEqual(abs(end - ref_end), FRAME, phone)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+"""
+Command-line usage:
+  python text_encoding.py file ...
+	-- print the encoding detected for each file
+  python text_encoding.py --check
+	-- check the detection and decoding of sample texts in the supported encodings
+
+Encoding detection for transcripts, shared by align.py and the web app.
+
+A transcript may be UTF-8, UTF-16 or CP949/EUC-KR. Instead of decoding the whole
+file with one codec after another, detect_encoding() looks at a prefix only:
+  1. a byte order mark decides (UTF-8, UTF-16 LE/BE)
+  2. NUL bytes mean UTF-16; the byte order tried first is the side most NULs are on
+     (the high byte of ASCII characters; Hangul such as U+AC00 has NUL low bytes, so
+     there are NULs on both sides), then the other one, and data that decodes in
+     neither is binary
+  3. otherwise the prefix is fed to incremental UTF-8 and CP949 decoders, which
+     accept a multi-byte character cut off at the end of the prefix
+The whole file is then decoded once. If that fails past the prefix, the next
+candidate is tried, and in the end UTF-8 with replacement characters is used.
+
+read_text(path) keeps the decoded text per path, modification time and size, so a
+transcript read again in the same process is not read or decoded again. open_text(path)
+is for files too large for that: it detects the encoding from the prefix only and
+returns the file opened for reading line by line.
+"""
+
+import os
+import sys
+import codecs
+import collections
+import threading
+
+
+PREFIX_SIZE = 64 * 1024
+CANDIDATES = ('utf-8', 'cp949')
+BOMS = ((codecs.BOM_UTF8, 'utf-8'), (codecs.BOM_UTF16_LE, 'utf-16-le'), (codecs.BOM_UTF16_BE, 'utf-16-be'))
+
+# decoded texts of the most recently read files
+CACHE_SIZE = 256
+_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _utf16_byte_orders(prefix):
+	"""'utf-16-le' and 'utf-16-be', the one with most NULs of prefix in the high bytes first."""
+	even = prefix[0::2].count(0)
+	odd = prefix[1::2].count(0)
+	return ['utf-16-le', 'utf-16-be'] if odd >= even else ['utf-16-be', 'utf-16-le']
+
+
+def _decodes(encoding, prefix):
+	try:
+		codecs.getincrementaldecoder(encoding)('strict').decode(prefix, final=False)
+		return True
+	except UnicodeDecodeError:
+		return False
+
+
+def candidate_encodings(data, prefix_size=PREFIX_SIZE):
+	"""
+	Encodings that data may be in, most likely first, judged from its first prefix_size
+	bytes. Returns (encodings, bom length); no encodings means it does not look like text.
+	"""
+	for bom, encoding in BOMS:
+		if data.startswith(bom):
+			return [encoding], len(bom)
+	prefix = data[:prefix_size]
+	if b'\0' in prefix:
+		return [encoding for encoding in _utf16_byte_orders(prefix) if _decodes(encoding, prefix)], 0
+	return [encoding for encoding in CANDIDATES if _decodes(encoding, prefix)], 0
+
+
+def detect_encoding(data, prefix_size=PREFIX_SIZE):
+	"""The encoding of data, or None if it does not look like text in one of the supported encodings."""
+	encodings, bom = candidate_encodings(data, prefix_size)
+	return encodings[0] if encodings else None
+
+
+def decode_text(data):
+	"""Decode bytes in the detected encoding, without a byte order mark."""
+	encodings, bom = candidate_encodings(data)
+	for encoding in encodings:
+		try:
+			return data[bom:].decode(encoding)
+		except UnicodeDecodeError:
+			continue
+	text = data[bom:].decode('utf-8', errors='replace')
+	return text[1:] if text.startswith('\ufeff') else text
+
+
+def is_text(data, prefix_size=PREFIX_SIZE):
+	"""Whether the first prefix_size bytes of data look like text in a supported encoding."""
+	return detect_encoding(data, prefix_size) is not None
+
+
+def read_text(path):
+	"""Read and decode a text file (see decode_text), once per path, modification time and size."""
+	st = os.stat(path)
+	key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+	with _cache_lock:
+		if key in _cache:
+			_cache.move_to_end(key)
+			return _cache[key]
+	with open(path, 'rb') as f:
+		text = decode_text(f.read())
+	with _cache_lock:
+		_cache[key] = text
+		while len(_cache) > CACHE_SIZE:
+			_cache.popitem(last=False)
+	return text
+
+
+# the codecs that skip a byte order mark themselves
+_BOM_CODECS = {'utf-8': 'utf-8-sig', 'utf-16-le': 'utf-16', 'utf-16-be': 'utf-16'}
+
+
+def open_text(path, prefix_size=PREFIX_SIZE):
+	"""
+	Open a text file for reading in the encoding detected from its first prefix_size bytes.
+	Unlike read_text the rest is not checked: bytes that do not decode become replacement
+	characters.
+	"""
+	with open(path, 'rb') as f:
+		encodings, bom = candidate_encodings(f.read(prefix_size), prefix_size)
+	encoding = encodings[0] if encodings else 'utf-8'
+	if bom:
+		encoding = _BOM_CODECS[encoding]
+	return open(path, 'r', encoding=encoding, errors='replace')
+
+
+CHECK_TEXTS = (
+	"HELLO WORLD\n",
+	"오늘은 날씨가 좋아서 학교에 가기가 쉽다\n",
+	"가나다 ABC 123\n기차가 가\n",
+)
+
+
+def check():
+	"""Detect and decode CHECK_TEXTS in every supported encoding; returns the number of failures."""
+	failures = 0
+	for text in CHECK_TEXTS:
+		samples = [(encoding, text.encode(encoding)) for encoding in ('utf-8', 'cp949', 'utf-16-le', 'utf-16-be')]
+		samples += [(encoding + ' with BOM', bom + text.encode(encoding)) for bom, encoding in BOMS]
+		for name, data in samples:
+			if decode_text(data) != text or not is_text(data):
+				failures += 1
+				print("FAILED %s: %r decoded as %r" % (name, text, decode_text(data)))
+	# every byte value: has NULs, and lone surrogates in both UTF-16 byte orders
+	binary = bytes(range(256)) * 4
+	if is_text(binary):
+		failures += 1
+		print("FAILED: binary data taken for text")
+	print("%d failure(s)" % failures)
+	return failures
+
+
+if __name__ == '__main__':
+	if len(sys.argv) < 2:
+		print(__doc__)
+		sys.exit(0)
+	if sys.argv[1:] == ['--check']:
+		sys.exit(1 if check() else 0)
+	for path in sys.argv[1:]:
+		with open(path, 'rb') as f:
+			print(path + ": " + str(detect_encoding(f.read(PREFIX_SIZE))))
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+"""
+Command-line usage:
+  python viterbi_align.py hmm_dir dictionary input_mlf scp_file output_mlf
+	-- align like "HVite -a -m -I input_mlf -H hmm_dir/macros -H hmm_dir/hmmdefs
+	   -S scp_file -i output_mlf dictionary monophones"
+
+In-process forced aligner that replaces HVite for align.py (--decoder=python).
+The model is read by htkmodel.py. Every transcript becomes a phone network: the
+words in order, each expanded into all of its dictionary pronunciations. The
+non-emitting entry and exit states are folded into direct arcs between emitting
+states, including skips over tee models such as sp, and log-domain Viterbi runs
+over all states of the utterance at once, one frame at a time.
+
+The result is written as the lines HVite -m prints ("start end phone score [word]",
+times in 100 ns units, zero-length phones left out), so align._parse_aligned_lines
+turns it into the same word/phone structure as readAlignedMLF. Requires NumPy.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+import htkmodel
+import mfcc
+
+
+LOG_ZERO = -np.inf
+
+
+def read_pronunciations(word_dictionary):
+	"""Read an HTK dictionary into {word: [phone list, ...]} keeping every distinct pronunciation."""
+	pronunciations = {}
+	with open(word_dictionary, 'r', encoding='utf-8') as f:
+		for line in f:
+			parts = line.split()
+			if not parts:
+				continue
+			prons = pronunciations.setdefault(parts[0], [])
+			if parts[1:] not in prons:
+				prons.append(parts[1:])
+	return pronunciations
+
+
+def read_input_mlf(mlffile):
+	"""Return {label: [word, ...]} for an MLF written by align.writeBatchInputMLF."""
+	utterances = {}
+	label = None
+	with open(mlffile, 'r', encoding='utf-8') as f:
+		for line in f:
+			line = line.strip()
+			if not line or line == '#!MLF!#':
+				continue
+			if label is None:
+				label = os.path.splitext(os.path.basename(line.strip('"')))[0]
+				utterances[label] = []
+			elif line == '.':
+				label = None
+			else:
+				utterances[label].append(line.split()[0])
+	return utterances
+
+
+class PhoneNetwork(object):
+	"""
+	The emitting states of a forced-alignment network for one transcript.
+
+	For state k, rows[k] is its Gaussian in the model and phone[k] the phone instance
+	it belongs to. Arcs are kept per offset d = destination - source: weights[i][j] is
+	the log probability of moving from state j - offsets[i] to state j. start and final
+	hold the log probabilities of entering the network in a state and of leaving it.
+	"""
+
+	def __init__(self, model, words, pronunciations):
+		self.instances = []  # (phone, word, first phone of the word?)
+		successors = []
+		rows = []
+		phone_of = []
+		first_state = []
+
+		# lay out the phone instances word by word, alternatives side by side
+		previous_ends = None
+		starts = []
+		for w, word in enumerate(words):
+			if word not in pronunciations:
+				raise ValueError("word not in dictionary: " + word)
+			ends = []
+			for pron in pronunciations[word]:
+				if not pron:
+					raise ValueError("empty pronunciation for " + word)
+				first = len(self.instances)
+				for p, phone in enumerate(pron):
+					if phone not in model.hmms:
+						raise ValueError("no HMM for phone " + phone + " (in " + word + ")")
+					k = len(self.instances)
+					self.instances.append((phone, word, p == 0))
+					successors.append([])
+					if p > 0:
+						successors[k - 1].append(k)
+					first_state.append(len(rows))
+					for row in model.hmms[phone].states:
+						rows.append(row)
+						phone_of.append(k)
+				if previous_ends is None:
+					starts.append(first)
+				else:
+					for end in previous_ends:
+						successors[end].append(first)
+				ends.append(len(self.instances) - 1)
+			previous_ends = ends
+		if not self.instances:
+			raise ValueError("empty transcript")
+		final = -1
+		for end in previous_ends:
+			successors[end].append(final)
+
+		self.rows = np.array(rows, dtype=np.intp)
+		self.phone = np.array(phone_of, dtype=np.intp)
+		num_states = len(rows)
+
+		# entry[k]: states reachable from the entry of instance k without consuming a frame,
+		# passing through tee models; the network end is state -1
+		entry = [None] * len(self.instances)
+		for k in range(len(self.instances) - 1, -1, -1):
+			log_transp = model.hmms[self.instances[k][0]].log_transp
+			scores = {}
+			for j in range(1, len(log_transp) - 1):
+				if log_transp[0, j] > LOG_ZERO:
+					scores[first_state[k] + j - 1] = log_transp[0, j]
+			if log_transp[0, -1] > LOG_ZERO:
+				for succ in successors[k]:
+					for s, lp in (entry[succ].items() if succ != final else [(final, 0.0)]):
+						_update(scores, s, log_transp[0, -1] + lp)
+			entry[k] = scores
+
+		self.start = np.full(num_states, LOG_ZERO)
+		self.final = np.full(num_states, LOG_ZERO)
+		for k in starts:
+			for s, lp in entry[k].items():
+				if s == final:
+					raise ValueError("the network can be passed without consuming a frame")
+				self.start[s] = max(self.start[s], lp)
+
+		arcs = {}
+		for k, (phone, word, is_first) in enumerate(self.instances):
+			log_transp = model.hmms[phone].log_transp
+			n = len(log_transp)
+			for i in range(1, n - 1):
+				src = first_state[k] + i - 1
+				for j in range(1, n - 1):
+					if log_transp[i, j] > LOG_ZERO:
+						_update(arcs, (src, first_state[k] + j - 1), log_transp[i, j])
+				if log_transp[i, -1] > LOG_ZERO:
+					for succ in successors[k]:
+						for s, lp in (entry[succ].items() if succ != final else [(final, 0.0)]):
+							if s == final:
+								self.final[src] = max(self.final[src], log_transp[i, -1] + lp)
+							else:
+								_update(arcs, (src, s), log_transp[i, -1] + lp)
+
+		by_offset = {}
+		for (src, dst), lp in arcs.items():
+			by_offset.setdefault(dst - src, []).append((dst, lp))
+		self.offsets = np.array(sorted(by_offset), dtype=np.intp)
+		self.weights = np.full((len(self.offsets), num_states), LOG_ZERO)
+		for i, d in enumerate(self.offsets):
+			for dst, lp in by_offset[d]:
+				self.weights[i, dst] = lp
+
+	@property
+	def num_states(self):
+		return len(self.rows)
+
+
+def _update(scores, key, lp):
+	if lp > scores.get(key, LOG_ZERO):
+		scores[key] = lp
+
+
+class ViterbiAligner(object):
+	"""Forced aligner for one acoustic model (an htkmodel.HTKModel)."""
+
+	def __init__(self, model):
+		self.model = model
+
+	@classmethod
+	def from_hmmdir(cls, hmmdir):
+		return cls(htkmodel.load_model(hmmdir))
+
+	def decode(self, features, network):
+		"""
+		Best state sequence through network for features (frames x dims) and its per-frame
+		log probabilities (output plus transition). Raises ValueError if no path ends in time.
+		"""
+		num_frames, num_states = len(features), network.num_states
+		if num_frames == 0:
+			raise ValueError("no frames to align")
+		rows, inverse = np.unique(network.rows, return_inverse=True)
+		loglik = self.model.log_likelihoods(features, rows)[:, inverse]
+
+		# candidates for all offsets are gathered from a padded copy of the previous frame
+		pad = int(np.abs(network.offsets).max()) if len(network.offsets) else 0
+		gather = (pad - network.offsets)[:, None] + np.arange(num_states)[None, :]
+		padded = np.full(num_states + 2 * pad, LOG_ZERO)
+		backpointers = np.zeros((num_frames, num_states), dtype=np.int16)
+
+		delta = network.start + loglik[0]
+		for t in range(1, num_frames):
+			padded[pad:pad + num_states] = delta
+			candidates = padded[gather] + network.weights
+			best = candidates.argmax(axis=0)
+			backpointers[t] = best
+			delta = candidates[best, np.arange(num_states)] + loglik[t]
+
+		delta = delta + network.final
+		state = int(delta.argmax())
+		if delta[state] == LOG_ZERO:
+			raise ValueError("no path reaches the end of the network")
+
+		path = np.empty(num_frames, dtype=np.intp)
+		scores = np.empty(num_frames)
+		path[-1] = state
+		scores[-1] = loglik[-1, state] + network.final[state]
+		for t in range(num_frames - 1, 0, -1):
+			i = backpointers[t, state]
+			scores[t] += network.weights[i, state]
+			state -= network.offsets[i]
+			path[t - 1] = state
+			scores[t - 1] = loglik[t - 1, state]
+		scores[0] += network.start[state]
+		return path, scores
+
+	def align(self, features, words, pronunciations, samp_period=100000):
+		"""
+		Align features with words and return HVite-style alignment lines
+		"start end phone score [word]", the word on the first phone of each word.
+		"""
+		network = PhoneNetwork(self.model, words, pronunciations)
+		path, scores = self.decode(features, network)
+		instances = network.phone[path]
+
+		lines = []
+		boundaries = np.flatnonzero(np.diff(instances)) + 1
+		for t0, t1 in zip(np.concatenate([[0], boundaries]), np.concatenate([boundaries, [len(path)]])):
+			phone, word, is_first = network.instances[instances[t0]]
+			line = "%d %d %s %f" % (t0 * samp_period, t1 * samp_period, phone, scores[t0:t1].sum())
+			lines.append(line + " " + word if is_first else line)
+		return lines
+
+
+def align_files(aligner, input_mlf, word_dictionary, scp_file, output_mlf, log=print):
+	"""
+	Align every feature file listed in scp_file with its transcript in input_mlf and write
+	output_mlf like HVite. Utterances that cannot be aligned are reported to log and left out.
+	"""
+	transcripts = read_input_mlf(input_mlf)
+	pronunciations = read_pronunciations(word_dictionary)
+	with open(scp_file, 'r') as f:
+		mfcfiles = [line.strip() for line in f if line.strip()]
+
+	with open(output_mlf, 'w', encoding='utf-8') as fw:
+		fw.write('#!MLF!#\n')
+		for mfcfile in mfcfiles:
+			label = os.path.splitext(os.path.basename(mfcfile))[0]
+			try:
+				if label not in transcripts:
+					raise ValueError("no transcript in " + input_mlf)
+				features, samp_period, parm_kind = mfcc.read_htk(mfcfile)
+				lines = aligner.align(features, transcripts[label], pronunciations, samp_period)
+			except ValueError as e:
+				log("Cannot align " + mfcfile + ": " + str(e))
+				continue
+			fw.write('"' + os.path.splitext(mfcfile)[0] + '.rec"\n')
+			for line in lines:
+				fw.write(line + '\n')
+			fw.write('.\n')
+
+
+def viterbi(input_mlf, word_dictionary, output_mlf, hmmdir, workdir, aligner=None, log=print):
+	"""
+	Drop-in for align.viterbi (the features are listed in workdir/test.scp).
+	Pass aligner to reuse an already loaded model.
+	"""
+	if aligner is None:
+		aligner = ViterbiAligner.from_hmmdir(hmmdir)
+	align_files(aligner, input_mlf, word_dictionary, os.path.join(workdir, 'test.scp'), output_mlf, log)
+
+
+if __name__ == '__main__':
+	if len(sys.argv) != 6:
+		print(__doc__)
+		sys.exit(0)
+	hmm_dir, dictionary, input_mlf, scp_file, output_mlf = sys.argv[1:]
+	align_files(ViterbiAligner.from_hmmdir(hmm_dir), input_mlf, dictionary, scp_file, output_mlf)
@@ -1,4 +1,5 @@
 import os
+import sys
 import shutil
 import subprocess
 import uuid
@@ -42,24 +43,17 @@ def stem(path: Path) -> str:
     return path.stem
 
 
+def _text_encoding():
+    """The transcript encoding detector shared with align.py (text_encoding.py)."""
+    if str(KFALIGNER_ROOT) not in sys.path:
+        sys.path.insert(0, str(KFALIGNER_ROOT))
+    import text_encoding
+
+    return text_encoding
+
+
 def read_text_any_encoding(path: Path) -> str:
-    encodings = ["utf-8", "utf-16", "utf-16le", "utf-16be", "cp949", "euc-kr"]
-    data = path.read_bytes()
-    for enc in encodings:
-        try:
-            s = data.decode(enc)
-            if s and s[0] == "\ufeff":
-                s = s[1:]
-            return s
-        except Exception:
-            continue
-    try:
-        s = data.decode("utf-8", errors="replace")
-        if s and s[0] == "\ufeff":
-            s = s[1:]
-        return s
-    except Exception:
-        return ""
+    return _text_encoding().read_text(path)
 
 
 def text_contains_hangul(s: str) -> bool:
@@ -85,19 +79,11 @@ def is_valid_wav_header(path: Path, max_read: int = 64) -> bool:
 
 
 def is_probably_text(path: Path, sample_size: int = 1024 * 64) -> bool:
-    """Heuristic: reject if NUL bytes exist, and require most bytes to be printable/whitespace."""
+    """Heuristic: accept if the first sample_size bytes look like UTF-8/UTF-16/CP949/EUC-KR text."""
     try:
-        data = path.read_bytes()
-        if len(data) > sample_size:
-            data = data[:sample_size]
-        # Accept if it strictly decodes in common encodings (UTF-8/UTF-16/CP949/EUC-KR)
-        for enc in ("utf-8", "utf-16", "utf-16le", "utf-16be", "cp949", "euc-kr"):
-            try:
-                data.decode(enc, errors="strict")
-                return True
-            except Exception:
-                continue
-        return False
+        with open(path, "rb") as f:
+            data = f.read(sample_size)
+        return _text_encoding().is_text(data, sample_size)
     except Exception:
         return False
 
@@ -161,66 +147,72 @@ def scan_with_clamd(path: Path) -> tuple[bool, str]:
 
 def romanize_hangul_text(s: str) -> str:
     """Mimic convert_sentences_unicode.py behavior: per line, convert Hangul to token sequence."""
-    import unicodedata
+    bin_dir = str(KFALIGNER_ROOT / "bin")
+    if bin_dir not in sys.path:
+        sys.path.insert(0, bin_dir)
+    from hangul_roman import romanize_words
 
-    lines = s.splitlines()
     out_lines: list[str] = []
-    for line in lines:
-        parts = line.strip().split()
-        out_words: list[str] = []
-        for word in parts:
-            tokens: list[str] = []
-            for ch in str(word):
-                try:
-                    fullname = unicodedata.name(ch)
-                except Exception:
-                    continue
-                pieces = fullname.split()
-                if len(pieces) == 3 and pieces[0] != "CJK":
-                    tokens.append(pieces[2])
-                elif len(pieces) == 2:
-                    digit_map = {
-                        "ZERO": "0", "ONE": "1", "TWO": "2", "THREE": "3",
-                        "FOUR": "4", "FIVE": "5", "SIX": "6", "SEVEN": "7",
-                        "EIGHT": "8", "NINE": "9",
-                    }
-                    if pieces[1] in digit_map:
-                        tokens.append(digit_map[pieces[1]])
-            if tokens:
-                out_words.append(''.join(tokens))
+    for line in s.splitlines():
+        out_words = romanize_words(line)
         if out_words:
             out_lines.append(' '.join(out_words))
-    # Limit preview to first few lines to keep UI compact
-    return '\n'.join(out_lines[:5])
+        # Limit preview to first few lines to keep UI compact
+        if len(out_lines) == 5:
+            break
+    return '\n'.join(out_lines)
+
+
+_aligner = None
+
+
+def get_aligner():
+    """Return the process-wide Aligner; model paths, dictionary and G2P are loaded on first use."""
+    global _aligner
+    if _aligner is None:
+        if str(KFALIGNER_ROOT) not in sys.path:
+            sys.path.insert(0, str(KFALIGNER_ROOT))
+        import align
+
+        aligner = align.Aligner(
+            tmp_root=str(KFALIGNER_ROOT / "tmp"),
+            local_dict=str(KFALIGNER_ROOT / "dict.local"),
+        )
+        _aligner = aligner
+    return _aligner
 
 
 def run_align(wav_path: Path, txt_path: Path, out_path: Path) -> tuple[bool, str]:
-    """Run align.py for a single pair. Returns (success, message)."""
+    """Align a single pair, through the aligner server when KFALIGNER_SOCKET points to one,
+    otherwise in-process. Returns (success, message)."""
     # Ensure output directory exists
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Build command; run from kfaligner root so relative model/paths work
-    cmd = [
-        "python3",
-        str(KFALIGNER_ROOT / "align.py"),
-        str(wav_path),
-        str(txt_path),
-        str(out_path),
-    ]
+    socket_path = os.environ.get("KFALIGNER_SOCKET", "")
+    if socket_path and os.path.exists(socket_path):
+        if str(KFALIGNER_ROOT) not in sys.path:
+            sys.path.insert(0, str(KFALIGNER_ROOT))
+        from align_server import request_alignment
+
+        try:
+            reply = request_alignment(
+                {"wav": str(wav_path), "transcript": str(txt_path), "output": str(out_path)},
+                socket_path,
+            )
+            ok = bool(reply.get("ok")) and out_path.exists()
+            return ok, reply.get("log") or reply.get("message", "")
+        except Exception as e:
+            return False, f"Exception: {e}"
 
+    # this job's messages and tool output (sox, HCopy, HVite); requests may run in parallel threads
+    log: list[str] = []
     try:
-        res = subprocess.run(
-            cmd,
-            cwd=str(KFALIGNER_ROOT),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            check=False,
-            text=True,
-        )
-        ok = res.returncode == 0 and out_path.exists()
-        return ok, res.stdout if res.stdout else ("OK" if ok else "Failed without output")
+        get_aligner().align(str(wav_path), str(txt_path), str(out_path), log=log.append)
+        ok = out_path.exists()
+        out = "\n".join(log)
+        return ok, out if out else ("OK" if ok else "Failed without output")
     except Exception as e:
-        return False, f"Exception: {e}"
+        return False, "".join(line + "\n" for line in log) + f"Exception: {e}"
 
 
 def make_zip(job_dir: Path, zip_path: Path, upload_dir: Path = None):